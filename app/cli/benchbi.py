@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos perfis de transação do pool Firebird: executa as consultas dos endpoints do
+BIRouter (com os filtros padrão) em cada perfil e mostra a latência e quanto o OAT/OST do
+banco ficou para trás durante a carga (transações seguradas pela API atrasam a coleta de lixo).
+
+Uso:
+    python -m app.cli.benchbi <ipbd> <portabd> <caminhobd> [--rodadas N] [--concorrencia N]
+                              [--perfis bi,padrao]
+
+Perfis: "bi" é o configurado no ambiente (FB_TPB_*), "padrao" o do driver (snapshot, leitura e escrita).
+"""
+
+from app.db.conexaofb import (get_firebird_connection, get_firebird_pool, close_firebird_pools,
+                              FB_TPB_ISOLAMENTO, FB_TPB_SOMENTE_LEITURA, FB_TPB_LOCK_TIMEOUT)
+from app.db.executorfb import shutdown_executor_firebird
+from app.schemas.BIschemas import FiltrosBI
+from app.routers import BIRouter
+from fastapi import HTTPException
+import statistics
+import argparse
+import asyncio
+import threading
+import time
+
+PERFIS = {
+    "bi": (FB_TPB_ISOLAMENTO, FB_TPB_SOMENTE_LEITURA, FB_TPB_LOCK_TIMEOUT),
+    "padrao": ("PADRAO", False, -1),
+}
+
+CONTADORES = """
+    SELECT MON$NEXT_TRANSACTION - MON$OLDEST_ACTIVE, MON$NEXT_TRANSACTION - MON$OLDEST_SNAPSHOT
+    FROM MON$DATABASE
+"""
+
+
+class MonitorTransacoes:
+    """Amostra em outra conexão a distância entre a próxima transação e o OAT/OST do banco"""
+
+    def __init__(self, conn, intervalo: float = 0.2):
+        self.conn = conn
+        self.intervalo = intervalo
+        self.oat = 0
+        self.ost = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._rodar, daemon=True)
+
+    def _rodar(self):
+        cursor = self.conn.cursor()
+        while not self._parar.is_set():
+            cursor.execute(CONTADORES)
+            oat, ost = cursor.fetchone()
+            # Cada amostra em transação nova, para ler os contadores atuais
+            self.conn.commit()
+            self.oat = max(self.oat, oat)
+            self.ost = max(self.ost, ost)
+            self._parar.wait(self.intervalo)
+        cursor.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+
+
+def consultas_bi() -> dict:
+    return {nome[len("_consultar_"):]: consultar for nome, consultar in vars(BIRouter).items()
+            if nome.startswith("_consultar_")}
+
+
+async def medir(conn_data: dict, rodadas: int, concorrencia: int) -> dict:
+    """Latências (ms) de cada endpoint: {endpoint: [ms]}"""
+    tempos = {}
+    for endpoint, consultar in consultas_bi().items():
+        tempos[endpoint] = []
+
+        async def uma():
+            inicio = time.perf_counter()
+            try:
+                await consultar(conn_data, FiltrosBI())
+            except HTTPException as e:
+                # Sem linhas no período o endpoint responde 404 depois de consultar
+                if e.status_code != 404:
+                    raise
+            tempos[endpoint].append((time.perf_counter() - inicio) * 1000)
+
+        for _ in range(rodadas):
+            await asyncio.gather(*(uma() for _ in range(concorrencia)))
+    return tempos
+
+
+async def rodar_perfil(conn_data: dict, perfil: str, monitor_conn, rodadas: int, concorrencia: int):
+    close_firebird_pools()
+    pool = get_firebird_pool(conn_data["ipbd"], conn_data["portabd"], conn_data["caminhobd"])
+    pool.definir_transacao(*PERFIS[perfil])
+    # Primeira passada para abrir as conexões e preparar os comandos
+    await medir(conn_data, 1, concorrencia)
+
+    inicio = time.perf_counter()
+    with MonitorTransacoes(monitor_conn) as monitor:
+        tempos = await medir(conn_data, rodadas, concorrencia)
+    total = time.perf_counter() - inicio
+
+    print(f"[{perfil}] {pool.perfil_transacao}")
+    for endpoint, lista in tempos.items():
+        lista.sort()
+        p95 = lista[min(len(lista) - 1, int(len(lista) * 0.95))]
+        print(f"  {endpoint:40} mediana {statistics.median(lista):8.1f} ms   p95 {p95:8.1f} ms")
+    print(f"  total {total:.1f} s; maior distância OAT {monitor.oat}, OST {monitor.ost} transações")
+
+
+async def comparar(conn_data: dict, perfis: list, monitor_conn, rodadas: int, concorrencia: int):
+    for perfil in perfis:
+        await rodar_perfil(conn_data, perfil.strip(), monitor_conn, rodadas, concorrencia)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos perfis de transação do BI (Firebird)")
+    parser.add_argument("ipbd")
+    parser.add_argument("portabd", type=int)
+    parser.add_argument("caminhobd")
+    parser.add_argument("--rodadas", type=int, default=10)
+    parser.add_argument("--concorrencia", type=int, default=4)
+    parser.add_argument("--perfis", default="bi,padrao")
+    args = parser.parse_args()
+
+    conn_data = {"ipbd": args.ipbd, "portabd": args.portabd, "caminhobd": args.caminhobd}
+    monitor_conn = get_firebird_connection(args.ipbd, args.portabd, args.caminhobd)
+    try:
+        asyncio.run(comparar(conn_data, args.perfis.split(","), monitor_conn, args.rodadas, args.concorrencia))
+    finally:
+        monitor_conn.close()
+        close_firebird_pools()
+        shutdown_executor_firebird()
+
+
+if __name__ == "__main__":
+    main()
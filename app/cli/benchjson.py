@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark da serialização das respostas do BI: compara o caminho padrão do FastAPI
+(validação pelo response_model + jsonable_encoder + json) com a resposta rápida
+(app/utils/respostabi.py, BI_RESPOSTA_RAPIDA=1) e, nos endpoints {chave: dados}, com o
+formato colunar, em resultados sintéticos do tamanho informado.
+
+Uso:
+    python -m app.cli.benchjson [--linhas N] [--repeticoes N]
+"""
+
+from fastapi.routing import APIRoute, serialize_response
+from fastapi.responses import JSONResponse
+from app.routers import BIRouter
+from app.schemas.BIschemas import DadosCliente, DadosCidade
+from app.utils.respostabi import RespostaBI, colunar, orjson
+from datetime import date, timedelta
+import statistics
+import json
+import argparse
+import asyncio
+import time
+
+
+def kpi_cliente(linhas: int) -> dict:
+    return {f"{i:014d}": DadosCliente(cliente=f"Cliente {i}", faturamento=i * 10.5) for i in range(linhas)}
+
+
+def kpi_cidade(linhas: int) -> dict:
+    return {str(i): DadosCidade(cidade=f"Cidade {i}", volume=i * 1.5, embarques=i, faturamento=i * 10.5)
+            for i in range(linhas)}
+
+
+def tabela_faturamento(linhas: int) -> list:
+    inicio = date(2024, 1, 1)
+    return [
+        {
+            "nrofatura": i, "anofatura": 2024, "datarecbto": inicio + timedelta(days=i % 365),
+            "faturamento": i * 10.5, "filial": "Matriz", "cliente": f"Cliente {i}",
+            "cidade": "Cidade", "coduf": "SP", "produto": "Produto",
+        }
+        for i in range(linhas)
+    ]
+
+
+# Caminho: (gerador dos dados, chaves do formato colunar)
+CENARIOS = {
+    "/bi/kpi_cliente": (kpi_cliente, ("codcliente",)),
+    "/bi/kpi_cidade": (kpi_cidade, ("codcid",)),
+    "/bi/tabela_faturamento": (tabela_faturamento, None),
+}
+
+
+def rota(caminho: str) -> APIRoute:
+    return next(r for r in BIRouter.router.routes if isinstance(r, APIRoute) and r.path == caminho)
+
+
+async def padrao(campo, dados) -> bytes:
+    conteudo = await serialize_response(field=campo, response_content=dados)
+    return JSONResponse(conteudo).body
+
+
+async def rapida(campo, dados) -> bytes:
+    return RespostaBI(dados).body
+
+
+def codificar_colunar(chaves):
+    async def codificar(campo, dados) -> bytes:
+        return RespostaBI(colunar(dados, chaves)).body
+    return codificar
+
+
+async def medir(funcao, campo, dados, repeticoes: int) -> list:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        await funcao(campo, dados)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+async def comparar(linhas: int, repeticoes: int):
+    print(f"Codificador da resposta rápida: {'orjson' if orjson is not None else 'json (orjson não instalado)'}")
+    for caminho, (gerar, chaves) in CENARIOS.items():
+        campo = rota(caminho).response_field
+        dados = gerar(linhas)
+        esperado = await padrao(campo, dados)
+        # As duas saídas precisam ser o mesmo JSON
+        iguais = json.loads(esperado) == json.loads(await rapida(campo, dados))
+        lento = statistics.median(await medir(padrao, campo, dados, repeticoes))
+        rapido = statistics.median(await medir(rapida, campo, dados, repeticoes))
+        print(f"{caminho:28} {linhas} linhas, {len(esperado) / 1024:8.0f} KB: padrão {lento:8.1f} ms, "
+              f"rápida {rapido:8.1f} ms ({lento / rapido:.1f}x){'' if iguais else ' SAÍDAS DIFERENTES'}")
+        if chaves:
+            codificar = codificar_colunar(chaves)
+            tamanho = len(await codificar(campo, dados))
+            tempo = statistics.median(await medir(codificar, campo, dados, repeticoes))
+            print(f"{'':28} colunar {tamanho / 1024:8.0f} KB ({len(esperado) / tamanho:.1f}x menor), "
+                  f"{tempo:8.1f} ms ({lento / tempo:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da serialização das respostas do BI")
+    parser.add_argument("--linhas", type=int, default=20000)
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(comparar(args.linhas, args.repeticoes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+CLI de migrações do BI: aplica o pacote de DDL versionado (app/views/migracoes)
+ao banco Firebird de um tenant, verifica os índices e mostra o PLAN das consultas do BIRouter.
+
+Uso:
+    python -m app.cli.migracaobi status  <ipbd> <portabd> <caminhobd>
+    python -m app.cli.migracaobi planos  <ipbd> <portabd> <caminhobd> [--executar]
+    python -m app.cli.migracaobi aplicar <ipbd> <portabd> <caminhobd> [--executar]
+
+O comando aplicar mostra o PLAN de cada consulta antes e depois da migração. As consultas
+só são preparadas (o PLAN sai do prepare); com --executar elas rodam de verdade no banco.
+"""
+
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from fastapi import HTTPException
+from app.db.conexaofb import get_firebird_connection, close_firebird_pools
+from app.db.executorfb import shutdown_executor_firebird
+from app.schemas.BIschemas import FiltrosBI
+from app.utils.consultabi import CONSULTAS_BI, BI_PAGINA_PADRAO
+from app.routers import BIRouter
+import argparse
+import asyncio
+import sys
+import re
+import os
+
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "views", "migracoes")
+
+TABELA_VERSAO = "BI_VERSAO_DDL"
+
+CREATE_INDEX = re.compile(r"^\s*CREATE\s+(?:UNIQUE\s+)?(?:(?:ASC|ASCENDING|DESC|DESCENDING)\s+)?INDEX\s+(\w+)", re.IGNORECASE)
+CREATE_TABLE = re.compile(r"^\s*CREATE\s+(?:GLOBAL\s+TEMPORARY\s+)?TABLE\s+(\w+)", re.IGNORECASE)
+SET_TERM = re.compile(r"^\s*SET\s+TERM\s+(\S+)\s*(\S+)\s*$", re.IGNORECASE)
+# Versão mínima do servidor, declarada no cabeçalho da migração: "-- requer: Firebird 5.0"
+REQUER = re.compile(r"^\s*--\s*requer:\s*Firebird\s+(\d+)(?:\.(\d+))?", re.IGNORECASE | re.MULTILINE)
+
+
+class MigracaoIncompleta(Exception):
+    """Falha no meio de uma migração: os comandos anteriores ficaram aplicados"""
+
+    def __init__(self, versao: str, aplicados: int, total: int, comando: str, erro: Exception):
+        super().__init__(f"{versao}: falha no comando {aplicados + 1} de {total}: {erro}")
+        self.versao = versao
+        self.aplicados = aplicados
+        self.comando = comando
+
+
+def dividir_comandos(sql: str) -> list:
+    """Divide o script em comandos, ignorando comentários de linha e respeitando SET TERM"""
+    comandos = []
+    atual = []
+    terminador = ";"
+    for linha in sql.splitlines():
+        if linha.strip().startswith("--"):
+            continue
+        set_term = SET_TERM.match(linha)
+        if set_term:
+            # "SET TERM ^ ;" troca o terminador (necessário para blocos PSQL)
+            terminador = set_term.group(1)
+            continue
+        atual.append(linha)
+        if linha.rstrip().endswith(terminador):
+            comando = "\n".join(atual).rstrip()[:-len(terminador)].strip()
+            if comando:
+                comandos.append(comando)
+            atual = []
+    resto = "\n".join(atual).strip()
+    if resto:
+        comandos.append(resto)
+    return comandos
+
+
+def carregar_migracoes() -> list:
+    """Migrações do pacote, em ordem: [(versao, arquivo, comandos, versão mínima do servidor)]"""
+    migracoes = []
+    for arquivo in sorted(os.listdir(PASTA_MIGRACOES)):
+        encontrado = re.match(r"^(V\d+)__.+\.sql$", arquivo)
+        if not encontrado:
+            continue
+        with open(os.path.join(PASTA_MIGRACOES, arquivo), encoding="utf-8") as f:
+            sql = f.read()
+        requer = REQUER.search(sql)
+        minima = (int(requer.group(1)), int(requer.group(2) or 0)) if requer else None
+        migracoes.append((encontrado.group(1), arquivo, dividir_comandos(sql), minima))
+    return migracoes
+
+
+def versao_servidor(conn) -> tuple:
+    """Versão do Firebird do banco, ex.: (5, 0)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT RDB$GET_CONTEXT('SYSTEM', 'ENGINE_VERSION') FROM RDB$DATABASE")
+    versao = cursor.fetchone()[0]
+    cursor.close()
+    conn.commit()
+    return tuple(int(parte) for parte in versao.split(".")[:2])
+
+
+def indices_existentes(cursor) -> dict:
+    """Índices do banco: {nome: ativo}"""
+    cursor.execute("SELECT TRIM(RDB$INDEX_NAME), COALESCE(RDB$INDEX_INACTIVE, 0) FROM RDB$INDICES")
+    return {nome.upper(): inativo == 0 for nome, inativo in cursor.fetchall()}
+
+
+def tabelas_existentes(cursor) -> set:
+    cursor.execute("SELECT TRIM(RDB$RELATION_NAME) FROM RDB$RELATIONS")
+    return {row[0].upper() for row in cursor.fetchall()}
+
+
+def garantir_tabela_versao(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM RDB$RELATIONS WHERE RDB$RELATION_NAME = ?", (TABELA_VERSAO,))
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"""
+            CREATE TABLE {TABELA_VERSAO} (
+                VERSAO VARCHAR(20) NOT NULL PRIMARY KEY,
+                ARQUIVO VARCHAR(200),
+                APLICADO_EM TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+    cursor.close()
+
+
+def versoes_aplicadas(conn) -> set:
+    garantir_tabela_versao(conn)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT TRIM(VERSAO) FROM {TABELA_VERSAO}")
+    versoes = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    conn.commit()
+    return versoes
+
+
+def _ja_existe(comando: str, indices: dict, tabelas: set):
+    """Nome do índice ou tabela que o comando criaria e que já existe (ou None)"""
+    for padrao, existentes in ((CREATE_INDEX, indices), (CREATE_TABLE, tabelas)):
+        criado = padrao.match(comando)
+        if criado and criado.group(1).upper() in existentes:
+            return criado.group(1).upper()
+    return None
+
+
+def aplicar_migracoes(conn) -> list:
+    """
+    Aplica as migrações pendentes. Cada comando DDL é confirmado em separado (o Firebird só
+    enxerga o objeto criado após o commit), por isso o pacote é idempotente: índices e tabelas
+    já existentes são mantidos, views usam CREATE OR ALTER e cargas usam UPDATE OR INSERT.
+    Uma falha interrompe a aplicação com MigracaoIncompleta, sem registrar a versão; depois
+    de corrigida a causa, basta rodar de novo. Migrações que exigem um Firebird mais novo
+    ficam pendentes.
+    """
+    aplicadas = versoes_aplicadas(conn)
+    servidor = versao_servidor(conn)
+    executadas = []
+    for versao, arquivo, comandos, minima in carregar_migracoes():
+        if versao in aplicadas:
+            continue
+        if minima and servidor < minima:
+            print(f"  {versao}: requer Firebird {minima[0]}.{minima[1]} (servidor {servidor[0]}.{servidor[1]}), mantida pendente")
+            continue
+        cursor = conn.cursor()
+        indices = indices_existentes(cursor)
+        tabelas = tabelas_existentes(cursor)
+        conn.commit()
+        for i, comando in enumerate(comandos):
+            existente = _ja_existe(comando, indices, tabelas)
+            if existente:
+                print(f"  {versao}: {existente} já existe, ignorado")
+                continue
+            print(f"  {versao}: {comando.splitlines()[0].strip()}")
+            try:
+                cursor.execute(comando)
+                # DDL no Firebird só vale após o commit
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                cursor.close()
+                raise MigracaoIncompleta(versao, i, len(comandos), comando, e) from e
+        cursor.execute(f"INSERT INTO {TABELA_VERSAO} (VERSAO, ARQUIVO) VALUES (?, ?)", (versao, arquivo))
+        conn.commit()
+        cursor.close()
+        executadas.append(versao)
+    return executadas
+
+
+def status(conn):
+    aplicadas = versoes_aplicadas(conn)
+    servidor = versao_servidor(conn)
+    cursor = conn.cursor()
+    existentes = indices_existentes(cursor)
+    cursor.close()
+    conn.commit()
+    for versao, arquivo, comandos, minima in carregar_migracoes():
+        situacao = "aplicada" if versao in aplicadas else "pendente"
+        if versao not in aplicadas and minima and servidor < minima:
+            situacao += f" (requer Firebird {minima[0]}.{minima[1]})"
+        print(f"{versao} {arquivo}: {situacao}")
+        for comando in comandos:
+            indice = CREATE_INDEX.match(comando)
+            if not indice:
+                continue
+            nome = indice.group(1).upper()
+            if nome not in existentes:
+                situacao = "ausente"
+            else:
+                situacao = "ativo" if existentes[nome] else "INATIVO"
+            print(f"    {nome}: {situacao}")
+
+
+class ConsultasPlanos:
+    """
+    Substitui o FirebirdAsync nas funções _consultar_* do BIRouter: prepara cada consulta
+    na conexão da CLI e guarda o PLAN. Por padrão nada é executado (as consultas do BI
+    leem o histórico inteiro e o banco costuma ser o de produção): fetchall devolve
+    nenhuma linha e fetchone uma linha de nulos com as colunas do comando, para que o
+    endpoint siga até as consultas seguintes. Com `executar` cada consulta roda de verdade
+    e o endpoint segue o mesmo caminho que seguiria na API.
+    """
+
+    def __init__(self, conn, executar: bool = False):
+        self.conn = conn
+        self.executar = executar
+        self.planos = []
+
+    def _executar(self, query: str, params: tuple) -> list:
+        cursor = self.conn.cursor()
+        comando = cursor.prepare(query)
+        try:
+            self.planos.append(comando.plan)
+            if not self.executar:
+                # O driver não expõe a quantidade de colunas do comando preparado
+                return [(None,) * comando._out_cnt]
+            cursor.execute(comando, params)
+            return cursor.fetchall()
+        finally:
+            comando.free()
+            cursor.close()
+
+    # Execução síncrona: a conexão da CLI é uma só, e executar_paralelo recebe as
+    # consultas na ordem em que aparecem no endpoint
+    async def fetchall(self, query: str, params: tuple = ()) -> list:
+        rows = self._executar(query, params)
+        return rows if self.executar else []
+
+    async def fetchone(self, query: str, params: tuple = ()):
+        rows = self._executar(query, params)
+        return rows[0] if rows else None
+
+
+def plano(conn, query: str) -> str:
+    cursor = conn.cursor()
+    comando = cursor.prepare(query)
+    try:
+        return comando.plan
+    finally:
+        comando.free()
+        cursor.close()
+
+
+async def capturar_planos(conn, conn_data: dict, executar: bool = False) -> dict:
+    """
+    PLAN de cada consulta dos endpoints do BIRouter (com os filtros padrão) e das
+    páginas por keyset dos tabela_*: {endpoint: [plano]}. Só com `executar` as
+    consultas dos endpoints rodam no banco.
+    """
+    planos = {}
+    original = BIRouter.firebird_async_manager
+    try:
+        for nome, consultar in list(vars(BIRouter).items()):
+            if not nome.startswith("_consultar_"):
+                continue
+            consultas = ConsultasPlanos(conn, executar)
+
+            @asynccontextmanager
+            async def gerenciador(*args):
+                yield consultas
+
+            BIRouter.firebird_async_manager = gerenciador
+            endpoint = nome[len("_consultar_"):]
+            try:
+                await consultar(conn_data, FiltrosBI())
+            except HTTPException as e:
+                # Sem executar as consultas não voltam linhas: o 404 do endpoint é esperado
+                if executar or e.status_code != 404:
+                    print(f"[{endpoint}] falhou: {e.detail}")
+            except Exception as e:
+                print(f"[{endpoint}] falhou: {e}")
+            planos[endpoint] = consultas.planos
+    finally:
+        BIRouter.firebird_async_manager = original
+
+    data_fim = date.today()
+    data_inicio = data_fim - timedelta(days=30)
+    for endpoint, consulta in CONSULTAS_BI.items():
+        if not consulta.chave:
+            continue
+        primeira, _ = consulta.montar_pagina(FiltrosBI(), BI_PAGINA_PADRAO, None, data_inicio, data_fim)
+        seguinte, _ = consulta.montar_pagina(FiltrosBI(), BI_PAGINA_PADRAO, [None] * len(consulta.chave),
+                                             data_inicio, data_fim)
+        total, _ = consulta.montar_total(FiltrosBI(), data_inicio, data_fim)
+        planos[f"{endpoint}_pagina"] = [plano(conn, sql) for sql in (primeira, seguinte, total)]
+    conn.rollback()
+    return planos
+
+
+def imprimir_planos(planos: dict, anteriores: dict = None):
+    for endpoint, lista in planos.items():
+        print(f"[{endpoint}]")
+        for i, plano in enumerate(lista):
+            anterior = anteriores.get(endpoint, [])[i] if anteriores and i < len(anteriores.get(endpoint, [])) else None
+            if anteriores is not None and anterior != plano:
+                print(f"  antes:  {anterior}")
+                print(f"  depois: {plano}")
+            else:
+                print(f"  {plano}")
+
+
+async def aplicar(conn, conn_data: dict, executar: bool = False) -> bool:
+    antes = await capturar_planos(conn, conn_data, executar)
+    try:
+        executadas = aplicar_migracoes(conn)
+    except MigracaoIncompleta as e:
+        print(f"ERRO: {e}")
+        print(f"  Comando: {e.comando.splitlines()[0].strip()}")
+        if e.aplicados:
+            print(f"  Os {e.aplicados} comando(s) anteriores de {e.versao} ficaram aplicados e a versão não foi registrada.")
+        print("  Corrija a causa e rode 'aplicar' novamente: os comandos já aplicados são ignorados ou refeitos sem efeito.")
+        return False
+    print(f"Migrações aplicadas: {', '.join(executadas) or 'nenhuma'}")
+    imprimir_planos(await capturar_planos(conn, conn_data, executar), antes)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrações e planos de execução do BI (Firebird)")
+    parser.add_argument("comando", choices=["status", "planos", "aplicar"])
+    parser.add_argument("ipbd")
+    parser.add_argument("portabd", type=int)
+    parser.add_argument("caminhobd")
+    parser.add_argument("--executar", action="store_true",
+                        help="executa as consultas dos endpoints no banco em vez de só prepará-las")
+    args = parser.parse_args()
+
+    conn_data = {"ipbd": args.ipbd, "portabd": args.portabd, "caminhobd": args.caminhobd}
+    conn = get_firebird_connection(args.ipbd, args.portabd, args.caminhobd)
+    ok = True
+    try:
+        if args.comando == "status":
+            status(conn)
+        elif args.comando == "planos":
+            imprimir_planos(asyncio.run(capturar_planos(conn, conn_data, args.executar)))
+        else:
+            ok = asyncio.run(aplicar(conn, conn_data, args.executar))
+    finally:
+        conn.close()
+        close_firebird_pools()
+        shutdown_executor_firebird()
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
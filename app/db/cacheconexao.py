@@ -0,0 +1,84 @@
+from dotenv import load_dotenv
+import asyncio
+import time
+import os
+
+load_dotenv()
+
+# Tempo de vida (segundos) dos dados de conexão de um tenant em memória
+TENANT_CACHE_TTL = float(os.getenv("TENANT_CACHE_TTL", "600"))
+# Tempo de vida (segundos) do registro de tenant inexistente
+TENANT_CACHE_NEGATIVO_TTL = float(os.getenv("TENANT_CACHE_NEGATIVO_TTL", "30"))
+
+
+class CacheConexaoTenant:
+    """
+    Cache em memória dos dados de conexão Firebird (ipbd, portabd, caminhobd) por empresa.
+    Tenants inexistentes também são guardados (cache negativo) por um tempo menor.
+    A invalidação vale apenas para o processo atual; os demais workers expiram pelo TTL.
+    """
+
+    def __init__(self, ttl: float = TENANT_CACHE_TTL, ttl_negativo: float = TENANT_CACHE_NEGATIVO_TTL):
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self._entradas = {}
+        self._carregando = {}
+        self._acertos = 0
+        self._acertos_negativos = 0
+        self._falhas = 0
+        self._invalidacoes = 0
+
+    async def obter(self, idempresa: int, carregar):
+        """
+        Retorna os dados de conexão da empresa (ou None se ela não existir).
+        `carregar(idempresa)` é chamado apenas em caso de falha no cache,
+        uma única vez mesmo com várias requisições simultâneas.
+        """
+        entrada = self._entradas.get(idempresa)
+        if entrada is not None and entrada[0] > time.monotonic():
+            if entrada[1] is None:
+                self._acertos_negativos += 1
+            else:
+                self._acertos += 1
+            return entrada[1]
+
+        carregando = self._carregando.get(idempresa)
+        if carregando is None:
+            self._falhas += 1
+            carregando = asyncio.ensure_future(self._carregar(idempresa, carregar))
+            self._carregando[idempresa] = carregando
+        return await asyncio.shield(carregando)
+
+    async def _carregar(self, idempresa: int, carregar):
+        try:
+            dados = await carregar(idempresa)
+            # Uma invalidação durante a carga descarta o resultado (pode estar desatualizado)
+            if self._carregando.get(idempresa) is asyncio.current_task():
+                ttl = self.ttl if dados is not None else self.ttl_negativo
+                self._entradas[idempresa] = (time.monotonic() + ttl, dados)
+            return dados
+        finally:
+            if self._carregando.get(idempresa) is asyncio.current_task():
+                del self._carregando[idempresa]
+
+    def invalidar(self, idempresa: int):
+        """Remove a empresa do cache (chamado nas alterações de /empresas)"""
+        self._invalidacoes += 1
+        self._entradas.pop(idempresa, None)
+        self._carregando.pop(idempresa, None)
+
+    def limpar(self):
+        self._entradas.clear()
+        self._carregando.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entradas": len(self._entradas),
+            "acertos": self._acertos,
+            "acertos_negativos": self._acertos_negativos,
+            "falhas": self._falhas,
+            "invalidacoes": self._invalidacoes,
+        }
+
+
+cache_conexao_tenant = CacheConexaoTenant()
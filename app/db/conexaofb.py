@@ -1,10 +1,37 @@
 import firebird.driver as fb
 from fastapi import HTTPException
 from contextlib import contextmanager
+from collections import deque, OrderedDict
+from dotenv import load_dotenv
+import threading
+import hashlib
+import logging
+import time
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
 
 USER = "SYSDBA"
 PASSWORD = "masterkey"
 
+# Configuração do pool de conexões Firebird (um pool por banco de tenant)
+FB_POOL_MIN = int(os.getenv("FB_POOL_MIN", "0"))                                # Conexões abertas pela limpeza periódica e mantidas mesmo ociosas
+FB_POOL_MAX = int(os.getenv("FB_POOL_MAX", "5"))                                # Conexões simultâneas por tenant
+FB_POOL_IDLE_TIMEOUT = float(os.getenv("FB_POOL_IDLE_TIMEOUT", "300"))          # Segundos ociosa antes de ser fechada
+FB_POOL_MAX_LIFETIME = float(os.getenv("FB_POOL_MAX_LIFETIME", "3600"))         # Segundos de vida máxima de uma conexão
+FB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("FB_POOL_ACQUIRE_TIMEOUT", "30"))     # Espera máxima por uma conexão livre
+FB_POOL_PING_INTERVAL = float(os.getenv("FB_POOL_PING_INTERVAL", "30"))         # Ociosidade a partir da qual é feito ping antes de entregar
+FB_POOL_STMT_CACHE = int(os.getenv("FB_POOL_STMT_CACHE", "64"))                 # Comandos preparados guardados por conexão (0 desliga)
+
+# Perfil das transações abertas nas conexões do pool. O padrão do driver (snapshot, leitura e
+# escrita) segura o OIT/OAT do banco enquanto a consulta roda e atrasa a coleta de lixo do ERP;
+# read committed somente leitura não segura nada. FB_TPB_ISOLAMENTO=PADRAO mantém o do driver.
+FB_TPB_ISOLAMENTO = os.getenv("FB_TPB_ISOLAMENTO", "READ_COMMITTED_RECORD_VERSION")  # Nome de firebird.driver.Isolation
+FB_TPB_SOMENTE_LEITURA = os.getenv("FB_TPB_SOMENTE_LEITURA", "1") == "1"             # Transações somente leitura
+FB_TPB_LOCK_TIMEOUT = int(os.getenv("FB_TPB_LOCK_TIMEOUT", "0"))                    # Segundos de espera por lock (0 = no wait, -1 = indefinida)
+
 def get_firebird_connection(HOST: str, PORT: int, DATABASE: str):
     """Função para conectar ao Firebird"""
     try:
@@ -17,21 +44,395 @@ def get_firebird_connection(HOST: str, PORT: int, DATABASE: str):
     except Exception as e:
         raise HTTPException(status_code=501, detail=f"Erro ao conectar ao Firebird: {str(e)}")
 
+def tpb_firebird(isolamento: str, somente_leitura: bool, lock_timeout: int):
+    """TPB do perfil informado (None para o padrão do driver)"""
+    if isolamento.upper() == "PADRAO":
+        return None
+    acesso = fb.TraAccessMode.READ if somente_leitura else fb.TraAccessMode.WRITE
+    return fb.tpb(fb.Isolation[isolamento.upper()], lock_timeout, acesso)
+
+
+class ConexaoPool:
+    """Conexão Firebird mantida pelo pool, com os instantes usados na reciclagem"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.criada_em = time.monotonic()
+        self.usada_em = self.criada_em
+        # Comandos preparados nesta conexão, chaveados pelo texto SQL (LRU)
+        self.comandos = OrderedDict()
+
+    def liberar_comandos(self):
+        for comando in self.comandos.values():
+            try:
+                comando.free()
+            except Exception:
+                pass
+        self.comandos.clear()
+
+
+class FirebirdPool:
+    """Pool de conexões de um banco Firebird (ipbd, portabd, caminhobd)"""
+
+    def __init__(self, HOST: str, PORT: int, DATABASE: str,
+                 min_size: int = FB_POOL_MIN,
+                 max_size: int = FB_POOL_MAX,
+                 idle_timeout: float = FB_POOL_IDLE_TIMEOUT,
+                 max_lifetime: float = FB_POOL_MAX_LIFETIME,
+                 acquire_timeout: float = FB_POOL_ACQUIRE_TIMEOUT,
+                 ping_interval: float = FB_POOL_PING_INTERVAL,
+                 max_comandos: int = FB_POOL_STMT_CACHE,
+                 isolamento: str = FB_TPB_ISOLAMENTO,
+                 somente_leitura: bool = FB_TPB_SOMENTE_LEITURA,
+                 lock_timeout: int = FB_TPB_LOCK_TIMEOUT):
+        self.host = HOST
+        self.port = PORT
+        self.database = DATABASE
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.acquire_timeout = acquire_timeout
+        self.ping_interval = ping_interval
+        self.max_comandos = max_comandos
+        self.isolamento = isolamento
+        self.somente_leitura = somente_leitura
+        self.lock_timeout = lock_timeout
+        # TPBs montados na primeira conexão (dependem da biblioteca cliente carregada)
+        self._tpb = None
+        self._tpb_escrita = None
+
+        self._livres = deque()
+        self._em_uso = 0
+        self._cond = threading.Condition()
+        self._fechado = False
+        # Limite de operações simultâneas do tenant (asyncio.Semaphore criado pelo executorfb
+        # no primeiro uso); vive e morre com o pool
+        self.semaforo = None
+
+        # Estatísticas do pool
+        self._criadas = 0
+        self._fechadas = 0
+        self._reutilizadas = 0
+        self._falhas_ping = 0
+        self._esperas = 0
+        self._timeouts = 0
+        self._comandos_acertos = 0
+        self._comandos_preparados = 0
+        self._comandos_expulsos = 0
+
+    @property
+    def total(self) -> int:
+        return len(self._livres) + self._em_uso
+
+    @property
+    def identificador(self) -> str:
+        """Identificação do banco sem expor host e caminho (estatísticas e logs)"""
+        chave = f"{self.host}/{self.port}:{self.database}".encode("utf-8")
+        return hashlib.sha1(chave).hexdigest()[:12]
+
+    @property
+    def perfil_transacao(self) -> str:
+        if self.isolamento.upper() == "PADRAO":
+            return "padrao do driver"
+        acesso = "somente leitura" if self.somente_leitura else "leitura e escrita"
+        return f"{self.isolamento.upper()}, {acesso}, lock_timeout={self.lock_timeout}"
+
+    @property
+    def tpb_escrita(self):
+        """TPB do perfil com escrita, para quem precisa gravar por uma conexão do pool (resumos do BI)"""
+        if self._tpb_escrita is None and self.isolamento.upper() != "PADRAO":
+            self._tpb_escrita = tpb_firebird(self.isolamento, False, self.lock_timeout)
+        return self._tpb_escrita
+
+    def definir_transacao(self, isolamento: str, somente_leitura: bool, lock_timeout: int):
+        """Troca o perfil de transação; vale para as conexões criadas daqui em diante"""
+        self.isolamento = isolamento
+        self.somente_leitura = somente_leitura
+        self.lock_timeout = lock_timeout
+        self._tpb = None
+        self._tpb_escrita = None
+
+    def _conectar(self) -> ConexaoPool:
+        if self._tpb is None:
+            self._tpb = tpb_firebird(self.isolamento, self.somente_leitura, self.lock_timeout)
+        conn = get_firebird_connection(self.host, self.port, self.database)
+        if self._tpb is not None:
+            # Toda transação iniciada implicitamente pelos cursores usa o perfil do pool
+            conn.main_transaction.default_tpb = self._tpb
+        return ConexaoPool(conn)
+
+    def _expirada(self, item: ConexaoPool, agora: float) -> bool:
+        return self.max_lifetime > 0 and agora - item.criada_em >= self.max_lifetime
+
+    def _separar_expiradas(self) -> list:
+        """Remove das livres as conexões vencidas (chamar com o lock adquirido)"""
+        agora = time.monotonic()
+        excedente = self.total - self.min_size
+        descartar = []
+        manter = deque()
+        # As livres mais antigas ficam à esquerda
+        for item in self._livres:
+            ociosa = self.idle_timeout > 0 and agora - item.usada_em >= self.idle_timeout
+            if self._expirada(item, agora) or (ociosa and excedente > 0):
+                descartar.append(item)
+                excedente -= 1
+            else:
+                manter.append(item)
+        self._livres = manter
+        return descartar
+
+    def _fechar(self, itens):
+        for item in itens:
+            # Conexão reciclada ou descartada: os comandos preparados vão junto
+            item.liberar_comandos()
+            try:
+                item.conn.close()
+            except Exception:
+                pass
+        with self._cond:
+            self._fechadas += len(itens)
+
+    def _valida(self, item: ConexaoPool) -> bool:
+        """Verificação barata de vida antes de entregar uma conexão reutilizada"""
+        if item.conn.is_closed():
+            return False
+        if self.ping_interval >= 0 and time.monotonic() - item.usada_em >= self.ping_interval:
+            try:
+                item.conn.ping()
+            except Exception:
+                with self._cond:
+                    self._falhas_ping += 1
+                return False
+        return True
+
+    def acquire(self) -> ConexaoPool:
+        """Obtém uma conexão livre (ou cria uma nova) com transação limpa"""
+        limite = time.monotonic() + self.acquire_timeout
+        while True:
+            item = None
+            esgotado = False
+            with self._cond:
+                if self._fechado:
+                    raise HTTPException(status_code=503, detail="Pool de conexões Firebird encerrado")
+                descartar = self._separar_expiradas()
+                while not self._livres and self.total >= self.max_size:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._timeouts += 1
+                        esgotado = True
+                        break
+                    self._esperas += 1
+                    self._cond.wait(restante)
+                    descartar += self._separar_expiradas()
+                if not esgotado:
+                    if self._livres:
+                        item = self._livres.pop()
+                    self._em_uso += 1
+            self._fechar(descartar)
+            if esgotado:
+                raise HTTPException(status_code=503, detail="Tempo esgotado aguardando conexão Firebird livre")
+
+            if item is None:
+                try:
+                    item = self._conectar()
+                except Exception:
+                    self._devolver_vaga()
+                    raise
+                with self._cond:
+                    self._criadas += 1
+                return item
+
+            if self._valida(item):
+                with self._cond:
+                    self._reutilizadas += 1
+                return item
+
+            # Conexão morta: descarta e tenta novamente
+            self._fechar([item])
+            self._devolver_vaga()
+
+    def preparar(self, item: ConexaoPool, cursor, sql: str):
+        """
+        Comando preparado para `sql` na conexão do item, reaproveitado enquanto a
+        conexão viver (o Firebird não precisa analisar e otimizar o SQL de novo).
+        Com o cache desligado retorna o próprio SQL.
+        """
+        if self.max_comandos <= 0:
+            return sql
+        comando = item.comandos.get(sql)
+        if comando is not None:
+            item.comandos.move_to_end(sql)
+            with self._cond:
+                self._comandos_acertos += 1
+            return comando
+
+        comando = cursor.prepare(sql)
+        item.comandos[sql] = comando
+        expulsos = 0
+        while len(item.comandos) > self.max_comandos:
+            _, antigo = item.comandos.popitem(last=False)
+            antigo.free()
+            expulsos += 1
+        with self._cond:
+            self._comandos_preparados += 1
+            self._comandos_expulsos += expulsos
+        return comando
+
+    def esquecer(self, item: ConexaoPool, sql: str):
+        """Remove (e libera) o comando preparado de `sql` da conexão do item"""
+        comando = item.comandos.pop(sql, None)
+        if comando is not None:
+            try:
+                comando.free()
+            except Exception:
+                pass
+
+    def _devolver_vaga(self):
+        with self._cond:
+            self._em_uso -= 1
+            self._cond.notify()
+
+    def release(self, item: ConexaoPool, descartar: bool = False):
+        """Devolve a conexão ao pool, desfazendo qualquer transação pendente"""
+        if not descartar:
+            try:
+                if item.conn.is_active():
+                    item.conn.rollback()
+            except Exception:
+                descartar = True
+
+        agora = time.monotonic()
+        with self._cond:
+            self._em_uso -= 1
+            if descartar or self._fechado or self._expirada(item, agora):
+                fechar = [item]
+            else:
+                item.usada_em = agora
+                self._livres.append(item)
+                fechar = []
+            self._cond.notify()
+        self._fechar(fechar)
+
+    def preencher(self):
+        """Abre conexões até o mínimo do pool (min_size)"""
+        while True:
+            with self._cond:
+                if self._fechado or self.total >= min(self.min_size, self.max_size):
+                    return
+                # Reserva a vaga enquanto conecta
+                self._em_uso += 1
+            try:
+                item = self._conectar()
+            except Exception:
+                self._devolver_vaga()
+                logger.warning("Falha ao abrir as conexões mínimas do pool Firebird %s", self.identificador,
+                               exc_info=True)
+                return
+            with self._cond:
+                self._criadas += 1
+            self.release(item)
+
+    def limpar_ociosas(self):
+        """Fecha as conexões ociosas ou vencidas e completa o mínimo do pool"""
+        with self._cond:
+            descartar = self._separar_expiradas()
+        self._fechar(descartar)
+        self.preencher()
+
+    def close(self):
+        with self._cond:
+            self._fechado = True
+            descartar = list(self._livres)
+            self._livres.clear()
+            self._cond.notify_all()
+        self._fechar(descartar)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pool": self.identificador,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "transacao": self.perfil_transacao,
+                "total": self.total,
+                "livres": len(self._livres),
+                "em_uso": self._em_uso,
+                "criadas": self._criadas,
+                "fechadas": self._fechadas,
+                "reutilizadas": self._reutilizadas,
+                "falhas_ping": self._falhas_ping,
+                "esperas": self._esperas,
+                "timeouts": self._timeouts,
+                "comandos_acertos": self._comandos_acertos,
+                "comandos_preparados": self._comandos_preparados,
+                "comandos_expulsos": self._comandos_expulsos,
+            }
+
+
+# Pools por tenant, chaveados por (ipbd, portabd, caminhobd)
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_firebird_pool(HOST: str, PORT: int, DATABASE: str) -> FirebirdPool:
+    """Retorna (criando se necessário) o pool do banco informado"""
+    chave = (HOST, int(PORT), DATABASE)
+    pool = _pools.get(chave)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(chave)
+            if pool is None:
+                pool = FirebirdPool(HOST, int(PORT), DATABASE)
+                _pools[chave] = pool
+    return pool
+
+def listar_firebird_pools() -> list:
+    """Pools abertos no momento (tenants que usaram a API desde o início do processo)"""
+    return list(_pools.values())
+
+def get_firebird_pool_stats() -> list:
+    """Estatísticas de todos os pools Firebird"""
+    return [pool.stats() for pool in list(_pools.values())]
+
+def limpar_firebird_pools():
+    """Fecha as conexões ociosas ou vencidas de todos os pools"""
+    for pool in list(_pools.values()):
+        pool.limpar_ociosas()
+
+def close_firebird_pools():
+    """Fecha todos os pools (usado no encerramento da aplicação)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
 @contextmanager
 def firebird_connection_manager(HOST: str, PORT: int, DATABASE: str):
-    """Context manager para gerenciar conexões Firebird automaticamente"""
-    conn = None
+    """Context manager que empresta uma conexão do pool com transação limpa"""
+    pool = get_firebird_pool(HOST, PORT, DATABASE)
+    item = None
     cursor = None
+    descartar = False
     try:
-        conn = get_firebird_connection(HOST, PORT, DATABASE)
-        cursor = conn.cursor()
-        yield conn, cursor
+        item = pool.acquire()
+        cursor = item.conn.cursor()
+        yield item.conn, cursor
     except Exception as e:
-        if conn:
-            conn.rollback()
+        if item:
+            try:
+                item.conn.rollback()
+            except Exception:
+                descartar = True
+        if isinstance(e, HTTPException):
+            # Ex.: 503 do acquire (pool encerrado ou espera esgotada)
+            raise
         raise HTTPException(status_code=501, detail=f"Erro na operação Firebird: {str(e)}")
     finally:
         if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
\ No newline at end of file
+            try:
+                cursor.close()
+            except Exception:
+                descartar = True
+        if item:
+            pool.release(item, descartar)
@@ -4,6 +4,8 @@ from dotenv import load_dotenv
 import os
 from fastapi import HTTPException
 import asyncpg
+import asyncio
+import time
 from contextlib import asynccontextmanager
 
 load_dotenv()
@@ -46,36 +48,90 @@ async def get_db():
     async with async_session() as session:
         yield session
 
-# Conexão simples com PostgreSQL
-async def get_pg_connection():
+# Configuração do pool asyncpg (acesso direto ao PostgreSQL, sem ORM)
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "2"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+PG_POOL_MAX_INACTIVE = float(os.getenv("PG_POOL_MAX_INACTIVE", "300"))        # Segundos ociosa antes de ser fechada
+PG_POOL_ACQUIRE_TIMEOUT = float(os.getenv("PG_POOL_ACQUIRE_TIMEOUT", "10"))    # Espera máxima por uma conexão livre
+PG_STATEMENT_CACHE_SIZE = int(os.getenv("PG_STATEMENT_CACHE_SIZE", "100"))     # Comandos preparados mantidos por conexão
+
+_pg_pool = None
+_pg_pool_lock = asyncio.Lock()
+_pg_pool_stats = {
+    "aquisicoes": 0,
+    "falhas": 0,
+    "espera_total_ms": 0.0,
+    "espera_max_ms": 0.0,
+}
+
+async def init_pg_pool():
+    """Cria o pool asyncpg da aplicação (chamado na inicialização)"""
+    global _pg_pool
+    async with _pg_pool_lock:
+        if _pg_pool is None:
+            _pg_pool = await asyncpg.create_pool(
+                user=PG_USER,
+                password=PG_PASSWORD,
+                database=PG_DATABASE,
+                host=PG_HOST,
+                port=int(PG_PORT),
+                min_size=PG_POOL_MIN,
+                max_size=PG_POOL_MAX,
+                max_inactive_connection_lifetime=PG_POOL_MAX_INACTIVE,
+                statement_cache_size=PG_STATEMENT_CACHE_SIZE,
+            )
+    return _pg_pool
+
+async def close_pg_pool():
+    """Fecha o pool asyncpg (chamado no encerramento)"""
+    global _pg_pool
+    async with _pg_pool_lock:
+        if _pg_pool is not None:
+            await _pg_pool.close()
+            _pg_pool = None
+
+async def get_pg_pool():
+    """Retorna o pool, criando-o caso a aplicação não tenha passado pelo startup"""
+    if _pg_pool is None:
+        return await init_pg_pool()
+    return _pg_pool
+
+def get_pg_pool_stats() -> dict:
+    """Estatísticas do pool asyncpg"""
+    stats = dict(_pg_pool_stats)
+    if _pg_pool is not None:
+        stats.update({
+            "min_size": _pg_pool.get_min_size(),
+            "max_size": _pg_pool.get_max_size(),
+            "total": _pg_pool.get_size(),
+            "livres": _pg_pool.get_idle_size(),
+        })
+    return stats
+
+async def _acquire_pg():
+    inicio = time.monotonic()
     try:
-        conn = await asyncpg.connect(
-            user=PG_USER,    
-            password=PG_PASSWORD,
-            database=PG_DATABASE,
-            host=PG_HOST,
-            port=int(PG_PORT)
-        )
-        return conn
+        pool = await get_pg_pool()
+        conn = await pool.acquire(timeout=PG_POOL_ACQUIRE_TIMEOUT)
     except Exception as e:
+        _pg_pool_stats["falhas"] += 1
         raise HTTPException(status_code=500, detail=f"Erro ao conectar ao PostgreSQL: {str(e)}")
+    espera = (time.monotonic() - inicio) * 1000
+    _pg_pool_stats["aquisicoes"] += 1
+    _pg_pool_stats["espera_total_ms"] += espera
+    _pg_pool_stats["espera_max_ms"] = max(_pg_pool_stats["espera_max_ms"], espera)
+    return pool, conn
 
 # Context manager para gerenciar conexões PostgreSQL automaticamente
 @asynccontextmanager
 async def pg_connection_manager():
-    """Context manager para gerenciar conexões PostgreSQL automaticamente"""
-    conn = None
+    """Context manager que empresta uma conexão do pool PostgreSQL"""
+    pool, conn = await _acquire_pg()
     try:
-        conn = await asyncpg.connect(
-            user=PG_USER,    
-            password=PG_PASSWORD,
-            database=PG_DATABASE,
-            host=PG_HOST,
-            port=int(PG_PORT)
-        )
         yield conn
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na operação PostgreSQL: {str(e)}")
     finally:
-        if conn:
-            await conn.close()    
+        await pool.release(conn)
@@ -0,0 +1,209 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from dotenv import load_dotenv
+from app.db.conexaofb import get_firebird_pool, FB_POOL_MAX
+from app.utils.filtrosbi import ListaFiltro
+import asyncio
+import os
+
+load_dotenv()
+
+# O firebird-driver é síncrono: toda chamada roda neste executor para não travar o event loop
+FB_EXECUTOR_WORKERS = int(os.getenv("FB_EXECUTOR_WORKERS", "32"))
+# Operações simultâneas por tenant (por padrão igual ao tamanho do pool, para que
+# nenhuma thread do executor fique parada esperando conexão livre)
+FB_TENANT_CONCORRENCIA = int(os.getenv("FB_TENANT_CONCORRENCIA", str(FB_POOL_MAX)))
+
+_executor = ThreadPoolExecutor(max_workers=FB_EXECUTOR_WORKERS, thread_name_prefix="firebird")
+
+# Carga de uma lista grande de filtro (ListaFiltro) na tabela temporária BI_FILTRO_LISTA em
+# blocos de tamanho fixo: cada EXECUTE BLOCK insere FB_LISTA_BLOCO valores recebidos como
+# parâmetros (o último bloco é completado repetindo o último valor, o que não muda o IN),
+# então o comando é preparado uma vez por coluna e a carga custa uma ida ao servidor por bloco
+FB_LISTA_BLOCO = int(os.getenv("FB_LISTA_BLOCO", "128"))
+TIPOS_LISTA = {"TEXTO": "VARCHAR(40)", "NUMERO": "BIGINT"}
+_comandos_lista = {}
+
+def _comando_lista(coluna: str) -> str:
+    comando = _comandos_lista.get(coluna)
+    if comando is None:
+        parametros = ", ".join(f"V{i} {TIPOS_LISTA[coluna]} = ?" for i in range(FB_LISTA_BLOCO))
+        insercoes = "\n".join(
+            f"    INSERT INTO BI_FILTRO_LISTA (LOTE, {coluna}) VALUES (:LOTE, :V{i});" for i in range(FB_LISTA_BLOCO)
+        )
+        comando = f"EXECUTE BLOCK (LOTE INTEGER = ?, {parametros})\nAS\nBEGIN\n{insercoes}\nEND"
+        _comandos_lista[coluna] = comando
+    return comando
+
+def _semaforo(pool) -> asyncio.Semaphore:
+    """Semáforo de concorrência do tenant, guardado no próprio pool"""
+    if pool.semaforo is None:
+        pool.semaforo = asyncio.Semaphore(max(FB_TENANT_CONCORRENCIA, 1))
+    return pool.semaforo
+
+async def run_firebird(func, *args):
+    """Executa uma chamada bloqueante do driver no executor do Firebird"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+def shutdown_executor_firebird():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+async def executar_paralelo(*chamadas):
+    """
+    Executa consultas independentes ao mesmo tempo e retorna os resultados na ordem recebida.
+    Cada chamada (ex.: fb.fetchall(...)) empresta sua própria conexão do pool, então a
+    latência passa a ser a da consulta mais lenta. Se alguma falhar, aguarda as demais
+    (para que as conexões voltem ao pool) e propaga o primeiro erro.
+    """
+    resultados = await asyncio.gather(*chamadas, return_exceptions=True)
+    for resultado in resultados:
+        if isinstance(resultado, BaseException):
+            raise resultado
+    return resultados
+
+
+class FirebirdAsyncConnection:
+    """Conexão do pool emprestada para uma sequência de comandos"""
+
+    def __init__(self, conn, pool=None, item=None):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        # Pool e item da conexão, usados no cache de comandos preparados
+        self.pool = pool
+        self.item = item
+        self.lotes = 0
+
+    def _carregar_listas(self, params):
+        """
+        Carrega as listas grandes de filtro na BI_FILTRO_LISTA e troca cada uma pelo
+        número do lote. A tabela é temporária por transação: as linhas somem no
+        rollback feito quando a conexão volta ao pool.
+        """
+        if not any(isinstance(param, ListaFiltro) for param in params):
+            return params
+        resultado = []
+        for param in params:
+            if isinstance(param, ListaFiltro):
+                self.lotes += 1
+                valores = list(dict.fromkeys(valor for valor in param.valores if valor != ""))
+                comando = _comando_lista(param.coluna)
+                for inicio in range(0, len(valores), FB_LISTA_BLOCO):
+                    bloco = valores[inicio:inicio + FB_LISTA_BLOCO]
+                    bloco.extend([bloco[-1]] * (FB_LISTA_BLOCO - len(bloco)))
+                    self._executar(comando, (self.lotes, *bloco))
+                param = self.lotes
+            resultado.append(param)
+        return tuple(resultado)
+
+    def _execute(self, query, params):
+        self._executar(query, self._carregar_listas(params))
+
+    def _executar(self, query, params):
+        if self.pool is None:
+            self.cursor.execute(query, params)
+            return
+        comando = self.pool.preparar(self.item, self.cursor, query)
+        try:
+            self.cursor.execute(comando, params)
+        except Exception:
+            # Comando que falhou (ex.: metadados alterados) é preparado de novo na próxima vez
+            self.pool.esquecer(self.item, query)
+            raise
+
+    def _execute_fetchall(self, query, params):
+        self._execute(query, params)
+        return self.cursor.fetchall()
+
+    def _execute_fetchone(self, query, params):
+        self._execute(query, params)
+        return self.cursor.fetchone()
+
+    async def execute(self, query: str, params: tuple = ()):
+        await run_firebird(self._execute, query, params)
+
+    async def fetchall(self, query: str, params: tuple = ()) -> list:
+        return await run_firebird(self._execute_fetchall, query, params)
+
+    async def fetchone(self, query: str, params: tuple = ()):
+        return await run_firebird(self._execute_fetchone, query, params)
+
+    async def fetchmany(self, size: int) -> list:
+        """Próximo lote do último comando executado"""
+        return await run_firebird(self.cursor.fetchmany, size)
+
+
+class FirebirdAsync:
+    """Acesso assíncrono ao banco Firebird de um tenant"""
+
+    def __init__(self, HOST: str, PORT: int, DATABASE: str):
+        self.pool = get_firebird_pool(HOST, PORT, DATABASE)
+
+    async def _acquire(self):
+        futuro = asyncio.get_running_loop().run_in_executor(_executor, self.pool.acquire)
+        try:
+            return await asyncio.shield(futuro)
+        except asyncio.CancelledError:
+            # Requisição cancelada durante a espera: devolve a conexão assim que ela chegar
+            def devolver(f):
+                if not f.cancelled() and f.exception() is None:
+                    _executor.submit(self.pool.release, f.result())
+            futuro.add_done_callback(devolver)
+            raise
+
+    @asynccontextmanager
+    async def connection(self):
+        """Empresta uma conexão do pool, respeitando o limite de concorrência do tenant"""
+        async with _semaforo(self.pool):
+            item = await self._acquire()
+            conexao = None
+            descartar = False
+            try:
+                conexao = FirebirdAsyncConnection(item.conn, self.pool, item)
+                yield conexao
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=501, detail=f"Erro na operação Firebird: {str(e)}")
+            finally:
+                if conexao:
+                    try:
+                        await run_firebird(conexao.cursor.close)
+                    except Exception:
+                        descartar = True
+                await run_firebird(self.pool.release, item, descartar)
+
+    async def fetchall(self, query: str, params: tuple = ()) -> list:
+        """Executa a consulta em uma conexão do pool e retorna todas as linhas"""
+        async with self.connection() as conexao:
+            return await conexao.fetchall(query, params)
+
+    async def fetchone(self, query: str, params: tuple = ()):
+        """Executa a consulta em uma conexão do pool e retorna a primeira linha"""
+        async with self.connection() as conexao:
+            return await conexao.fetchone(query, params)
+
+    async def lotes(self, query: str, params: tuple = (), tamanho: int = 1000):
+        """
+        Executa a consulta e entrega as linhas em lotes de até `tamanho` (fetchmany).
+        A conexão fica emprestada até a leitura terminar ou o gerador ser fechado.
+        """
+        async with self.connection() as conexao:
+            await conexao.execute(query, params)
+            while True:
+                lote = await conexao.fetchmany(tamanho)
+                if not lote:
+                    break
+                yield lote
+
+
+@asynccontextmanager
+async def firebird_async_manager(HOST: str, PORT: int, DATABASE: str):
+    """Context manager assíncrono para acesso ao Firebird de um tenant"""
+    try:
+        yield FirebirdAsync(HOST, PORT, DATABASE)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=501, detail=f"Erro na operação Firebird: {str(e)}")
@@ -0,0 +1,111 @@
+from app.db.executorfb import FirebirdAsync
+from app.utils.singleflight import SingleFlight
+from app.utils.filtrosbi import inicio_mes
+from datetime import date, datetime
+from dotenv import load_dotenv
+import logging
+import time
+import re
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo (segundos) entre duas sondagens do mesmo tenant
+BI_FRESCOR_INTERVALO = float(os.getenv("BI_FRESCOR_INTERVALO", "15"))
+# Generators adicionais lidos com GEN_ID(nome, 0), separados por vírgula
+BI_FRESCOR_GENERATORS = [g.strip().upper() for g in os.getenv("BI_FRESCOR_GENERATORS", "").split(",") if g.strip()]
+
+# Marcas d'água das tabelas de origem das views BI, lidas em uma única ida ao servidor.
+# Tudo é limitado aos meses recentes: o Firebird só resolve MAX pelo índice quando ele é
+# descendente, e os da V001 são ascendentes. Com o filtro de data, MAX e COUNT leem só
+# a faixa recente pelos índices ascendentes em vez de varrer o histórico.
+SONDA_FRESCOR = """
+    SELECT
+        (SELECT MAX(datarecbto) FROM factrc WHERE datarecbto >= ?),
+        (SELECT COUNT(*) FROM factrc WHERE datarecbto >= ?),
+        (SELECT MAX(datavencto) FROM factrc WHERE datavencto >= ?),
+        (SELECT MAX(dataemissao) FROM frctrc WHERE dataemissao >= ?),
+        (SELECT COUNT(*) FROM frctrc WHERE dataemissao >= ?),
+        (SELECT MAX(datamovto) FROM cptit WHERE datamovto >= ?),
+        (SELECT COUNT(*) FROM cptit WHERE datamovto >= ?){generators}
+    FROM
+        RDB$DATABASE
+"""
+PARAMETROS_SONDA = 7
+
+
+def inicio_sonda(hoje: date = None) -> date:
+    """Primeira data coberta pela sonda (início do mês anterior)"""
+    return inicio_mes(hoje or date.today(), -1)
+
+
+def montar_sonda(generators: list) -> str:
+    for nome in generators:
+        if not re.fullmatch(r"[A-Z][A-Z0-9_$]*", nome):
+            raise ValueError(f"Nome de generator inválido: {nome}")
+    colunas = "".join(f",\n        GEN_ID({nome}, 0)" for nome in generators)
+    return SONDA_FRESCOR.format(generators=colunas)
+
+
+class SondaFrescor:
+    """
+    Sonda barata de frescor por tenant: lê as marcas d'água (MAX/COUNT das datas
+    recentes das tabelas de origem e generators) para decidir se os resultados em
+    cache continuam válidos. Baixas de títulos mudam só o vlrsaldo e não aparecem
+    na marca (ver BI_CACHE_ENDPOINTS_SALDO). Limitada a uma sondagem por tenant a cada `intervalo` segundos
+    e compartilhada por todos os endpoints.
+    """
+
+    def __init__(self, intervalo: float = BI_FRESCOR_INTERVALO, generators: list = BI_FRESCOR_GENERATORS):
+        self.intervalo = intervalo
+        self.query = montar_sonda(generators)
+        self._marcas = {}
+        self._voos = SingleFlight()
+        self._sondagens = 0
+        self._falhas = 0
+        self._mudancas = 0
+        self._ultima_falha = None
+
+    async def _sondar(self, conn_data: dict):
+        desde = inicio_sonda()
+        fb = FirebirdAsync(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd'])
+        row = await fb.fetchone(self.query, (desde,) * PARAMETROS_SONDA)
+        marca = tuple(str(valor) for valor in row)
+        self._sondagens += 1
+        chave = (conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd'])
+        anterior = self._marcas.get(chave)
+        if anterior is not None and anterior[1] != marca:
+            self._mudancas += 1
+        self._marcas[chave] = (time.monotonic(), marca)
+        return marca
+
+    async def obter(self, conn_data: dict):
+        """Marca d'água atual do tenant, ou None se a sondagem falhar"""
+        chave = (conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd'])
+        anterior = self._marcas.get(chave)
+        if anterior is not None and time.monotonic() - anterior[0] < self.intervalo:
+            return anterior[1]
+
+        try:
+            return await self._voos.executar(chave, lambda: self._sondar(conn_data))
+        except Exception as e:
+            # Sem marca o cache volta ao TTL do endpoint. O detalhe vai para o log com o
+            # traceback; as métricas (visíveis a todos os tenants) só mostram o tipo do erro
+            self._falhas += 1
+            self._ultima_falha = {"erro": type(e).__name__, "em": datetime.now().isoformat(timespec="seconds")}
+            logger.warning("Falha na sonda de frescor de %s", chave, exc_info=True)
+            return None
+
+    def stats(self) -> dict:
+        return {
+            "tenants": len(self._marcas),
+            "sondagens": self._sondagens,
+            "falhas": self._falhas,
+            "mudancas": self._mudancas,
+            "ultima_falha": self._ultima_falha,
+        }
+
+
+sonda_frescor = SondaFrescor()
@@ -0,0 +1,360 @@
+from app.db.conexaofb import listar_firebird_pools, FirebirdPool
+from app.db.executorfb import FirebirdAsync, run_firebird
+from datetime import date, timedelta
+from dotenv import load_dotenv
+import logging
+import time
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Resumos diários (migração V003) mantidos e usados pela API; desligado por padrão
+BI_RESUMO_ATIVO = os.getenv("BI_RESUMO_ATIVO", "0") == "1"
+# Intervalo (segundos) entre duas atualizações dos resumos de um tenant
+BI_RESUMO_INTERVALO = float(os.getenv("BI_RESUMO_INTERVALO", "300"))
+# Dias recentes sempre recalculados (absorvem exclusões e mudanças de data, que a marca não vê)
+BI_RESUMO_DIAS_ABERTOS = int(os.getenv("BI_RESUMO_DIAS_ABERTOS", "45"))
+# Dias recalculados por transação: cada lote empresta a conexão só pelo tempo dele
+BI_RESUMO_DIAS_LOTE = int(os.getenv("BI_RESUMO_DIAS_LOTE", "366"))
+# Dias antes da janela aberta em que se procuram linhas alteradas desde a marca (pelo índice
+# da data); alterações mais antigas ficam para a reconciliação completa
+BI_RESUMO_DIAS_ALTERADOS = int(os.getenv("BI_RESUMO_DIAS_ALTERADOS", "365"))
+# Intervalo (dias) entre duas reconciliações completas de cada resumo (0 desliga)
+BI_RESUMO_RECONCILIAR_DIAS = float(os.getenv("BI_RESUMO_RECONCILIAR_DIAS", "7"))
+
+# Limites do histórico usados nas cargas completas e na janela aberta
+INICIO_HISTORICO = date(1900, 1, 1)
+FIM_HISTORICO = date(9999, 12, 31)
+
+# Tabela de resumo -> comando que a recalcula em um intervalo de datas (mesma semântica das views)
+RESUMOS = {
+    "BI_RESUMO_FACTRC_DIA": """
+        INSERT INTO BI_RESUMO_FACTRC_DIA
+            (DATA, CODFILIAL, CODCLIENTE, CODCID, CIDADE, CODUF, REGIAO, CODCID_REGIAO, CODPRO, SITUACAO,
+             VLRRECBTO, VLRSALDO, QTDE)
+        SELECT
+            datarecbto, codfilial, codcliente, codcid, cidade, coduf, regiao, codcid_regiao, codpro,
+            CASE WHEN vlrsaldo = 0 THEN 'R' ELSE 'A' END,
+            SUM(vlrrecbto), SUM(vlrsaldo), COUNT(*)
+        FROM
+            VWFACTRC_BI
+        WHERE
+            datarecbto BETWEEN ? AND ?
+        GROUP BY
+            datarecbto, codfilial, codcliente, codcid, cidade, coduf, regiao, codcid_regiao, codpro,
+            CASE WHEN vlrsaldo = 0 THEN 'R' ELSE 'A' END
+    """,
+    "BI_RESUMO_FRCTRC_DIA": """
+        INSERT INTO BI_RESUMO_FRCTRC_DIA
+            (DATA, CODFILIAL, CODCLIENTE, CODCID, CIDADE, CODUF, REGIAO, CODCID_REGIAO, CODPRO, SITUACAO,
+             VLRCUSTO, VLRPEDAGIO, PESOFRETE_TON, EMBARQUE, FATURADO, QTDE)
+        SELECT
+            dataemissao, codfilial, codcliente, codcid, cidade, coduf, regiao, codcid_regiao, codpro, situacao,
+            SUM(vlrcusto), SUM(vlrpedagio), SUM(pesofrete_ton), SUM(embarque), SUM(faturado), COUNT(*)
+        FROM
+            VWFRCTRC_BI
+        WHERE
+            dataemissao BETWEEN ? AND ?
+        GROUP BY
+            dataemissao, codfilial, codcliente, codcid, cidade, coduf, regiao, codcid_regiao, codpro, situacao
+    """,
+}
+
+# Tabela de resumo -> (tabela de origem, coluna do dia): onde procurar os dias alterados
+# (as colunas têm índice na V001: IDX_BI_FACTRC_DATARECBTO e IDX_BI_FRCTRC_EMISSAO)
+ORIGENS_RESUMO = {
+    "BI_RESUMO_FACTRC_DIA": ("FACTRC", "DATARECBTO"),
+    "BI_RESUMO_FRCTRC_DIA": ("FRCTRC", "DATAEMISSAO"),
+}
+
+# View -> tabela derivada sobre o resumo com as mesmas colunas usadas pelos KPIs,
+# para que as consultas (e os filtros de filtros_ramo) sirvam para as duas fontes
+FONTES_RESUMO = {
+    "VWFACTRC_BI": """(
+                    SELECT
+                        r.data AS datarecbto,
+                        EXTRACT(YEAR FROM r.data) AS ano_recbto,
+                        EXTRACT(MONTH FROM r.data) AS mes_numero,
+                        EXTRACT(DAY FROM r.data) AS dia_recbto,
+                        m.nome AS mes_recbto,
+                        r.codfilial,
+                        t.nome AS filial,
+                        r.codcliente,
+                        r.codcid,
+                        r.cidade,
+                        r.coduf,
+                        r.regiao,
+                        r.codcid_regiao,
+                        r.codpro,
+                        r.vlrrecbto,
+                        r.vlrsaldo
+                    FROM
+                        BI_RESUMO_FACTRC_DIA r
+                    LEFT JOIN tbfil t ON t.codfil = r.codfilial
+                    LEFT JOIN bi_mes m ON m.mes_numero = EXTRACT(MONTH FROM r.data)
+                ) resumo_factrc""",
+    "VWFRCTRC_BI": """(
+                    SELECT
+                        r.data AS dataemissao,
+                        EXTRACT(YEAR FROM r.data) AS ano_emissao,
+                        EXTRACT(MONTH FROM r.data) AS mes_numero,
+                        EXTRACT(DAY FROM r.data) AS dia_emissao,
+                        m.nome AS mes_emissao,
+                        r.codfilial,
+                        t.nome AS filial,
+                        r.codcliente,
+                        r.codcid,
+                        r.cidade,
+                        r.coduf,
+                        r.regiao,
+                        r.codcid_regiao,
+                        r.codpro,
+                        r.situacao,
+                        r.pesofrete_ton,
+                        r.embarque,
+                        r.faturado,
+                        r.vlrcusto,
+                        r.vlrpedagio
+                    FROM
+                        BI_RESUMO_FRCTRC_DIA r
+                    LEFT JOIN tbfil t ON t.codfil = r.codfilial
+                    LEFT JOIN bi_mes m ON m.mes_numero = EXTRACT(MONTH FROM r.data)
+                ) resumo_frctrc""",
+}
+
+
+def intervalos_dias(dias: list, lote: int) -> list:
+    """Dias ordenados agrupados em intervalos [início, fim] de dias seguidos, com até `lote` dias cada"""
+    intervalos = []
+    for dia in dias:
+        if intervalos:
+            inicio, fim = intervalos[-1]
+            if dia - fim == timedelta(days=1) and (dia - inicio).days < lote:
+                intervalos[-1] = (inicio, dia)
+                continue
+        intervalos.append((dia, dia))
+    return intervalos
+
+
+def dividir_intervalo(inicio: date, fim: date, lote: int) -> list:
+    """Intervalo [início, fim] em pedaços de até `lote` dias"""
+    return intervalos_dias([inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)], lote)
+
+
+class ResumoBI:
+    """
+    Manutenção incremental dos resumos diários do BI por tenant, guiada por marca d'água:
+    BI_RESUMO_CONTROLE guarda, por resumo, a transação mais antiga ativa (OAT) no início
+    da última atualização. Na seguinte, os dias das linhas de origem gravadas depois dela
+    (RDB$RECORD_VERSION, Firebird 3 ou superior) nos BI_RESUMO_DIAS_ALTERADOS dias antes da
+    janela são recalculados junto com os últimos BI_RESUMO_DIAS_ABERTOS dias. Alterações
+    mais antigas, exclusões e mudanças de data não entram nessa busca (ou não deixam versão
+    nova na origem): a reconciliação completa (BI_RESUMO_RECONCILIAR_DIAS) as absorve.
+    As consultas usam os resumos apenas dos tenants já atualizados por este processo.
+    """
+
+    def __init__(self, ativo: bool = BI_RESUMO_ATIVO, intervalo: float = BI_RESUMO_INTERVALO,
+                 dias_abertos: int = BI_RESUMO_DIAS_ABERTOS, dias_lote: int = BI_RESUMO_DIAS_LOTE,
+                 dias_alterados: int = BI_RESUMO_DIAS_ALTERADOS,
+                 reconciliar_dias: float = BI_RESUMO_RECONCILIAR_DIAS):
+        self.ativo = ativo
+        self.intervalo = intervalo
+        self.dias_abertos = dias_abertos
+        self.dias_lote = max(dias_lote, 1)
+        self.dias_alterados = dias_alterados
+        self.reconciliar_dias = reconciliar_dias
+        # (ipbd, portabd, caminhobd) -> ATUALIZADO_EM do último resumo conhecido
+        self._versoes = {}
+        self._sem_tabelas = set()
+        self._atualizacoes = 0
+        self._reconciliacoes = 0
+        self._ignoradas = 0
+        self._falhas = 0
+        self._dias_alterados = 0
+        self._segundos = 0.0
+
+    def disponivel(self, conn_data: dict) -> bool:
+        """Os resumos do tenant existem e já foram atualizados"""
+        return self.ativo and self._chave(conn_data) in self._versoes
+
+    def versao(self, conn_data: dict):
+        """Momento da última atualização dos resumos do tenant (entra na marca de frescor)"""
+        return self._versoes.get(self._chave(conn_data))
+
+    def fonte(self, view: str, conn_data: dict) -> str:
+        """Origem a usar no FROM no lugar da view: o resumo diário, quando disponível"""
+        if view in FONTES_RESUMO and self.disponivel(conn_data):
+            return FONTES_RESUMO[view]
+        return view
+
+    @staticmethod
+    def _chave(conn_data: dict) -> tuple:
+        return (conn_data['ipbd'], int(conn_data['portabd']), conn_data['caminhobd'])
+
+    @staticmethod
+    def _ler_controle(cursor):
+        """
+        Estado dos resumos: ({tabela: (idade em segundos, marca, idade da reconciliação)},
+        OAT atual, versão do servidor), ou None sem a migração V003. As idades são
+        calculadas no servidor, que grava ATUALIZADO_EM no seu próprio fuso.
+        """
+        cursor.execute("SELECT COUNT(*) FROM RDB$RELATIONS WHERE RDB$RELATION_NAME = 'BI_RESUMO_CONTROLE'")
+        if cursor.fetchone()[0] == 0:
+            return None
+        cursor.execute("""
+            SELECT
+                TRIM(TABELA),
+                DATEDIFF(SECOND FROM ATUALIZADO_EM TO CURRENT_TIMESTAMP),
+                MARCA_TRANSACAO,
+                DATEDIFF(SECOND FROM RECONCILIADO_EM TO CURRENT_TIMESTAMP)
+            FROM
+                BI_RESUMO_CONTROLE
+        """)
+        controle = {row[0]: row[1:] for row in cursor.fetchall()}
+        cursor.execute("""
+            SELECT MON$OLDEST_ACTIVE, RDB$GET_CONTEXT('SYSTEM', 'ENGINE_VERSION')
+            FROM MON$DATABASE
+        """)
+        oat, versao = cursor.fetchone()
+        return controle, oat, int(versao.split(".")[0])
+
+    @staticmethod
+    def _buscar_dias_alterados(cursor, tabela: str, marca: int, desde: date, antes_de: date) -> list:
+        """
+        Dias em [desde, antes_de) com linhas de origem gravadas desde a marca.
+        RDB$RECORD_VERSION não tem índice: o intervalo na coluna do dia limita a leitura
+        ao trecho do índice da data, em vez da origem inteira.
+        """
+        origem, coluna = ORIGENS_RESUMO[tabela]
+        cursor.execute(
+            f"SELECT DISTINCT {coluna} FROM {origem} "
+            f"WHERE {coluna} >= ? AND {coluna} < ? AND RDB$RECORD_VERSION >= ?",
+            (desde, antes_de, marca),
+        )
+        return sorted(row[0] for row in cursor.fetchall())
+
+    @staticmethod
+    def _inicio_origem(cursor, tabela: str):
+        """Primeiro dia da origem (MIN resolvido pelo índice ascendente da V001)"""
+        origem, coluna = ORIGENS_RESUMO[tabela]
+        cursor.execute(f"SELECT MIN({coluna}) FROM {origem}")
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def _recalcular(conn, cursor, tabela: str, inicio: date, fim: date, tpb=None):
+        # As conexões do pool abrem transações somente leitura: a gravação pede o perfil com escrita
+        conn.begin(tpb)
+        cursor.execute(f"DELETE FROM {tabela} WHERE DATA BETWEEN ? AND ?", (inicio, fim))
+        cursor.execute(RESUMOS[tabela], (inicio, fim))
+        conn.commit()
+
+    @staticmethod
+    def _registrar(conn, cursor, tabela: str, recalculado_desde: date, marca, completo: bool, tpb=None):
+        conn.begin(tpb)
+        cursor.execute(
+            "UPDATE OR INSERT INTO BI_RESUMO_CONTROLE "
+            "(TABELA, RECALCULADO_DESDE, ATUALIZADO_EM, MARCA_TRANSACAO, RECONCILIADO_EM) "
+            "VALUES (?, ?, CURRENT_TIMESTAMP, ?, CASE WHEN ? = 1 THEN CURRENT_TIMESTAMP "
+            "ELSE (SELECT RECONCILIADO_EM FROM BI_RESUMO_CONTROLE WHERE TABELA = ?) END) "
+            "MATCHING (TABELA)",
+            (tabela, recalculado_desde, marca, 1 if completo else 0, tabela),
+        )
+        conn.commit()
+
+    async def _intervalos(self, fb: FirebirdAsync, tabela: str, estado, versao: int):
+        """Intervalos a recalcular e se a atualização é completa (carga inicial ou reconciliação)"""
+        janela = date.today() - timedelta(days=self.dias_abertos)
+        idade, marca, idade_reconciliacao = estado or (None, None, None)
+        completo = (
+            estado is None
+            or idade_reconciliacao is None
+            or (self.reconciliar_dias > 0 and idade_reconciliacao >= self.reconciliar_dias * 86400)
+        )
+        async with fb.connection() as conexao:
+            if completo:
+                inicio = await run_firebird(self._inicio_origem, conexao.cursor, tabela)
+                antigos = dividir_intervalo(inicio, janela - timedelta(days=1), self.dias_lote) \
+                    if inicio and inicio < janela else []
+            elif marca is not None and versao >= 3 and self.dias_alterados > 0:
+                desde = janela - timedelta(days=self.dias_alterados)
+                dias = await run_firebird(self._buscar_dias_alterados, conexao.cursor, tabela, marca, desde, janela)
+                self._dias_alterados += len(dias)
+                antigos = intervalos_dias(dias, self.dias_lote)
+            else:
+                # Firebird 2.5 não tem RDB$RECORD_VERSION (ou a busca foi desligada):
+                # até a próxima reconciliação vale só a janela
+                antigos = []
+        return antigos + [(janela, FIM_HISTORICO)], completo
+
+    async def atualizar(self, pool: FirebirdPool):
+        """
+        Atualiza os resumos do banco do pool. Cada intervalo é recalculado em uma transação
+        e com uma conexão emprestada pelo FirebirdAsync, respeitando o limite de concorrência
+        do tenant: a carga inicial não segura uma conexão do pool durante minutos.
+        """
+        chave = (pool.host, pool.port, pool.database)
+        if chave in self._sem_tabelas:
+            return
+        fb = FirebirdAsync(pool.host, pool.port, pool.database)
+        try:
+            async with fb.connection() as conexao:
+                estado = await run_firebird(self._ler_controle, conexao.cursor)
+            if estado is None:
+                # Migração V003 não aplicada neste banco
+                self._sem_tabelas.add(chave)
+                return
+            controle, oat, versao = estado
+
+            # Outro processo (worker) pode ter atualizado há pouco
+            idades = [controle[tabela][0] if tabela in controle else None for tabela in RESUMOS]
+            if all(idade is not None for idade in idades) and min(idades) < self.intervalo / 2:
+                self._ignoradas += 1
+                self._versoes[chave] = await self._ultima_atualizacao(fb)
+                return
+
+            inicio = time.monotonic()
+            for tabela in RESUMOS:
+                intervalos, completo = await self._intervalos(fb, tabela, controle.get(tabela), versao)
+                for de, ate in intervalos:
+                    async with fb.connection() as conexao:
+                        await run_firebird(self._recalcular, conexao.conn, conexao.cursor, tabela, de, ate, pool.tpb_escrita)
+                # A marca só avança depois de todos os intervalos: se algo falhar, a próxima refaz
+                async with fb.connection() as conexao:
+                    await run_firebird(self._registrar, conexao.conn, conexao.cursor, tabela, intervalos[0][0],
+                                       oat if versao >= 3 else None, completo, pool.tpb_escrita)
+                if completo:
+                    self._reconciliacoes += 1
+            self._segundos += time.monotonic() - inicio
+            self._atualizacoes += 1
+            self._versoes[chave] = await self._ultima_atualizacao(fb)
+        except Exception:
+            self._falhas += 1
+            logger.exception("Falha ao atualizar os resumos do BI do pool %s", pool.identificador)
+
+    @staticmethod
+    async def _ultima_atualizacao(fb: FirebirdAsync) -> str:
+        row = await fb.fetchone("SELECT MAX(ATUALIZADO_EM) FROM BI_RESUMO_CONTROLE")
+        return str(row[0])
+
+    async def atualizar_todos(self):
+        """Atualiza os resumos dos tenants com pool aberto (os que estão usando o BI)"""
+        for pool in listar_firebird_pools():
+            await self.atualizar(pool)
+
+    def stats(self) -> dict:
+        return {
+            "ativo": self.ativo,
+            "tenants": len(self._versoes),
+            "sem_tabelas": len(self._sem_tabelas),
+            "atualizacoes": self._atualizacoes,
+            "reconciliacoes": self._reconciliacoes,
+            "ignoradas": self._ignoradas,
+            "falhas": self._falhas,
+            "dias_alterados": self._dias_alterados,
+            "segundos": round(self._segundos, 3),
+        }
+
+
+resumo_bi = ResumoBI()
@@ -1,10 +1,50 @@
 import uvicorn
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.routers import usuarioRouter
 from app.routers import empresaRouter
 from app.routers import loginRouter
 from app.middleware.auditoria import AuditoriaMiddleware
 from app.routers import BIRouter
+from app.db.conexaofb import limpar_firebird_pools, close_firebird_pools, FB_POOL_IDLE_TIMEOUT
+from app.db.executorfb import shutdown_executor_firebird
+from app.db.conexaopg import init_pg_pool, close_pg_pool
+from app.db.resumobi import resumo_bi
+
+logger = logging.getLogger(__name__)
+
+# Rotina periódica que fecha conexões Firebird ociosas ou vencidas e completa o mínimo dos pools
+async def limpeza_pools_firebird():
+    intervalo = max(FB_POOL_IDLE_TIMEOUT / 2, 10)
+    while True:
+        await asyncio.sleep(intervalo)
+        await asyncio.to_thread(limpar_firebird_pools)
+
+# Rotina periódica que atualiza os resumos diários do BI dos tenants em uso
+async def atualizacao_resumos_bi():
+    while True:
+        await asyncio.sleep(resumo_bi.intervalo)
+        try:
+            await resumo_bi.atualizar_todos()
+        except Exception:
+            logger.exception("Falha na atualização dos resumos do BI")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_pg_pool()
+    tarefa_limpeza = asyncio.create_task(limpeza_pools_firebird())
+    tarefa_resumos = asyncio.create_task(atualizacao_resumos_bi()) if resumo_bi.ativo else None
+    try:
+        yield
+    finally:
+        tarefa_limpeza.cancel()
+        if tarefa_resumos:
+            tarefa_resumos.cancel()
+        shutdown_executor_firebird()
+        await asyncio.to_thread(close_firebird_pools)
+        await close_pg_pool()
 
 app = FastAPI(
     docs_url="/docs",
@@ -14,6 +54,7 @@ app = FastAPI(
     description="API para controle de usuários e empresas dos produtos SoftCenter",
     version="1.0.0",
     root_path="/sftlogin",  # Define o prefixo base para toda a API
+    lifespan=lifespan,
 )
 
 
@@ -9,6 +9,7 @@ from jose import jwt, JWTError, ExpiredSignatureError
 from app.auth.auth import SECRET_KEY, ALGORITHM
 from starlette.responses import JSONResponse, StreamingResponse
 from typing import Any
+from app.utils.streambi import MEDIA_TYPES_STREAM
 
 class AuditoriaMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -51,21 +52,27 @@ class AuditoriaMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         status_code = response.status_code
 
+        # Exportações em streaming (NDJSON/CSV) não são lidas para o log: seguem direto ao cliente
+        media_type = response.headers.get("content-type", "").split(";")[0].strip()
+        streaming = media_type in MEDIA_TYPES_STREAM
+
         # Captura o body da resposta corretamente
         response_body = b""
-        async for chunk in response.body_iterator:
-            response_body += chunk
+        if not streaming:
+            async for chunk in response.body_iterator:
+                response_body += chunk
 
-        body_response = response_body.decode("utf-8")
+        body_response = None if streaming else response_body.decode("utf-8")
 
-        # Remove quebras de linha indesejadas e espaços extras
-        body_response = body_response.replace("\\n", "").strip()
+        if body_response is not None:
+            # Remove quebras de linha indesejadas e espaços extras
+            body_response = body_response.replace("\\n", "").strip()
 
-        # Se for JSON, convertemos para um dicionário
-        try:
-            body_response = json.loads(body_response)  # Se for JSON válido, converte para dict
-        except (json.JSONDecodeError, TypeError):
-            pass  # Se já for dict ou não for JSON, mantém como está
+            # Se for JSON, convertemos para um dicionário
+            try:
+                body_response = json.loads(body_response)  # Se for JSON válido, converte para dict
+            except (json.JSONDecodeError, TypeError):
+                pass  # Se já for dict ou não for JSON, mantém como está
 
         # Captura o token do corpo da resposta se o endpoint for /login
         if endpoint == "/login":
@@ -97,6 +104,9 @@ class AuditoriaMiddleware(BaseHTTPMiddleware):
         db.add(log)
         await db.commit()
 
+        if streaming:
+            return response
+
         # Ajuste no retorno da API (StreamingResponse)
         # Se response_body for um dicionário, convertemos para string JSON
         if isinstance(response_body, dict):  
@@ -1,189 +1,263 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from datetime import date, timedelta
-from typing import List
+from contextlib import aclosing
+from typing import List, Optional
 from fastapi.security import OAuth2PasswordBearer 
-from app.db.conexaopg import pg_connection_manager
-from app.db.conexaofb import firebird_connection_manager
+from app.db.conexaopg import pg_connection_manager, get_pg_pool_stats
+from app.db.conexaofb import get_firebird_pool_stats
+from app.db.executorfb import firebird_async_manager, executar_paralelo
+from app.db.cacheconexao import cache_conexao_tenant
+from app.db.frescorfb import sonda_frescor, inicio_sonda
+from app.db.resumobi import resumo_bi
 from app.auth.auth import decode_access_token
 from app.schemas.BIschemas import *
+from app.utils.singleflight import SingleFlight
+from app.utils.cachebi import cache_bi, cache_periodos_fechados
+from app.utils.consultabi import CONSULTAS_BI, BI_PAGINA_PADRAO, BI_PAGINA_MAX
+from app.utils.streambi import formato_stream, resposta_stream, tamanho_lote, BI_STREAM_LOTE
+from app.utils.respostabi import resposta_bi
+from app.utils.filtrosbi import canonizar_filtros, inicio_mes, filtros_ramo, filtros_codigo, condicao_fatura, stats_filtros, RAMO_FACTRC, RAMO_FRCTRC
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
 
 router = APIRouter()
 
 # Recurso para autenticação com token (OAuth2)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Função helper para normalizar filtros (converter valor único em lista)
-def normalize_filter(value):
-    if value is None:
-        return None
-    if isinstance(value, list):
-        return value
-    return [value]
+# Meses antes do atual que o kpi_mes_ano ainda recalcula (absorve lançamentos tardios)
+KPI_MES_ANO_MESES_ABERTOS = int(os.getenv("KPI_MES_ANO_MESES_ABERTOS", "1"))
 
-# Função para obter os dados de conexão do Firebird
-async def get_firebird_connection_data(idempresa: int):
+# Busca no PostgreSQL os dados de conexão do Firebird da empresa
+async def _buscar_conexao_empresa(idempresa: int):
     async with pg_connection_manager() as conn:
         # Recupera as informações de conexão do Firebird
         row = await conn.fetchrow(
-            "select t.ipbd, t.portabd, t.caminhobd from tbempresas t where t.codempresa = $1", int(idempresa)
+            "select t.ipbd, t.portabd, t.caminhobd from tbempresas t where t.codempresa = $1", idempresa
         )
-        if not row:
-            raise HTTPException(status_code=404, detail="Configuração de conexão não encontrada")
-        return dict(row)
+        return dict(row) if row else None
 
-@router.post("/bi/big_numbers", tags=["BI"], response_model=List[BigNumbers], status_code=status.HTTP_200_OK)
-async def get_big_numbers(
-    consulta: FiltrosBI = FiltrosBI(),
-    token: str = Depends(oauth2_scheme)
-):
+# Função para obter os dados de conexão do Firebird (servidos do cache em memória)
+async def get_firebird_connection_data(idempresa: int):
+    conn_data = await cache_conexao_tenant.obter(int(idempresa), _buscar_conexao_empresa)
+    if not conn_data:
+        raise HTTPException(status_code=404, detail="Configuração de conexão não encontrada")
+    return conn_data
 
+# Coalescência das consultas BI idênticas em andamento
+singleflight_bi = SingleFlight()
+
+# Endpoints cujos dados não vêm das tabelas cobertas pela sonda de frescor (ficam só com o TTL)
+ENDPOINTS_SEM_MARCA = {"filtro_filial", "filtro_cliente", "filtro_fornecedor", "filtro_transacao"}
+
+# Endpoints servidos pelos resumos diários (app/db/resumobi.py), quando disponíveis
+ENDPOINTS_RESUMO = {"kpi_mes_ano", "kpi_dia_mes_atual", "kpi_filial", "kpi_regiao", "kpi_cidade"}
+
+# Endpoints que leem só o mês atual e os que leem de data_inicio (padrão: data_fim - 30 dias)
+# em diante, pela mesma coluna de data vigiada pela sonda de frescor
+ENDPOINTS_MES_ATUAL = {"kpi_dia_mes_atual", "recebimentos_dia_mes_atual", "contas_pagar_dia_mes_atual"}
+ENDPOINTS_DESDE_DATA_INICIO = {"kpi_filial", "kpi_regiao", "kpi_cidade", "kpi_cliente", "kpi_produto",
+                               "tabela_faturamento_total"}
+
+def periodo_recente(endpoint: str, consulta: FiltrosBI) -> bool:
     """
-    Consulta big numbers usando POST com schema de entrada.
-    Permite consultas mais complexas no futuro.
+    Se tudo o que o endpoint lê está dentro da janela da sonda de frescor, de modo que
+    a marca d'água cobre qualquer alteração no resultado (os demais, como os que
+    comparam com o ano anterior, ficam com o TTL do endpoint)
     """
-    # Verifica o token
-    payload = decode_access_token(token)
-    idempresa = payload.get("empresa")
+    hoje = date.today()
+    if endpoint in ENDPOINTS_MES_ATUAL:
+        inicio = inicio_mes(hoje)
+    elif endpoint == "kpi_mes_ano":
+        # Os meses fechados vêm do cache de períodos fechados; o Firebird lê só os abertos
+        inicio = inicio_mes(hoje, -KPI_MES_ANO_MESES_ABERTOS)
+    elif endpoint in ENDPOINTS_DESDE_DATA_INICIO:
+        inicio = consulta.data_inicio or ((consulta.data_fim or hoje) - timedelta(days=30))
+    else:
+        return False
+    return inicio >= inicio_sonda(hoje)
+
+async def executar_consulta_bi(idempresa, endpoint: str, conn_data: dict, consulta: FiltrosBI, consultar):
+    """
+    Executa a consulta do endpoint para o tenant, passando pelo cache de resultados.
+    Requisições simultâneas idênticas (mesmo tenant, endpoint e filtros canônicos)
+    aguardam uma única execução. A data atual faz parte da chave porque os
+    períodos padrão dos filtros são relativos a ela.
+    """
+    chave = (int(idempresa), endpoint, date.today().isoformat(), canonizar_filtros(consulta))
 
-    if not idempresa:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID da empresa não encontrado no token")
-    
-    # Obtém os dados de conexão do Firebird
-    conn_data = await get_firebird_connection_data(idempresa)
+    async def carregar():
+        return await singleflight_bi.executar(chave, lambda: consultar(conn_data, consulta))
+
+    # Marca d'água do tenant: valida o cache sem depender só do TTL
+    marca = None if endpoint in ENDPOINTS_SEM_MARCA else await sonda_frescor.obter(conn_data)
+    if marca is not None and endpoint in ENDPOINTS_RESUMO:
+        # Resultado lido dos resumos diários: muda também quando eles são atualizados
+        marca = (marca, resumo_bi.versao(conn_data))
+
+    return await cache_bi.obter(chave, endpoint, carregar, marca, periodo_recente(endpoint, consulta))
+
+async def lotes_tabela_bi(conn_data: dict, endpoint: str, consulta: FiltrosBI, tamanho: int = BI_STREAM_LOTE):
+    """Linhas de um endpoint tabela_* em lotes, para as respostas em streaming (sem cache)"""
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
+        data_fim = consulta.data_fim or date.today()
+        data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
+
+        query, params = CONSULTAS_BI[endpoint].montar(consulta, data_inicio, data_fim)
+
+        # aclosing: se o cliente desconectar, o gerador interno devolve a conexão na hora
+        async with aclosing(fb.lotes(query, tuple(params), tamanho)) as lotes:
+            async for lote in lotes:
+                yield lote
 
+def _contar_tabela_bi(endpoint: str):
+    """Consulta de contagem das linhas de um endpoint tabela_* (para o cache de resultados)"""
+    async def contar(conn_data: dict, consulta: FiltrosBI):
+        async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
+            data_fim = consulta.data_fim or date.today()
+            data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
+
+            query, params = CONSULTAS_BI[endpoint].montar_total(consulta, data_inicio, data_fim)
+
+            row = await fb.fetchone(query, tuple(params))
+            return row[0] if row else 0
+    return contar
+
+async def pagina_tabela_bi(idempresa, conn_data: dict, endpoint: str, consulta: FiltrosBI, converter,
+                           limite: int, cursor: str = None, total: bool = False) -> dict:
+    """
+    Página de um endpoint tabela_* por keyset a partir do cursor recebido (None para a
+    primeira). O total de linhas é opcional e passa pelo cache de resultados.
+    """
+    consulta_bi = CONSULTAS_BI[endpoint]
+    data_fim = consulta.data_fim or date.today()
+    data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
+    assinatura = consulta_bi.assinatura(consulta)
+    apos = consulta_bi.decodificar_cursor(cursor, assinatura) if cursor else None
+
+    query, params = consulta_bi.montar_pagina(consulta, limite, apos, data_inicio, data_fim)
+
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
+        rows = await fb.fetchall(query, tuple(params))
+
+    if not rows and cursor is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Nenhum dado encontrado")
+
+    pagina = {
+        "dados": [converter(row) for row in rows[:limite]],
+        # A linha a mais indica que existe próxima página
+        "proximo": consulta_bi.codificar_cursor(rows[limite - 1], assinatura) if len(rows) > limite else None,
+        "total": None,
+    }
+    if total:
+        pagina["total"] = await executar_consulta_bi(idempresa, f"{endpoint}_total", conn_data, consulta,
+                                                     _contar_tabela_bi(endpoint))
+    return pagina
+
+@router.get("/bi/metricas", tags=["BI"], status_code=status.HTTP_200_OK)
+async def get_metricas(
+    token: str = Depends(oauth2_scheme)
+):
+    """
+        Estatísticas dos pools de conexão usados pelo BI.
+    """
+    # Verifica o token
+    decode_access_token(token)
+
+    return {
+        "firebird": get_firebird_pool_stats(),
+        "postgres": get_pg_pool_stats(),
+        "cache_conexao": cache_conexao_tenant.stats(),
+        "coalescencia": singleflight_bi.stats(),
+        "cache_bi": cache_bi.stats(),
+        "cache_periodos_fechados": cache_periodos_fechados.stats(),
+        "sonda_frescor": sonda_frescor.stats(),
+        "resumo_bi": resumo_bi.stats(),
+        "formatos_filtro": stats_filtros(),
+    }
+
+async def _consultar_big_numbers(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        params = [data_inicio, data_fim]
-
         # Consulta do ano anterior
         data_fim_ano_anterior = (consulta.data_fim - timedelta(days=365)) if consulta.data_fim else (date.today() - timedelta(days=365))
         data_inicio_ano_anterior = (consulta.data_inicio - timedelta(days=365)) if consulta.data_inicio else (data_fim_ano_anterior - timedelta(days=30))
 
-        params_ano_anterior = [data_inicio_ano_anterior, data_fim_ano_anterior]
-
+        # Uma única leitura de cada view cobre os dois períodos: as medidas são
+        # separadas por SUM(CASE ...) e o WHERE restringe à união das janelas
+        janelas = [data_inicio, data_fim, data_inicio_ano_anterior, data_fim_ano_anterior]
+        params = janelas + janelas
 
         query_factrc = """
             SELECT
-	            SUM(vlrrecbto)
+	            SUM(CASE WHEN datarecbto >= ? AND datarecbto <= ? THEN vlrrecbto END),
+	            SUM(CASE WHEN datarecbto >= ? AND datarecbto <= ? THEN vlrrecbto END)
             FROM
 	            vwfactrc_bi
             WHERE
-                datarecbto >= ?
-                AND datarecbto <= ?
+                ((datarecbto >= ? AND datarecbto <= ?)
+                 OR (datarecbto >= ? AND datarecbto <= ?))
         """
 
 
         query_frctrc = """
             SELECT
-                SUM(vlrcusto),
-                SUM(vlrpedagio),
-                SUM(pesofrete_ton),
-                SUM(embarque),
-                SUM(faturado)
+                SUM(CASE WHEN dataemissao >= ? AND dataemissao <= ? THEN vlrcusto END),
+                SUM(CASE WHEN dataemissao >= ? AND dataemissao <= ? THEN vlrpedagio END),
+                SUM(CASE WHEN dataemissao >= ? AND dataemissao <= ? THEN pesofrete_ton END),
+                SUM(CASE WHEN dataemissao >= ? AND dataemissao <= ? THEN embarque END),
+                SUM(CASE WHEN dataemissao >= ? AND dataemissao <= ? THEN faturado END),
+                SUM(CASE WHEN dataemissao >= ? AND dataemissao <= ? THEN vlrcusto END),
+                SUM(CASE WHEN dataemissao >= ? AND dataemissao <= ? THEN vlrpedagio END),
+                SUM(CASE WHEN dataemissao >= ? AND dataemissao <= ? THEN pesofrete_ton END),
+                SUM(CASE WHEN dataemissao >= ? AND dataemissao <= ? THEN embarque END),
+                SUM(CASE WHEN dataemissao >= ? AND dataemissao <= ? THEN faturado END)
             FROM
                 vwfrctrc_bi
             WHERE
-                dataemissao >= ?
-                AND dataemissao <= ?
+                ((dataemissao >= ? AND dataemissao <= ?)
+                 OR (dataemissao >= ? AND dataemissao <= ?))
         """
+        params_frctrc = [data_inicio, data_fim] * 5 + [data_inicio_ano_anterior, data_fim_ano_anterior] * 5 + janelas
 
-        # Normalizar filtros e aplicar
-        codfilial = normalize_filter(consulta.codfilial)
-        codcliente = normalize_filter(consulta.codcliente)
-
-        # Filtros por código (prioridade)
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            query_factrc += f" AND codfilial IN ({placeholders_filial})"
-            query_frctrc += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-            params_ano_anterior.extend(codfilial)
-
-        if codcliente:
-            placeholders_cliente = ', '.join(['?'] * len(codcliente))
-            query_factrc += f" AND codcliente IN ({placeholders_cliente})"
-            query_frctrc += f" AND codcliente IN ({placeholders_cliente})"
-            params.extend(codcliente)
-            params_ano_anterior.extend(codcliente)
-
-
-        # Filtro por cidade
-        codcid = normalize_filter(consulta.codcid)
-        if codcid:
-            placeholders_codcid = ', '.join(['?'] * len(codcid))
-            query_factrc += f" AND codcid IN ({placeholders_codcid})"
-            query_frctrc += f" AND codcid IN ({placeholders_codcid})"
-            params.extend(codcid)
-            params_ano_anterior.extend(codcid)
-
-        regiao = normalize_filter(consulta.regiao)
-        if regiao:
-            placeholders_regiao = ', '.join(['?'] * len(regiao))
-            query_factrc += f" AND regiao IN ({placeholders_regiao})"
-            query_frctrc += f" AND regiao IN ({placeholders_regiao})"
-            params.extend(regiao)
-            params_ano_anterior.extend(regiao)
-
-        codpro = normalize_filter(consulta.codpro)
-        if codpro:
-            placeholders_codpro = ', '.join(['?'] * len(codpro))
-            query_factrc += f" AND codpro IN ({placeholders_codpro})"
-            query_frctrc += f" AND codpro IN ({placeholders_codpro})"
-            params.extend(codpro)
-            params_ano_anterior.extend(codpro)
-
-        ano = normalize_filter(consulta.ano)
-        if ano:
-            placeholders_ano = ', '.join(['?'] * len(ano))
-            query_factrc += f" AND ano_recbto IN ({placeholders_ano})"
-            query_frctrc += f" AND ano_emissao IN ({placeholders_ano})"
-            params.extend(ano)
-            params_ano_anterior.extend(ano)
-
-        mes = normalize_filter(consulta.mes)
-        if mes:
-            placeholders_mes = ', '.join(['?'] * len(mes))
-            query_factrc += f" AND mes_numero IN ({placeholders_mes})"
-            query_frctrc += f" AND mes_numero IN ({placeholders_mes})"
-            params.extend(mes)
-            params_ano_anterior.extend(mes)
-
-        dia = normalize_filter(consulta.dia)
-        if dia:
-            placeholders_dia = ', '.join(['?'] * len(dia))
-            query_factrc += f" AND dia_recbto IN ({placeholders_dia})"
-            query_frctrc += f" AND dia_emissao IN ({placeholders_dia})"
-            params.extend(dia)
-            params_ano_anterior.extend(dia)
-
-        cur.execute(query_factrc, tuple(params))
-        resultado_factrc = cur.fetchall()
-        faturamento = float(resultado_factrc[0][0]) if resultado_factrc and resultado_factrc[0][0] is not None else 0.0
-
-        cur.execute(query_factrc, tuple(params_ano_anterior))
-        resultado_factrc_ano_anterior = cur.fetchall()
-        faturamento_ano_anterior = float(resultado_factrc_ano_anterior[0][0]) if resultado_factrc_ano_anterior and resultado_factrc_ano_anterior[0][0] is not None else 0.0
-        
-        cur.execute(query_frctrc, tuple(params))
-        resultado = cur.fetchall()
-        custos = float(resultado[0][0]) if resultado and resultado[0][0] is not None else 0.0
-        pedagios = float(resultado[0][1]) if resultado and resultado[0][1] is not None else 0.0
-        volumes = float(resultado[0][2]) if resultado and resultado[0][2] is not None else 0.0
-        embarques = int(resultado[0][3]) if resultado and resultado[0][3] is not None else 0
-        faturados = int(resultado[0][4]) if resultado and resultado[0][4] is not None else 0
-
-        cur.execute(query_frctrc, tuple(params_ano_anterior))
-        resultado_frctrc_ano_anterior = cur.fetchall()
-        custos_ano_anterior = float(resultado_frctrc_ano_anterior[0][0]) if resultado_frctrc_ano_anterior and resultado_frctrc_ano_anterior[0][0] is not None else 0.0
-        pedagios_ano_anterior = float(resultado_frctrc_ano_anterior[0][1]) if resultado_frctrc_ano_anterior and resultado_frctrc_ano_anterior[0][1] is not None else 0.0
-        volumes_ano_anterior = float(resultado_frctrc_ano_anterior[0][2]) if resultado_frctrc_ano_anterior and resultado_frctrc_ano_anterior[0][2] is not None else 0.0
-        embarques_ano_anterior = int(resultado_frctrc_ano_anterior[0][3]) if resultado_frctrc_ano_anterior and resultado_frctrc_ano_anterior[0][3] is not None else 0
-        faturados_ano_anterior = int(resultado_frctrc_ano_anterior[0][4]) if resultado_frctrc_ano_anterior and resultado_frctrc_ano_anterior[0][4] is not None else 0
+        # Filtros por código, região e ano/mês/dia (sobre a data base de cada view)
+        campos = ("codfilial", "codcliente", "codcid", "regiao", "codpro")
+        filtros_factrc, params_filtros_factrc = filtros_ramo(consulta, campos, RAMO_FACTRC)
+        query_factrc += filtros_factrc
+        params.extend(params_filtros_factrc)
+
+        filtros_frctrc, params_filtros_frctrc = filtros_ramo(consulta, campos, RAMO_FRCTRC)
+        query_frctrc += filtros_frctrc
+        params_frctrc.extend(params_filtros_frctrc)
+
+        def valor(linha, indice, tipo=float):
+            return tipo(linha[indice]) if linha and linha[indice] is not None else tipo(0)
+
+        # As duas views são lidas ao mesmo tempo, em conexões separadas
+        resultado_factrc, resultado = await executar_paralelo(
+            fb.fetchone(query_factrc, tuple(params)),
+            fb.fetchone(query_frctrc, tuple(params_frctrc)),
+        )
+        faturamento = valor(resultado_factrc, 0)
+        faturamento_ano_anterior = valor(resultado_factrc, 1)
+
+        custos = valor(resultado, 0)
+        pedagios = valor(resultado, 1)
+        volumes = valor(resultado, 2)
+        embarques = valor(resultado, 3, int)
+        faturados = valor(resultado, 4, int)
+        custos_ano_anterior = valor(resultado, 5)
+        pedagios_ano_anterior = valor(resultado, 6)
+        volumes_ano_anterior = valor(resultado, 7)
+        embarques_ano_anterior = valor(resultado, 8, int)
+        faturados_ano_anterior = valor(resultado, 9, int)
                
         # Combina os resultados
         dados = [
@@ -229,13 +303,14 @@ async def get_big_numbers(
         
         return dados
 
-@router.post('/bi/kpi_mes_ano', tags=["BI"], response_model=KPIMesAno, status_code=status.HTTP_200_OK)
-async def get_kpi_mes_ano(
+@router.post("/bi/big_numbers", tags=["BI"], response_model=List[BigNumbers], status_code=status.HTTP_200_OK)
+async def get_big_numbers(
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
+
     """
-    Consulta Grafico mês e ano de kpi usando POST com schema de entrada.
+    Consulta big numbers usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -248,9 +323,31 @@ async def get_kpi_mes_ano(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "big_numbers", conn_data, consulta, _consultar_big_numbers))
+
+async def _consultar_kpi_mes_ano(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
-        query = """
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
+
+        # Meses anteriores ao corte estão fechados: vêm do cache e só o período aberto vai ao Firebird
+        hoje = date.today()
+        inicio_janela = date(hoje.year - 2, 1, 1)
+        corte = inicio_mes(hoje, -KPI_MES_ANO_MESES_ABERTOS)
+        chave_fechados = ("kpi_mes_ano", conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd'], canonizar_filtros(consulta))
+        fechados = cache_periodos_fechados.buscar(chave_fechados)
+        desde = min(fechados["corte"], corte) if fechados else inicio_janela
+        desde = max(desde, inicio_janela)
+
+        # Filtros aplicados em cada ramo do UNION, com a coluna de data do próprio ramo
+        campos = ("codfilial", "codcid", "regiao")
+        filtros_frctrc, params_frctrc = filtros_ramo(consulta, campos, RAMO_FRCTRC, data_inicio=desde)
+        filtros_factrc, params_factrc = filtros_ramo(consulta, campos, RAMO_FACTRC, data_inicio=desde)
+
+        # Resumos diários no lugar das views, quando já atualizados para o tenant
+        fonte_factrc = resumo_bi.fonte("VWFACTRC_BI", conn_data)
+        fonte_frctrc = resumo_bi.fonte("VWFRCTRC_BI", conn_data)
+
+        query = f"""
                 SELECT
                     ano,
                     mes_numero,
@@ -264,35 +361,24 @@ async def get_kpi_mes_ano(
                         ano_emissao AS ano,
                         mes_emissao AS mes,
                         mes_numero,
-                        dia_emissao AS dia,
                         pesofrete_ton AS volume,
                         embarque AS embarque,
-                        0 AS faturamento,
-                        codfilial,
-                        codcid,
-                        regiao
+                        0 AS faturamento
                     FROM
-                        VWFRCTRC_BI
-                    WHERE
-                        ano_emissao >= EXTRACT(YEAR FROM CURRENT_TIMESTAMP) - 2
+                        {fonte_frctrc}
+                    WHERE 1=1{filtros_frctrc}
                 UNION ALL
                     SELECT
                         ano_recbto AS ano,
                         mes_recbto AS mes,
                         mes_numero,
-                        dia_recbto AS dia,
                         0 AS volume,
                         0 AS embarque,
-                        vlrrecbto AS faturamento,
-                        codfilial,
-                        codcid,
-                        regiao
+                        vlrrecbto AS faturamento
                     FROM
-                        VWFACTRC_BI
-                    WHERE
-                        ano_recbto >= EXTRACT(YEAR FROM CURRENT_TIMESTAMP) - 2
+                        {fonte_factrc}
+                    WHERE 1=1{filtros_factrc}
                 ) dados
-                WHERE 1=1
                 GROUP BY
                     ano,
                     mes,
@@ -302,77 +388,44 @@ async def get_kpi_mes_ano(
                     mes_numero
         """
 
-        params = []
+        params = params_frctrc + params_factrc
 
-        # Aplicar filtros no WHERE externo (após o UNION)
-        filtros_externos = ""
-        
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcid = normalize_filter(consulta.codcid)
-        regiao = normalize_filter(consulta.regiao)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_externos += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-
-        # Aplicar filtros por cidade
-        if codcid:
-            placeholders_codcid = ', '.join(['?'] * len(codcid))
-            filtros_externos += f" AND codcid IN ({placeholders_codcid})"
-            params.extend(codcid)
-
-        # Aplicar filtros por região
-        if regiao:
-            placeholders_regiao = ', '.join(['?'] * len(regiao))
-            filtros_externos += f" AND CAST(regiao AS VARCHAR(50)) IN ({placeholders_regiao})"
-            params.extend(regiao)
-
-        ano = normalize_filter(consulta.ano)
-        if ano:
-            placeholders_ano = ', '.join(['?'] * len(ano))
-            filtros_externos += f" AND ano IN ({placeholders_ano})"
-            params.extend(ano)
-
-        mes = normalize_filter(consulta.mes)
-        if mes:
-            placeholders_mes = ', '.join(['?'] * len(mes))
-            filtros_externos += f" AND mes_numero IN ({placeholders_mes})"
-            params.extend(mes)
-        
-        dia = normalize_filter(consulta.dia)
-        if dia:
-            placeholders_dia = ', '.join(['?'] * len(dia))
-            filtros_externos += f" AND dia IN ({placeholders_dia})"
-            params.extend(dia)
-
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE 1=1",
-            f"WHERE 1=1{filtros_externos}"
-        )
+        rows = await fb.fetchall(query, tuple(params))
 
-        cur.execute(query, tuple(params))
+        # Meses por (ano, mes_numero): os fechados do cache e os consultados agora
+        meses = {}
+        if fechados:
+            for (ano, mes_numero), valores in fechados["meses"].items():
+                if inicio_janela <= date(ano, mes_numero, 1) < desde:
+                    meses[(ano, mes_numero)] = valores
 
-        # Dicionário para armazenar os dados organizados por ano e mês
-        dados = {}
-        
-        for row in cur.fetchall():
-            ano = str(int(row[0])) if row[0] is not None else "0"
-            mes_numero = str(int(row[1])) if row[1] is not None else "0"
+        for row in rows:
+            ano = int(row[0]) if row[0] is not None else 0
+            mes_numero = int(row[1]) if row[1] is not None else 0
             mes = str(row[2]) if row[2] is not None else "Indefinido"
             volume = float(row[3]) if row[3] is not None else 0.0
             embarques = int(row[4]) if row[4] is not None else 0
             faturamento = float(row[5]) if row[5] is not None else 0.0
-            
+            meses[(ano, mes_numero)] = (mes, volume, embarques, faturamento)
+
+        cache_periodos_fechados.guardar(chave_fechados, "kpi_mes_ano_fechados", {
+            "corte": corte,
+            "meses": {
+                chave: valores for chave, valores in meses.items()
+                if chave[0] and chave[1] and date(chave[0], chave[1], 1) < corte
+            },
+        })
+
+        # Dicionário para armazenar os dados organizados por ano e mês
+        dados = {}
+        
+        for (ano, mes_numero), (mes, volume, embarques, faturamento) in sorted(meses.items()):
             # Inicializa o ano se não existir
-            if ano not in dados:
-                dados[ano] = {}
+            if str(ano) not in dados:
+                dados[str(ano)] = {}
             
             # Adiciona os dados do mês
-            dados[ano][mes_numero] = DadosMesAno(
+            dados[str(ano)][str(mes_numero)] = DadosMesAno(
                 mes=mes,
                 volume=volume,
                 embarques=embarques,
@@ -385,13 +438,15 @@ async def get_kpi_mes_ano(
         
         return dados
 
-@router.post('/bi/kpi_dia_mes_atual', tags=["BI"], response_model=KPIDiaMesAtual, status_code=status.HTTP_200_OK)
-async def get_kpi_dia_mes_atual(
+@router.post('/bi/kpi_mes_ano', tags=["BI"], response_model=KPIMesAno, status_code=status.HTTP_200_OK)
+async def get_kpi_mes_ano(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
     """
-    Consulta Grafico dia e mes atual de kpi usando POST com schema de entrada.
+    Consulta Grafico mês e ano de kpi usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -404,9 +459,26 @@ async def get_kpi_dia_mes_atual(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "kpi_mes_ano", conn_data, consulta, _consultar_kpi_mes_ano),
+                       request, ("ano", "mes_numero"), response)
+
+async def _consultar_kpi_dia_mes_atual(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
-        query = """
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
+        # Mês atual como intervalo de datas (calculado aqui, e não com EXTRACT no servidor)
+        hoje = date.today()
+        inicio, limite = inicio_mes(hoje), inicio_mes(hoje, 1)
+
+        # Filtros aplicados em cada ramo do UNION, com a coluna de data do próprio ramo
+        campos = ("codfilial", "codcid", "regiao")
+        filtros_frctrc, params_frctrc = filtros_ramo(consulta, campos, RAMO_FRCTRC, inicio, data_limite=limite)
+        filtros_factrc, params_factrc = filtros_ramo(consulta, campos, RAMO_FACTRC, inicio, data_limite=limite)
+
+        # Resumos diários no lugar das views, quando já atualizados para o tenant
+        fonte_factrc = resumo_bi.fonte("VWFACTRC_BI", conn_data)
+        fonte_frctrc = resumo_bi.fonte("VWFRCTRC_BI", conn_data)
+
+        query = f"""
                 SELECT
                     dia,
                     SUM(volume),
@@ -418,99 +490,34 @@ async def get_kpi_dia_mes_atual(
                         dia_emissao AS dia,
                         pesofrete_ton AS volume,
                         embarque AS embarques,
-                        0 AS faturamento,
-                        codfilial,
-                        codcid,
-                        regiao,
-                        mes_numero,
-                        ano_emissao AS ano
-                FROM
-                    VWFRCTRC_BI
-                WHERE
-                    ano_emissao = EXTRACT(YEAR FROM CURRENT_TIMESTAMP)
-                    AND mes_numero = EXTRACT(MONTH FROM CURRENT_TIMESTAMP)
+                        0 AS faturamento
+                    FROM
+                        {fonte_frctrc}
+                    WHERE 1=1{filtros_frctrc}
                 UNION ALL
                     SELECT
                         dia_recbto AS dia,
                         0 AS volume,
                         0 AS embarques,
-                        vlrrecbto AS faturamento,
-                        codfilial,
-                        codcid,
-                        regiao,
-                        mes_numero,
-                        ano_recbto AS ano
+                        vlrrecbto AS faturamento
                     FROM
-                        VWFACTRC_BI
-                    WHERE
-                        ano_recbto = EXTRACT(YEAR FROM CURRENT_TIMESTAMP)
-                        AND mes_numero = EXTRACT(MONTH FROM CURRENT_TIMESTAMP)
+                        {fonte_factrc}
+                    WHERE 1=1{filtros_factrc}
                 ) dados
-                WHERE 1=1
                 GROUP BY
                     dia
                 ORDER BY
                     dia
         """
 
-        params = []
+        params = params_frctrc + params_factrc
 
-        # Aplicar filtros no WHERE externo (após o UNION) - igual kpi_mes_ano
-        filtros_externos = ""
-        
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcid = normalize_filter(consulta.codcid)
-        regiao = normalize_filter(consulta.regiao)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_externos += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-
-        # Aplicar filtros por cidade
-        if codcid:
-            placeholders_codcid = ', '.join(['?'] * len(codcid))
-            filtros_externos += f" AND codcid IN ({placeholders_codcid})"
-            params.extend(codcid)
-
-        # Aplicar filtros por região
-        if regiao:
-            placeholders_regiao = ', '.join(['?'] * len(regiao))
-            filtros_externos += f" AND CAST(regiao AS VARCHAR(50)) IN ({placeholders_regiao})"
-            params.extend(regiao)
-
-        ano = normalize_filter(consulta.ano)
-        if ano:
-            placeholders_ano = ', '.join(['?'] * len(ano))
-            filtros_externos += f" AND ano IN ({placeholders_ano})"
-            params.extend(ano)
-
-        mes = normalize_filter(consulta.mes)
-        if mes:
-            placeholders_mes = ', '.join(['?'] * len(mes))
-            filtros_externos += f" AND mes_numero IN ({placeholders_mes})"
-            params.extend(mes)
-
-        dia = normalize_filter(consulta.dia)
-        if dia:
-            placeholders_dia = ', '.join(['?'] * len(dia))
-            filtros_externos += f" AND dia IN ({placeholders_dia})"
-            params.extend(dia)
-
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE 1=1",
-            f"WHERE 1=1{filtros_externos}"
-        )
-
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
 
         # Dicionário para armazenar os dados organizados por dia
         dados = {}
 
-        for row in cur.fetchall():
+        for row in rows:
             dia = str(int(row[0])) if row[0] is not None else "0"
             volume = float(row[1]) if row[1] is not None else 0.0
             embarques = int(row[2]) if row[2] is not None else 0
@@ -528,14 +535,15 @@ async def get_kpi_dia_mes_atual(
         
         return dados
 
-@router.post("/bi/kpi_filial", tags=["BI"], response_model=KPIFilial, status_code=status.HTTP_200_OK)
-async def get_kpi_filial(
+@router.post('/bi/kpi_dia_mes_atual', tags=["BI"], response_model=KPIDiaMesAtual, status_code=status.HTTP_200_OK)
+async def get_kpi_dia_mes_atual(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
-
     """
-    Consulta kpi filial usando POST com schema de entrada.
+    Consulta Grafico dia e mes atual de kpi usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -548,14 +556,27 @@ async def get_kpi_filial(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "kpi_dia_mes_atual", conn_data, consulta, _consultar_kpi_dia_mes_atual),
+                       request, ("dia",), response)
+
+async def _consultar_kpi_filial(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        query= """
+        # Filtros aplicados em cada ramo do UNION, com a coluna de data do próprio ramo
+        campos = ("codfilial", "codcliente", "codcid", "regiao", "codpro")
+        filtros_factrc, params_factrc = filtros_ramo(consulta, campos, RAMO_FACTRC, data_inicio, data_fim)
+        filtros_frctrc, params_frctrc = filtros_ramo(consulta, campos, RAMO_FRCTRC, data_inicio, data_fim)
+
+        # Resumos diários no lugar das views, quando já atualizados para o tenant
+        fonte_factrc = resumo_bi.fonte("VWFACTRC_BI", conn_data)
+        fonte_frctrc = resumo_bi.fonte("VWFRCTRC_BI", conn_data)
+
+        query = f"""
         SELECT
             codfilial,
             filial,
@@ -569,122 +590,35 @@ async def get_kpi_filial(
                 0 AS volume,
                 0 AS embarques,
                 vlrrecbto AS faturamento,
-                codfilial,
-                codcliente,
-                codcid,
-                regiao,
-                codpro,
-                datarecbto AS data_operacao,
-                dia_recbto AS dia,
-                mes_numero,
-                ano_recbto AS ano
+                codfilial
             FROM
-                VWFACTRC_BI
+                {fonte_factrc}
+            WHERE 1=1{filtros_factrc}
         UNION ALL
             SELECT
                 filial,
                 pesofrete_ton AS volume,
                 embarque AS embarques,
                 0 AS faturamento,
-                codfilial,
-                codcliente,
-                codcid,
-                regiao,
-                codpro,
-                dataemissao AS data_operacao,
-                dia_emissao AS dia,
-                mes_numero,
-                ano_emissao AS ano
+                codfilial
             FROM
-                VWFRCTRC_BI
+                {fonte_frctrc}
+            WHERE 1=1{filtros_frctrc}
         ) dados
-        WHERE data_operacao >= ? AND data_operacao <= ?
         GROUP BY
             codfilial,
             filial
         ORDER BY SUM(faturamento) DESC
         """
 
-        params = []
+        params = params_factrc + params_frctrc
 
-        # Aplicar filtros no WHERE externo (mesma lógica dos outros endpoints)
-        filtros_externos = ""
-        
-        params.extend([data_inicio, data_fim])
-
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcliente = normalize_filter(consulta.codcliente)
-        codcid = normalize_filter(consulta.codcid)
-        regiao = normalize_filter(consulta.regiao)
-        codpro = normalize_filter(consulta.codpro)
-        ano = normalize_filter(consulta.ano)
-        mes = normalize_filter(consulta.mes)
-        dia = normalize_filter(consulta.dia)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_externos += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-
-        # Aplicar filtros por cliente
-        if codcliente:
-            placeholders_cliente = ', '.join(['?'] * len(codcliente))
-            filtros_externos += f" AND codcliente IN ({placeholders_cliente})"
-            params.extend(codcliente)
-
-        # Aplicar filtros por cidade
-        if codcid:
-            placeholders_codcid = ', '.join(['?'] * len(codcid))
-            filtros_externos += f" AND codcid IN ({placeholders_codcid})"
-            params.extend(codcid)
-
-        # Aplicar filtros por região
-        if regiao:
-            placeholders_regiao = ', '.join(['?'] * len(regiao))
-            filtros_externos += f" AND CAST(regiao AS VARCHAR(50)) IN ({placeholders_regiao})"
-            params.extend(regiao)
-
-        # Aplicar filtros por produto
-        if codpro:
-            placeholders_codpro = ', '.join(['?'] * len(codpro))
-            filtros_externos += f" AND codpro IN ({placeholders_codpro})"
-            params.extend(codpro)
-
-        # Aplicar filtros por ano
-
-        if ano:
-            placeholders_ano = ', '.join(['?'] * len(ano))
-            filtros_externos += f" AND ano IN ({placeholders_ano})"
-            params.extend(ano)
-
-        # Aplicar filtros por mes
-
-        if mes:
-            placeholders_mes = ', '.join(['?'] * len(mes))
-            filtros_externos += f" AND mes_numero IN ({placeholders_mes})"
-            params.extend(mes)
-
-        # Aplicar filtros por dia
-
-        if dia:
-            placeholders_dia = ', '.join(['?'] * len(dia))
-            filtros_externos += f" AND dia IN ({placeholders_dia})"
-            params.extend(dia)
-
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE data_operacao >= ? AND data_operacao <= ?",
-            f"WHERE data_operacao >= ? AND data_operacao <= ?{filtros_externos}"
-        )
-
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
 
         # Dicionário para armazenar os dados organizados por filial
         dados = {}
 
-        for row in cur.fetchall():
+        for row in rows:
             codfilial = str(row[0]) if row[0] is not None else None
             filial = str(row[1]) if row[1] is not None else None
             volume = float(row[2]) if row[2] is not None else 0.0
@@ -704,14 +638,16 @@ async def get_kpi_filial(
         
         return dados
 
-@router.post("/bi/kpi_regiao", tags=["BI"], response_model=KPIRegiao, status_code=status.HTTP_200_OK)
-async def get_kpi_regiao(
+@router.post("/bi/kpi_filial", tags=["BI"], response_model=KPIFilial, status_code=status.HTTP_200_OK)
+async def get_kpi_filial(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-    Consulta kpi regiao usando POST com schema de entrada.
+    Consulta kpi filial usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -724,14 +660,27 @@ async def get_kpi_regiao(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "kpi_filial", conn_data, consulta, _consultar_kpi_filial),
+                       request, ("codfilial",), response)
+
+async def _consultar_kpi_regiao(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        query= """
+        # Filtros aplicados em cada ramo do UNION, com a coluna de data do próprio ramo
+        campos = ("codfilial", "codcliente", "codcid", "regiao", "codpro")
+        filtros_factrc, params_factrc = filtros_ramo(consulta, campos, RAMO_FACTRC, data_inicio, data_fim)
+        filtros_frctrc, params_frctrc = filtros_ramo(consulta, campos, RAMO_FRCTRC, data_inicio, data_fim)
+
+        # Resumos diários no lugar das views, quando já atualizados para o tenant
+        fonte_factrc = resumo_bi.fonte("VWFACTRC_BI", conn_data)
+        fonte_frctrc = resumo_bi.fonte("VWFRCTRC_BI", conn_data)
+
+        query = f"""
         SELECT
             regiao,
             SUM(volume),
@@ -743,120 +692,33 @@ async def get_kpi_regiao(
                 regiao,
                 0 AS volume,
                 0 AS embarques,
-                vlrrecbto AS faturamento,
-                codfilial,
-                codcliente,
-                codcid,
-                codpro,
-                datarecbto AS data_operacao,
-                dia_recbto AS dia,
-                mes_numero,
-                ano_recbto AS ano
-        FROM
-            VWFACTRC_BI
+                vlrrecbto AS faturamento
+            FROM
+                {fonte_factrc}
+            WHERE 1=1{filtros_factrc}
         UNION ALL
             SELECT
                 regiao,
                 pesofrete_ton AS volume,
                 embarque AS embarques,
-                0 AS faturamento,
-                codfilial,
-                codcliente,
-                codcid,
-                codpro,
-                dataemissao AS data_operacao,
-                dia_emissao AS dia,
-                mes_numero,
-                ano_emissao AS ano
+                0 AS faturamento
             FROM
-                VWFRCTRC_BI
+                {fonte_frctrc}
+            WHERE 1=1{filtros_frctrc}
         ) dados
-        WHERE data_operacao >= ? AND data_operacao <= ?
         GROUP BY
             regiao
         ORDER BY SUM(faturamento) DESC
         """
 
-        params = []
+        params = params_factrc + params_frctrc
 
-        # Aplicar filtros no WHERE externo (mesma lógica dos outros endpoints)
-        filtros_externos = ""
-        
-        params.extend([data_inicio, data_fim])
-        
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcliente = normalize_filter(consulta.codcliente)
-        codcid = normalize_filter(consulta.codcid)
-        regiao = normalize_filter(consulta.regiao)
-        codpro = normalize_filter(consulta.codpro)
-        ano = normalize_filter(consulta.ano)
-        mes = normalize_filter(consulta.mes)
-        dia = normalize_filter(consulta.dia)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_externos += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-
-        # Aplicar filtros por cliente
-        if codcliente:
-            placeholders_cliente = ', '.join(['?'] * len(codcliente))
-            filtros_externos += f" AND codcliente IN ({placeholders_cliente})"
-            params.extend(codcliente)
-
-        # Aplicar filtros por cidade
-        if codcid:
-            placeholders_codcid = ', '.join(['?'] * len(codcid))
-            filtros_externos += f" AND codcid IN ({placeholders_codcid})"
-            params.extend(codcid)
-
-        # Aplicar filtros por região
-        if regiao:
-            placeholders_regiao = ', '.join(['?'] * len(regiao))
-            filtros_externos += f" AND CAST(regiao AS VARCHAR(50)) IN ({placeholders_regiao})"
-            params.extend(regiao)
-
-        # Aplicar filtros por produto
-        if codpro:
-            placeholders_codpro = ', '.join(['?'] * len(codpro))
-            filtros_externos += f" AND codpro IN ({placeholders_codpro})"
-            params.extend(codpro)
-
-        # Aplicar filtros por ano
-
-        if ano:
-            placeholders_ano = ', '.join(['?'] * len(ano))
-            filtros_externos += f" AND ano IN ({placeholders_ano})"
-            params.extend(ano)
-
-        # Aplicar filtros por mes
-
-        if mes:
-            placeholders_mes = ', '.join(['?'] * len(mes))
-            filtros_externos += f" AND mes_numero IN ({placeholders_mes})"
-            params.extend(mes)
-
-        # Aplicar filtros por dia
-
-        if dia:
-            placeholders_dia = ', '.join(['?'] * len(dia))
-            filtros_externos += f" AND dia IN ({placeholders_dia})"
-            params.extend(dia)
-
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE data_operacao >= ? AND data_operacao <= ?",
-            f"WHERE data_operacao >= ? AND data_operacao <= ?{filtros_externos}"
-        )
-
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
 
                 # Dicionário para armazenar os dados organizados por regiao
         dados = {}
 
-        for row in cur.fetchall():
+        for row in rows:
             regiao = str(row[0]) if row[0] is not None else None
             volume = float(row[1]) if row[1] is not None else 0.0
             embarques = int(row[2]) if row[2] is not None else 0
@@ -874,14 +736,16 @@ async def get_kpi_regiao(
         
         return dados
 
-@router.post("/bi/kpi_cidade", tags=["BI"], response_model=KPICidade, status_code=status.HTTP_200_OK)
-async def get_kpi_cidade(
+@router.post("/bi/kpi_regiao", tags=["BI"], response_model=KPIRegiao, status_code=status.HTTP_200_OK)
+async def get_kpi_regiao(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-    Consulta kpi cidade usando POST com schema de entrada.
+    Consulta kpi regiao usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -894,14 +758,27 @@ async def get_kpi_cidade(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "kpi_regiao", conn_data, consulta, _consultar_kpi_regiao),
+                       request, ("regiao",), response)
+
+async def _consultar_kpi_cidade(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        query= """
+        # Filtros aplicados em cada ramo do UNION, com a coluna de data do próprio ramo
+        campos = ("codfilial", "codcid", "regiao")
+        filtros_factrc, params_factrc = filtros_ramo(consulta, campos, RAMO_FACTRC, data_inicio, data_fim)
+        filtros_frctrc, params_frctrc = filtros_ramo(consulta, campos, RAMO_FRCTRC, data_inicio, data_fim)
+
+        # Resumos diários no lugar das views, quando já atualizados para o tenant
+        fonte_factrc = resumo_bi.fonte("VWFACTRC_BI", conn_data)
+        fonte_frctrc = resumo_bi.fonte("VWFRCTRC_BI", conn_data)
+
+        query = f"""
             SELECT
                 codcid,
                 cidade || '-' || coduf,
@@ -916,15 +793,10 @@ async def get_kpi_cidade(
                     0 AS volume,
                     0 AS embarques,
                     vlrrecbto AS faturamento,
-                    codfilial,
-                    codcid,
-                    regiao,
-                    datarecbto AS data_operacao,
-                    dia_recbto AS dia,
-                    mes_numero,
-                    ano_recbto AS ano
+                    codcid
                 FROM
-                    VWFACTRC_BI
+                    {fonte_factrc}
+                WHERE 1=1{filtros_factrc}
             UNION ALL
                 SELECT
                     cidade,
@@ -932,89 +804,25 @@ async def get_kpi_cidade(
                     pesofrete_ton AS volume,
                     embarque AS embarques,
                     0 AS faturamento,
-                    codfilial,
-                    codcid,
-                    regiao,
-                    dataemissao AS data_operacao,
-                    dia_emissao AS dia,
-                    mes_numero,
-                    ano_emissao AS ano
+                    codcid
                 FROM
-                    VWFRCTRC_BI
+                    {fonte_frctrc}
+                WHERE 1=1{filtros_frctrc}
             ) dados
-            WHERE data_operacao >= ? AND data_operacao <= ?
             GROUP BY
                 codcid,
                 cidade || '-' || coduf
             ORDER BY SUM(faturamento) DESC
         """
 
-        params = []
-
-        # Aplicar filtros no WHERE externo (mesma lógica dos outros endpoints)
-        filtros_externos = ""
-        
-        params.extend([data_inicio, data_fim])
-        
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcid = normalize_filter(consulta.codcid)
-        regiao = normalize_filter(consulta.regiao)
-        ano = normalize_filter(consulta.ano)
-        mes = normalize_filter(consulta.mes)
-        dia = normalize_filter(consulta.dia)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_externos += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-
-        # Aplicar filtros por cidade
-        if codcid:
-            placeholders_codcid = ', '.join(['?'] * len(codcid))
-            filtros_externos += f" AND codcid IN ({placeholders_codcid})"
-            params.extend(codcid)
-
-        # Aplicar filtros por região
-        if regiao:
-            placeholders_regiao = ', '.join(['?'] * len(regiao))
-            filtros_externos += f" AND CAST(regiao AS VARCHAR(50)) IN ({placeholders_regiao})"
-            params.extend(regiao)
-
-        # Aplicar filtros por ano
-
-        if ano:
-            placeholders_ano = ', '.join(['?'] * len(ano))
-            filtros_externos += f" AND ano IN ({placeholders_ano})"
-            params.extend(ano)
-
-        # Aplicar filtros por mes
-
-        if mes:
-            placeholders_mes = ', '.join(['?'] * len(mes))
-            filtros_externos += f" AND mes_numero IN ({placeholders_mes})"
-            params.extend(mes)
-
-        # Aplicar filtros por dia
-
-        if dia:
-            placeholders_dia = ', '.join(['?'] * len(dia))
-            filtros_externos += f" AND dia IN ({placeholders_dia})"
-            params.extend(dia)
-
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE data_operacao >= ? AND data_operacao <= ?",
-            f"WHERE data_operacao >= ? AND data_operacao <= ?{filtros_externos}"
-        )
+        params = params_factrc + params_frctrc
 
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
 
                 # Dicionário para armazenar os dados organizados por cidade
         dados = {}
 
-        for row in cur.fetchall():
+        for row in rows:
             codcid = str(row[0]) if row[0] is not None else None
             cidade = str(row[1]) if row[1] is not None else None
             volume = float(row[2]) if row[2] is not None else 0.0
@@ -1034,14 +842,16 @@ async def get_kpi_cidade(
         
         return dados
 
-@router.post("/bi/kpi_cliente", tags=["BI"], response_model=KPICliente, status_code=status.HTTP_200_OK)
-async def get_kpi_cliente(
+@router.post("/bi/kpi_cidade", tags=["BI"], response_model=KPICidade, status_code=status.HTTP_200_OK)
+async def get_kpi_cidade(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-    Consulta kpi cliente usando POST com schema de entrada.
+    Consulta kpi cidade usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -1054,89 +864,25 @@ async def get_kpi_cliente(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "kpi_cidade", conn_data, consulta, _consultar_kpi_cidade),
+                       request, ("codcid",), response)
+
+async def _consultar_kpi_cliente(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        query= """
-            SELECT
-                codcliente,
-                cliente,
-                SUM(vlrrecbto)
-            FROM
-                (
-                SELECT
-                    cliente,
-                    vlrrecbto,
-                    codfilial,
-                    codcliente,
-                    regiao,
-                    codpro,
-                    datarecbto
-                FROM
-                    VWFACTRC_BI
-            ) dados
-            WHERE datarecbto >= ? AND datarecbto <= ?
-            GROUP BY
-                codcliente,
-                cliente
-            ORDER BY
-                SUM(vlrrecbto) DESC
-        """
-
-        params = []
+        query, params = CONSULTAS_BI["kpi_cliente"].montar(consulta, data_inicio, data_fim)
 
-        # Aplicar filtros no WHERE externo (mesma lógica dos outros endpoints)
-        filtros_externos = ""
-        
-        params.extend([data_inicio, data_fim])
-        
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcliente = normalize_filter(consulta.codcliente)
-        regiao = normalize_filter(consulta.regiao)
-        codpro = normalize_filter(consulta.codpro)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_externos += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-
-        # Aplicar filtros por cliente
-        if codcliente:
-            placeholders_cliente = ', '.join(['?'] * len(codcliente))
-            filtros_externos += f" AND codcliente IN ({placeholders_cliente})"
-            params.extend(codcliente)
-
-        # Aplicar filtros por região
-        if regiao:
-            placeholders_regiao = ', '.join(['?'] * len(regiao))
-            filtros_externos += f" AND CAST(regiao AS VARCHAR(50)) IN ({placeholders_regiao})"
-            params.extend(regiao)
-
-        # Aplicar filtros por produto
-        if codpro:
-            placeholders_codpro = ', '.join(['?'] * len(codpro))
-            filtros_externos += f" AND codpro IN ({placeholders_codpro})"
-            params.extend(codpro)
-
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE datarecbto >= ? AND datarecbto <= ?",
-            f"WHERE datarecbto >= ? AND datarecbto <= ?{filtros_externos}"
-        )
-
-
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
 
                 # Dicionário para armazenar os dados organizados por cliente
         dados = {}
 
-        for row in cur.fetchall():
+        for row in rows:
             codcliente = str(row[0]) if row[0] is not None else None
             cliente = str(row[1]) if row[1] is not None else None
             faturamento = float(row[2]) if row[2] is not None else 0.0
@@ -1152,14 +898,16 @@ async def get_kpi_cliente(
         
         return dados
 
-@router.post("/bi/kpi_produto", tags=["BI"], response_model=KPIProduto, status_code=status.HTTP_200_OK)
-async def get_kpi_produto(
+@router.post("/bi/kpi_cliente", tags=["BI"], response_model=KPICliente, status_code=status.HTTP_200_OK)
+async def get_kpi_cliente(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-    Consulta kpi produto usando POST com schema de entrada.
+    Consulta kpi cliente usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -1172,88 +920,25 @@ async def get_kpi_produto(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "kpi_cliente", conn_data, consulta, _consultar_kpi_cliente),
+                       request, ("codcliente",), response)
+
+async def _consultar_kpi_produto(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        query= """
-            SELECT
-                codpro,
-                produto,
-                SUM(vlrrecbto)
-            FROM
-                (
-                SELECT
-                    produto,
-                    vlrrecbto,
-                    codfilial,
-                    codcliente,
-                    regiao,
-                    codpro,
-                    datarecbto
-                FROM
-                    VWFACTRC_BI
-            )
-            WHERE datarecbto >= ? AND datarecbto <= ?
-            GROUP BY
-                codpro,
-                produto
-            ORDER BY
-                SUM(vlrrecbto) DESC
-        """
-
-        params = []
-
-        # Aplicar filtros no WHERE externo (mesma lógica dos outros endpoints)
-        filtros_externos = ""
-        
-        params.extend([data_inicio, data_fim])
-        
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcliente = normalize_filter(consulta.codcliente)
-        regiao = normalize_filter(consulta.regiao)
-        codpro = normalize_filter(consulta.codpro)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_externos += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-
-        # Aplicar filtros por cliente
-        if codcliente:
-            placeholders_cliente = ', '.join(['?'] * len(codcliente))
-            filtros_externos += f" AND codcliente IN ({placeholders_cliente})"
-            params.extend(codcliente)
-
-        # Aplicar filtros por região
-        if regiao:
-            placeholders_regiao = ', '.join(['?'] * len(regiao))
-            filtros_externos += f" AND CAST(regiao AS VARCHAR(50)) IN ({placeholders_regiao})"
-            params.extend(regiao)
-
-        # Aplicar filtros por produto
-        if codpro:
-            placeholders_codpro = ', '.join(['?'] * len(codpro))
-            filtros_externos += f" AND codpro IN ({placeholders_codpro})"
-            params.extend(codpro)
-
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE datarecbto >= ? AND datarecbto <= ?",
-            f"WHERE datarecbto >= ? AND datarecbto <= ?{filtros_externos}"
-        )
+        query, params = CONSULTAS_BI["kpi_produto"].montar(consulta, data_inicio, data_fim)
 
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
 
                 # Dicionário para armazenar os dados organizados por produto
         dados = {}
 
-        for row in cur.fetchall():
+        for row in rows:
             codpro = str(row[0]) if row[0] is not None else None
             produto = str(row[1]) if row[1] is not None else None
             faturamento = float(row[2]) if row[2] is not None else 0.0
@@ -1269,14 +954,16 @@ async def get_kpi_produto(
         
         return dados
 
-@router.post("/bi/tabela_faturamento", tags=["BI"], response_model=List[TabelaFaturamento], status_code=status.HTTP_200_OK)
-async def get_tabela_faturamento(
+@router.post("/bi/kpi_produto", tags=["BI"], response_model=KPIProduto, status_code=status.HTTP_200_OK)
+async def get_kpi_produto(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-    Consulta tabela de faturamento usando POST com schema de entrada.
+    Consulta kpi produto usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -1289,88 +976,35 @@ async def get_tabela_faturamento(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "kpi_produto", conn_data, consulta, _consultar_kpi_produto),
+                       request, ("codpro",), response)
+
+def _linha_tabela_faturamento(row) -> dict:
+    return {
+        "nrofatura": int(row[0]) if row[0] is not None else None,
+        "anofatura": int(row[1]) if row[1] is not None else None,
+        "datarecbto": row[2],
+        "faturamento": float(row[3]) if row[3] is not None else 0.0,
+        "filial": str(row[4]) if row[4] is not None else None,
+        "cliente": str(row[5]) if row[5] is not None else None,
+        "cidade": str(row[6]) if row[6] is not None else None,
+        "coduf": str(row[7]) if row[7] is not None else None,
+        "produto": str(row[8]) if row[8] is not None else None
+    }
+
+async def _consultar_tabela_faturamento(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        query= """
-            SELECT
-                nrofatura,
-                anofatura,
-                datarecbto,
-                vlrrecbto,
-                filial,
-                cliente,
-                cidade,
-                coduf,
-                produto
-            FROM
-                vwfactrc_bi
-            WHERE datarecbto >= ? AND datarecbto <= ?
-        """
-
-        params = []
+        query, params = CONSULTAS_BI["tabela_faturamento"].montar(consulta, data_inicio, data_fim)
 
-        # Aplicar filtros no WHERE externo (mesma lógica dos outros endpoints)
-        filtros_externos = ""
-        
-        params.extend([data_inicio, data_fim])
-        
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcliente = normalize_filter(consulta.codcliente)
-        regiao = normalize_filter(consulta.regiao)
-        codpro = normalize_filter(consulta.codpro)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_externos += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-
-        # Aplicar filtros por cliente
-        if codcliente:
-            placeholders_cliente = ', '.join(['?'] * len(codcliente))
-            filtros_externos += f" AND codcliente IN ({placeholders_cliente})"
-            params.extend(codcliente)
-
-        # Aplicar filtros por região
-        if regiao:
-            placeholders_regiao = ', '.join(['?'] * len(regiao))
-            filtros_externos += f" AND CAST(regiao AS VARCHAR(50)) IN ({placeholders_regiao})"
-            params.extend(regiao)
-
-        # Aplicar filtros por produto
-        if codpro:
-            placeholders_codpro = ', '.join(['?'] * len(codpro))
-            filtros_externos += f" AND codpro IN ({placeholders_codpro})"
-            params.extend(codpro)
-
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE datarecbto >= ? AND datarecbto <= ?",
-            f"WHERE datarecbto >= ? AND datarecbto <= ?{filtros_externos}"
-        )
-
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
                      # Combina os resultados
-        dados = [
-            {
-                "nrofatura": str(row[0]) if row[0] is not None else None,
-                "anofatura": str(row[1]) if row[1] is not None else None,
-                "datarecbto": str(row[2]) if row[2] is not None else None,
-                "faturamento": float(row[3]) if row[3] is not None else 0.0,
-                "filial": str(row[4]) if row[4] is not None else None,
-                "cliente": str(row[5]) if row[5] is not None else None,
-                "cidade": str(row[6]) if row[6] is not None else None,
-                "coduf": str(row[7]) if row[7] is not None else None,
-                "produto": str(row[8]) if row[8] is not None else None
-            }
-            for row in cur.fetchall()
-        ]
+        dados = [_linha_tabela_faturamento(row) for row in rows]
               
 
         if not dados:
@@ -1378,16 +1012,21 @@ async def get_tabela_faturamento(
         
         return dados
 
-@router.get("/bi/filtro_filial", tags=["BI"], response_model=List[FiltroFilial], status_code=status.HTTP_200_OK)
-async def get_filtro_filial(
+@router.post("/bi/tabela_faturamento", tags=["BI"], response_model=List[TabelaFaturamento], status_code=status.HTTP_200_OK)
+async def get_tabela_faturamento(
+    request: Request,
+    consulta: FiltrosBI = FiltrosBI(),
+    formato: Optional[str] = None,
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-        Consulta filtro filial usando GET com schema de entrada.
+    Consulta tabela de faturamento usando POST com schema de entrada.
+    Permite consultas mais complexas no futuro.
+    Com formato=ndjson|csv|arrow|parquet (ou o media type correspondente no Accept)
+    as linhas são enviadas em streaming, lidas do banco em lotes.
     """
-
-  # Verifica o token
+    # Verifica o token
     payload = decode_access_token(token)
     idempresa = payload.get("empresa")
 
@@ -1397,8 +1036,41 @@ async def get_filtro_filial(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    formato = formato_stream(request, formato, "tabela_faturamento")
+    if formato:
+        lotes = lotes_tabela_bi(conn_data, "tabela_faturamento", consulta, tamanho_lote(formato))
+        return await resposta_stream(lotes, _linha_tabela_faturamento, formato, "tabela_faturamento")
+
+    return resposta_bi(await executar_consulta_bi(idempresa, "tabela_faturamento", conn_data, consulta, _consultar_tabela_faturamento))
+
+@router.post("/bi/tabela_faturamento/pagina", tags=["BI"], response_model=PaginaTabelaFaturamento, status_code=status.HTTP_200_OK)
+async def get_tabela_faturamento_pagina(
+    consulta: FiltrosBI = FiltrosBI(),
+    limite: int = Query(BI_PAGINA_PADRAO, ge=1, le=BI_PAGINA_MAX),
+    cursor: Optional[str] = None,
+    total: bool = False,
+    token: str = Depends(oauth2_scheme)
+):
+
+    """
+    Tabela de faturamento paginada: até `limite` linhas a partir do `cursor` (o campo
+    "proximo" da página anterior). Com total=true retorna também a quantidade de linhas.
+    """
+    # Verifica o token
+    payload = decode_access_token(token)
+    idempresa = payload.get("empresa")
+
+    if not idempresa:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID da empresa não encontrado no token")
+
+    # Obtém os dados de conexão do Firebird
+    conn_data = await get_firebird_connection_data(idempresa)
+
+    return resposta_bi(await pagina_tabela_bi(idempresa, conn_data, "tabela_faturamento", consulta, _linha_tabela_faturamento, limite, cursor, total))
+
+async def _consultar_filtro_filial(conn_data: dict, consulta: FiltrosBI = None):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         query= """
             SELECT
@@ -1408,14 +1080,14 @@ async def get_filtro_filial(
                 TBFIL
         """
 
-        cur.execute(query)
+        rows = await fb.fetchall(query)
 
         dados = [
             {
                 "codfilial": str(row[0]) if row[0] is not None else None,
                 "filial": str(row[1]) if row[1] is not None else None
             }
-            for row in cur.fetchall()
+            for row in rows
         ]
               
 
@@ -1424,13 +1096,13 @@ async def get_filtro_filial(
         
         return dados
 
-@router.get("/bi/filtro_cliente", tags=["BI"], response_model=List[FiltroCliente], status_code=status.HTTP_200_OK)
-async def get_filtro_cliente(
+@router.get("/bi/filtro_filial", tags=["BI"], response_model=List[FiltroFilial], status_code=status.HTTP_200_OK)
+async def get_filtro_filial(
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-        Consulta filtro cliente usando GET com schema de entrada.
+        Consulta filtro filial usando GET com schema de entrada.
     """
 
   # Verifica o token
@@ -1443,8 +1115,11 @@ async def get_filtro_cliente(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "filtro_filial", conn_data, None, _consultar_filtro_filial))
+
+async def _consultar_filtro_cliente(conn_data: dict, consulta: FiltrosBI = None):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         query= """
             SELECT
@@ -1454,14 +1129,14 @@ async def get_filtro_cliente(
                 TBCLI
         """
 
-        cur.execute(query)
+        rows = await fb.fetchall(query)
 
         dados = [
             {
                 "codcliente": str(row[0]) if row[0] is not None else None,
                 "cliente": str(row[1]) if row[1] is not None else None
             }
-            for row in cur.fetchall()
+            for row in rows
         ]
               
 
@@ -1470,17 +1145,16 @@ async def get_filtro_cliente(
         
         return dados
 
-@router.post("/bi/big_numbers_contas_receber", tags=["BI"], response_model=List[BigNumbersContasReceber], status_code=status.HTTP_200_OK)
-async def get_big_numbers_contas_receber(
-    consulta: FiltrosBI = FiltrosBI(),
+@router.get("/bi/filtro_cliente", tags=["BI"], response_model=List[FiltroCliente], status_code=status.HTTP_200_OK)
+async def get_filtro_cliente(
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-    Consulta big numbers contas receber usando POST com schema de entrada.
-    Permite consultas mais complexas no futuro.
+        Consulta filtro cliente usando GET com schema de entrada.
     """
-    # Verifica o token
+
+  # Verifica o token
     payload = decode_access_token(token)
     idempresa = payload.get("empresa")
 
@@ -1490,77 +1164,55 @@ async def get_big_numbers_contas_receber(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "filtro_cliente", conn_data, None, _consultar_filtro_cliente))
+
+async def _consultar_big_numbers_contas_receber(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        # Normalizar filtros para aplicar em todas as queries
-        codfilial = normalize_filter(consulta.codfilial)
-        codcliente = normalize_filter(consulta.codcliente)
+        # Filtros aplicados em todas as queries
+        filtros_adicionais, params_filtros = filtros_codigo(consulta, ("codfilial", "codcliente"))
 
-        # Construir filtros adicionais para aplicar nas queries
-        filtros_adicionais = ""
-        params_filtros = []
-
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_adicionais += f" AND codfilial IN ({placeholders_filial})"
-            params_filtros.extend(codfilial)
-
-        if codcliente:
-            placeholders_cliente = ', '.join(['?'] * len(codcliente))
-            filtros_adicionais += f" AND codcliente IN ({placeholders_cliente})"
-            params_filtros.extend(codcliente)
-
-        # 1. FATURAMENTO: Filtrado por período de recebimento
-        query_faturamento = f"""
-            SELECT COALESCE(SUM(vlrrecbto), 0) AS faturamento
-            FROM VWFACTRC_BI
-            WHERE datarecbto >= ? AND datarecbto <= ?{filtros_adicionais}
-        """
-        params_faturamento = [data_inicio, data_fim] + params_filtros
-
-        # 2. A RECEBER: Filtrado por período de vencimento
-        query_a_receber = f"""
-            SELECT COALESCE(SUM(vlrsaldo), 0) AS a_receber
+        # Medidas por período em uma única leitura da view: cada medida tem sua
+        # condição no CASE e o WHERE restringe à união das janelas
+        #   faturamento: período de recebimento
+        #   a_receber:   'A Receber' no período de vencimento
+        #   prazo_medio: período de recebimento
+        condicao_a_receber, params_a_receber = condicao_fatura("VWFACTRC_BI", "A Receber")
+        query_periodo = f"""
+            SELECT
+                COALESCE(SUM(CASE WHEN datarecbto >= ? AND datarecbto <= ? THEN vlrrecbto END), 0) AS faturamento,
+                COALESCE(SUM(CASE WHEN {condicao_a_receber} AND datavencto >= ? AND datavencto <= ? THEN vlrsaldo END), 0) AS a_receber,
+                COALESCE(AVG(CASE WHEN datarecbto >= ? AND datarecbto <= ? THEN dias_recebimento END), 0) AS prazo_medio
             FROM VWFACTRC_BI
-            WHERE condicao_fatura = 'A Receber'
-              AND datavencto >= ? AND datavencto <= ?{filtros_adicionais}
+            WHERE ((datarecbto >= ? AND datarecbto <= ?)
+                   OR ({condicao_a_receber} AND datavencto >= ? AND datavencto <= ?)){filtros_adicionais}
         """
-        params_a_receber = [data_inicio, data_fim] + params_filtros
+        params_a_receber_periodo = params_a_receber + [data_inicio, data_fim]
+        params_periodo = ([data_inicio, data_fim] + params_a_receber_periodo + [data_inicio, data_fim] * 2
+                          + params_a_receber_periodo + params_filtros)
 
-        # 3. EM ATRASO: SEM filtro de data (sempre atual)
+        # EM ATRASO: SEM filtro de período (vencidos até hoje), executada em paralelo
+        condicao_em_atraso, params_em_atraso = condicao_fatura("VWFACTRC_BI", "Em Atraso")
         query_em_atraso = f"""
             SELECT COALESCE(SUM(vlrsaldo), 0) AS em_atraso
             FROM VWFACTRC_BI
-            WHERE condicao_fatura = 'Em Atraso'{filtros_adicionais}
-        """
-        params_em_atraso = params_filtros
-
-        # 4. PRAZO MÉDIO: Filtrado por período de recebimento
-        query_prazo_medio = f"""
-            SELECT COALESCE(AVG(dias_recebimento), 0) AS prazo_medio
-            FROM VWFACTRC_BI
-            WHERE datarecbto >= ? AND datarecbto <= ?
-              AND dias_recebimento IS NOT NULL{filtros_adicionais}
+            WHERE {condicao_em_atraso}{filtros_adicionais}
         """
-        params_prazo_medio = [data_inicio, data_fim] + params_filtros
-
-        # Executar queries separadamente
-        cur.execute(query_faturamento, tuple(params_faturamento))
-        faturamento = cur.fetchone()[0] or 0.0
-
-        cur.execute(query_a_receber, tuple(params_a_receber))
-        a_receber = cur.fetchone()[0] or 0.0
+        params_em_atraso = params_em_atraso + params_filtros
 
-        cur.execute(query_em_atraso, tuple(params_em_atraso))
-        em_atraso = cur.fetchone()[0] or 0.0
-
-        cur.execute(query_prazo_medio, tuple(params_prazo_medio))
-        prazo_medio = cur.fetchone()[0] or 0.0
+        (faturamento, a_receber, prazo_medio), (em_atraso,) = await executar_paralelo(
+            fb.fetchone(query_periodo, tuple(params_periodo)),
+            fb.fetchone(query_em_atraso, tuple(params_em_atraso)),
+        )
+        faturamento = faturamento or 0.0
+        a_receber = a_receber or 0.0
+        em_atraso = em_atraso or 0.0
+        prazo_medio = prazo_medio or 0.0
 
         # Retornar dados combinados
         dados = [
@@ -1575,13 +1227,14 @@ async def get_big_numbers_contas_receber(
         
         return dados
 
-@router.post('/bi/recebimentos_dia_mes_atual', tags=["BI"], response_model=RecebimentosDiaMesAtual, status_code=status.HTTP_200_OK)
-async def get_recebimentos_dia_mes_atual(
+@router.post("/bi/big_numbers_contas_receber", tags=["BI"], response_model=List[BigNumbersContasReceber], status_code=status.HTTP_200_OK)
+async def get_big_numbers_contas_receber(
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
+
     """
-    Consulta Grafico dia e mes atual de recebimentos usando POST com schema de entrada.
+    Consulta big numbers contas receber usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -1594,9 +1247,20 @@ async def get_recebimentos_dia_mes_atual(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "big_numbers_contas_receber", conn_data, consulta, _consultar_big_numbers_contas_receber))
+
+async def _consultar_recebimentos_dia_mes_atual(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
-        query = """
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
+        # Mês atual como intervalo de datas (calculado aqui, e não com EXTRACT no servidor)
+        hoje = date.today()
+        mes_atual = [inicio_mes(hoje), inicio_mes(hoje, 1)]
+        condicao_a_receber, params_a_receber = condicao_fatura("VWFACTRC_BI", "A Receber", hoje)
+
+        # Filtros por código aplicados em cada ramo do UNION
+        filtros, params_filtros = filtros_codigo(consulta, ("codfilial", "codcliente"))
+
+        query = f"""
                     SELECT
                         dia,
                         SUM(faturamento),
@@ -1606,68 +1270,36 @@ async def get_recebimentos_dia_mes_atual(
                         SELECT
                             dia_recbto AS dia,
                             vlrrecbto AS faturamento,
-                            0 AS a_receber,
-                            codfilial,
-                            codcliente
+                            0 AS a_receber
                         FROM
                             VWFACTRC_BI
                         WHERE
-                            ano_recbto = EXTRACT(YEAR FROM CURRENT_TIMESTAMP)
-                            AND mes_numero = EXTRACT(MONTH FROM CURRENT_TIMESTAMP)
+                            datarecbto >= ? AND datarecbto < ?{filtros}
                     UNION ALL
                         SELECT
                             dia_vencto AS dia,
                             0 AS faturamento,
-                            vlrsaldo AS a_receber,
-                            codfilial,
-                            codcliente
+                            vlrsaldo AS a_receber
                         FROM
                             VWFACTRC_BI
                         WHERE
-                            ano_vencto = EXTRACT(YEAR FROM CURRENT_TIMESTAMP)
-                            AND mes_numero_vencto = EXTRACT(MONTH FROM CURRENT_TIMESTAMP)
-                            AND condicao_fatura = 'A Receber'
+                            datavencto >= ? AND datavencto < ?
+                            AND {condicao_a_receber}{filtros}
                     ) dados
-                    WHERE 1=1
                     GROUP BY
                         dia
                     ORDER BY
                         dia
         """
 
-        params = []
-
-        # Aplicar filtros no WHERE externo (após o UNION) - igual kpi_mes_ano
-        filtros_externos = ""
-        
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcliente = normalize_filter(consulta.codcliente)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_externos += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-
-        # Aplicar filtros por cliente
-        if codcliente:
-            placeholders_codcliente = ', '.join(['?'] * len(codcliente))
-            filtros_externos += f" AND codcliente IN ({placeholders_codcliente})"
-            params.extend(codcliente)
-
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE 1=1",
-            f"WHERE 1=1{filtros_externos}"
-        )
+        params = mes_atual + params_filtros + mes_atual + params_a_receber + params_filtros
 
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
 
         # Dicionário para armazenar os dados organizados por dia
         dados = {}
 
-        for row in cur.fetchall():
+        for row in rows:
             dia = str(int(row[0])) if row[0] is not None else "0"
             faturamento = float(row[1]) if row[1] is not None else 0.0
             a_receber = float(row[2]) if row[2] is not None else 0.0
@@ -1683,14 +1315,15 @@ async def get_recebimentos_dia_mes_atual(
         
         return dados
 
-@router.post("/bi/a_receber_cliente", tags=["BI"], response_model=AReceberCliente, status_code=status.HTTP_200_OK)
-async def get_a_receber_cliente(
+@router.post('/bi/recebimentos_dia_mes_atual', tags=["BI"], response_model=RecebimentosDiaMesAtual, status_code=status.HTTP_200_OK)
+async def get_recebimentos_dia_mes_atual(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
-
     """
-    Consulta a receber cliente usando POST com schema de entrada.
+    Consulta Grafico dia e mes atual de recebimentos usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -1703,82 +1336,30 @@ async def get_a_receber_cliente(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "recebimentos_dia_mes_atual", conn_data, consulta, _consultar_recebimentos_dia_mes_atual),
+                       request, ("dia",), response)
+
+async def _consultar_a_receber_cliente(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        # Construir filtros adicionais para aplicar nas queries
-        filtros_adicionais_a_receber = ""
-        filtros_adicionais_em_atraso = ""
-        params_a_receber = [data_inicio, data_fim]
-        params_em_atraso = []
-        
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcliente = normalize_filter(consulta.codcliente)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_adicionais_a_receber += f" AND codfilial IN ({placeholders_filial})"
-            filtros_adicionais_em_atraso += f" AND codfilial IN ({placeholders_filial})"
-            params_a_receber.extend(codfilial)
-            params_em_atraso.extend(codfilial)
-
-        # Aplicar filtros por cliente
-        if codcliente:
-            placeholders_cliente = ', '.join(['?'] * len(codcliente))
-            filtros_adicionais_a_receber += f" AND codcliente IN ({placeholders_cliente})"
-            filtros_adicionais_em_atraso += f" AND codcliente IN ({placeholders_cliente})"
-            params_a_receber.extend(codcliente)
-            params_em_atraso.extend(codcliente)
-
-        query= f"""
-            SELECT
-                codcliente,
-                cliente,
-                SUM(vlrsaldo)
-            FROM
-                (
-                SELECT
-                    cliente,
-                    vlrsaldo,
-                    codfilial,
-                    codcliente,
-                    datavencto
-                FROM
-                    VWFACTRC_BI
-                WHERE condicao_fatura = 'A Receber' AND datavencto >= ? AND datavencto <= ?{filtros_adicionais_a_receber}
-            UNION ALL
-                SELECT
-                    cliente,
-                    vlrsaldo,
-                    codfilial,
-                    codcliente,
-                    datavencto
-                FROM
-                    VWFACTRC_BI
-                WHERE condicao_fatura = 'Em Atraso'{filtros_adicionais_em_atraso}
-            ) dados
-            GROUP BY
-                codcliente,
-                cliente
-            ORDER BY
-                SUM(vlrsaldo) DESC
-        """
-
-        params = params_a_receber + params_em_atraso
-
+        # 'A Receber' no período de vencimento e tudo o que está 'Em Atraso'
+        _, params_a_receber = condicao_fatura("VWFACTRC_BI", "A Receber")
+        _, params_em_atraso = condicao_fatura("VWFACTRC_BI", "Em Atraso")
+        query, params = CONSULTAS_BI["a_receber_cliente"].montar(
+            consulta, params_condicao=params_a_receber + [data_inicio, data_fim] + params_em_atraso
+        )
 
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
 
                 # Dicionário para armazenar os dados organizados por cliente
         dados = {}
 
-        for row in cur.fetchall():
+        for row in rows:
             codcliente = str(row[0]) if row[0] is not None else None
             cliente = str(row[1]) if row[1] is not None else None
             a_receber = float(row[2]) if row[2] is not None else 0.0
@@ -1794,14 +1375,16 @@ async def get_a_receber_cliente(
         
         return dados
 
-@router.post("/bi/tabela_a_receber", tags=["BI"], response_model=List[TabelaAReceber], status_code=status.HTTP_200_OK)
-async def get_tabela_a_receber(
+@router.post("/bi/a_receber_cliente", tags=["BI"], response_model=AReceberCliente, status_code=status.HTTP_200_OK)
+async def get_a_receber_cliente(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-    Consulta tabela de a receber usando POST com schema de entrada.
+    Consulta a receber cliente usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -1814,81 +1397,33 @@ async def get_tabela_a_receber(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "a_receber_cliente", conn_data, consulta, _consultar_a_receber_cliente),
+                       request, ("codcliente",), response)
+
+def _linha_tabela_a_receber(row) -> dict:
+    return {
+        "datavencto": row[0],
+        "cliente": str(row[1]) if row[1] is not None else None,
+        "cidade": str(row[2]) if row[2] is not None else None,
+        "coduf": str(row[3]) if row[3] is not None else None,
+        "produto": str(row[4]) if row[4] is not None else None,
+        "a_receber": float(row[5]) if row[5] is not None else 0.0,
+        "conta": str(row[6]) if row[6] is not None else None
+    }
+
+async def _consultar_tabela_a_receber(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        query= """
-            SELECT
-                datavencto,
-                cliente,
-                cidade,
-                coduf,
-                produto,
-                SUM(vlrsaldo),
-                conta
-            FROM
-                vwfactrc_bi
-            WHERE datavencto >= ? AND datavencto <= ?
-            GROUP BY 
-                datavencto,
-                cliente,
-                cidade,
-                coduf,
-                produto,
-                conta
-            ORDER BY 
-                datavencto DESC
-        """
-
-        params = []
-
-        # Aplicar filtros no WHERE externo (mesma lógica dos outros endpoints)
-        filtros_externos = ""
-        
-        params.extend([data_inicio, data_fim])
-        
-        # Normalizar filtros
-        codfilial = normalize_filter(consulta.codfilial)
-        codcliente = normalize_filter(consulta.codcliente)
-
-        # Aplicar filtros por filial
-        if codfilial:
-            placeholders_filial = ', '.join(['?'] * len(codfilial))
-            filtros_externos += f" AND codfilial IN ({placeholders_filial})"
-            params.extend(codfilial)
-
-        # Aplicar filtros por cliente
-        if codcliente:
-            placeholders_cliente = ', '.join(['?'] * len(codcliente))
-            filtros_externos += f" AND codcliente IN ({placeholders_cliente})"
-            params.extend(codcliente)
-
-
+        query, params = CONSULTAS_BI["tabela_a_receber"].montar(consulta, data_inicio, data_fim)
 
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE datavencto >= ? AND datavencto <= ?",
-            f"WHERE datavencto >= ? AND datavencto <= ?{filtros_externos}"
-        )
-
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
                      # Combina os resultados
-        dados = [
-            {
-                "datavencto": str(row[0]) if row[0] is not None else None,
-                "cliente": str(row[1]) if row[1] is not None else None,
-                "cidade": str(row[2]) if row[2] is not None else None,
-                "coduf": str(row[3]) if row[3] is not None else None,
-                "produto": str(row[4]) if row[4] is not None else None,
-                "a_receber": float(row[5]) if row[5] is not None else 0.0,
-                "conta": str(row[6]) if row[6] is not None else None
-            }
-            for row in cur.fetchall()
-        ]
+        dados = [_linha_tabela_a_receber(row) for row in rows]
               
 
         if not dados:
@@ -1896,16 +1431,21 @@ async def get_tabela_a_receber(
         
         return dados
 
-@router.get("/bi/filtro_fornecedor", tags=["BI"], response_model=List[FiltroFornecedor], status_code=status.HTTP_200_OK)
-async def get_filtro_fornecedor(
+@router.post("/bi/tabela_a_receber", tags=["BI"], response_model=List[TabelaAReceber], status_code=status.HTTP_200_OK)
+async def get_tabela_a_receber(
+    request: Request,
+    consulta: FiltrosBI = FiltrosBI(),
+    formato: Optional[str] = None,
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-        Consulta filtro fornecedor usando GET com schema de entrada.
+    Consulta tabela de a receber usando POST com schema de entrada.
+    Permite consultas mais complexas no futuro.
+    Com formato=ndjson|csv|arrow|parquet (ou o media type correspondente no Accept)
+    as linhas são enviadas em streaming, lidas do banco em lotes.
     """
-
-  # Verifica o token
+    # Verifica o token
     payload = decode_access_token(token)
     idempresa = payload.get("empresa")
 
@@ -1915,8 +1455,41 @@ async def get_filtro_fornecedor(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    formato = formato_stream(request, formato, "tabela_a_receber")
+    if formato:
+        lotes = lotes_tabela_bi(conn_data, "tabela_a_receber", consulta, tamanho_lote(formato))
+        return await resposta_stream(lotes, _linha_tabela_a_receber, formato, "tabela_a_receber")
+
+    return resposta_bi(await executar_consulta_bi(idempresa, "tabela_a_receber", conn_data, consulta, _consultar_tabela_a_receber))
+
+@router.post("/bi/tabela_a_receber/pagina", tags=["BI"], response_model=PaginaTabelaAReceber, status_code=status.HTTP_200_OK)
+async def get_tabela_a_receber_pagina(
+    consulta: FiltrosBI = FiltrosBI(),
+    limite: int = Query(BI_PAGINA_PADRAO, ge=1, le=BI_PAGINA_MAX),
+    cursor: Optional[str] = None,
+    total: bool = False,
+    token: str = Depends(oauth2_scheme)
+):
+
+    """
+    Tabela de a receber paginada: até `limite` linhas a partir do `cursor` (o campo
+    "proximo" da página anterior). Com total=true retorna também a quantidade de linhas.
+    """
+    # Verifica o token
+    payload = decode_access_token(token)
+    idempresa = payload.get("empresa")
+
+    if not idempresa:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID da empresa não encontrado no token")
+
+    # Obtém os dados de conexão do Firebird
+    conn_data = await get_firebird_connection_data(idempresa)
+
+    return resposta_bi(await pagina_tabela_bi(idempresa, conn_data, "tabela_a_receber", consulta, _linha_tabela_a_receber, limite, cursor, total))
+
+async def _consultar_filtro_fornecedor(conn_data: dict, consulta: FiltrosBI = None):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         query= """
             SELECT
@@ -1926,14 +1499,14 @@ async def get_filtro_fornecedor(
                 tbfor
         """
 
-        cur.execute(query)
+        rows = await fb.fetchall(query)
 
         dados = [
             {
                 "codfornecedor": str(row[0]) if row[0] is not None else None,
                 "fornecedor": str(row[1]) if row[1] is not None else None
             }
-            for row in cur.fetchall()
+            for row in rows
         ]
               
 
@@ -1942,13 +1515,13 @@ async def get_filtro_fornecedor(
         
         return dados
 
-@router.get("/bi/filtro_transacao", tags=["BI"], response_model=List[FiltroTransacao], status_code=status.HTTP_200_OK)
-async def get_filtro_transacao(
+@router.get("/bi/filtro_fornecedor", tags=["BI"], response_model=List[FiltroFornecedor], status_code=status.HTTP_200_OK)
+async def get_filtro_fornecedor(
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-        Consulta filtro transacao usando GET com schema de entrada.
+        Consulta filtro fornecedor usando GET com schema de entrada.
     """
 
   # Verifica o token
@@ -1961,8 +1534,11 @@ async def get_filtro_transacao(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "filtro_fornecedor", conn_data, None, _consultar_filtro_fornecedor))
+
+async def _consultar_filtro_transacao(conn_data: dict, consulta: FiltrosBI = None):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         query= """
             SELECT
@@ -1972,14 +1548,14 @@ async def get_filtro_transacao(
                 tbhis
         """
 
-        cur.execute(query)
+        rows = await fb.fetchall(query)
 
         dados = [
             {
                 "codtransacao": str(row[0]) if row[0] is not None else None,
                 "transacao": str(row[1]) if row[1] is not None else None
             }
-            for row in cur.fetchall()
+            for row in rows
         ]
               
 
@@ -1988,17 +1564,16 @@ async def get_filtro_transacao(
         
         return dados
 
-@router.post("/bi/big_numbers_contas_pagar", tags=["BI"], response_model=List[BigNumbersContasPagar], status_code=status.HTTP_200_OK)
-async def get_big_numbers_contas_pagar(
-    consulta: FiltrosBI = FiltrosBI(),
+@router.get("/bi/filtro_transacao", tags=["BI"], response_model=List[FiltroTransacao], status_code=status.HTTP_200_OK)
+async def get_filtro_transacao(
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-    Consulta big numbers contas pagar usando POST com schema de entrada.
-    Permite consultas mais complexas no futuro.
+        Consulta filtro transacao usando GET com schema de entrada.
     """
-    # Verifica o token
+
+  # Verifica o token
     payload = decode_access_token(token)
     idempresa = payload.get("empresa")
 
@@ -2008,67 +1583,51 @@ async def get_big_numbers_contas_pagar(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "filtro_transacao", conn_data, None, _consultar_filtro_transacao))
+
+async def _consultar_big_numbers_contas_pagar(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        # Normalizar filtros para aplicar em todas as queries
-        codfornecedor = normalize_filter(consulta.codfornecedor)
-        codtransacao = normalize_filter(consulta.codtransacao)
-
-        # Construir filtros adicionais para aplicar nas queries
-        filtros_adicionais = ""
-        params_filtros = []
+        # Filtros aplicados em todas as queries
+        filtros_adicionais, params_filtros = filtros_codigo(consulta, ("codfornecedor", "codtransacao"))
 
-        if codfornecedor:
-            placeholders_fornecedor = ', '.join(['?'] * len(codfornecedor))
-            filtros_adicionais += f" AND codfornecedor IN ({placeholders_fornecedor})"
-            params_filtros.extend(codfornecedor)
-
-        if codtransacao:
-            placeholders_transacao = ', '.join(['?'] * len(codtransacao))
-            filtros_adicionais += f" AND codtransacao IN ({placeholders_transacao})"
-            params_filtros.extend(codtransacao)
-
-        # 1. FATURAMENTO: Filtrado por período de recebimento
-        query_pago = f"""
-            SELECT
-	            COALESCE(SUM(vlrpago), 0) AS pago
-            FROM vwcptit_bi
-            WHERE datamovto >= ? AND datamovto <= ?{filtros_adicionais}
-        """
-        params_pago = [data_inicio, data_fim] + params_filtros
-
-        # 2. A PAGAR: Filtrado por período de vencimento
-        query_a_pagar = f"""
+        # Medidas por período em uma única leitura da view
+        #   pago:    período de movimento
+        #   a_pagar: 'A Pagar' no período de vencimento
+        condicao_a_pagar, params_a_pagar = condicao_fatura("VWCPTIT_BI", "A Pagar")
+        query_periodo = f"""
             SELECT
-	            COALESCE(SUM(vlrsaldo), 0) AS a_pagar
+	            COALESCE(SUM(CASE WHEN datamovto >= ? AND datamovto <= ? THEN vlrpago END), 0) AS pago,
+	            COALESCE(SUM(CASE WHEN {condicao_a_pagar} AND datavencto >= ? AND datavencto <= ? THEN vlrsaldo END), 0) AS a_pagar
             FROM vwcptit_bi
-            WHERE condicao_fatura = 'A Pagar'
-              AND datavencto >= ? AND datavencto <= ?{filtros_adicionais}
+            WHERE ((datamovto >= ? AND datamovto <= ?)
+                   OR ({condicao_a_pagar} AND datavencto >= ? AND datavencto <= ?)){filtros_adicionais}
         """
-        params_a_pagar = [data_inicio, data_fim] + params_filtros
+        params_a_pagar_periodo = params_a_pagar + [data_inicio, data_fim]
+        params_periodo = ([data_inicio, data_fim] + params_a_pagar_periodo + [data_inicio, data_fim]
+                          + params_a_pagar_periodo + params_filtros)
 
-        # 3. EM ATRASO: SEM filtro de data (sempre atual)
+        # EM ATRASO: SEM filtro de período (vencidos até hoje), executada em paralelo
+        condicao_em_atraso, params_em_atraso = condicao_fatura("VWCPTIT_BI", "Em Atraso")
         query_em_atraso = f"""
             SELECT COALESCE(SUM(vlrsaldo), 0) AS em_atraso
             FROM vwcptit_bi
-            WHERE condicao_fatura = 'Em Atraso'{filtros_adicionais}
+            WHERE {condicao_em_atraso}{filtros_adicionais}
         """
-        params_em_atraso = params_filtros
-
-        # Executar queries separadamente
-        cur.execute(query_pago, tuple(params_pago))
-        pago = cur.fetchone()[0] or 0.0
-
-        cur.execute(query_a_pagar, tuple(params_a_pagar))
-        a_pagar = cur.fetchone()[0] or 0.0
+        params_em_atraso = params_em_atraso + params_filtros
 
-        cur.execute(query_em_atraso, tuple(params_em_atraso))
-        em_atraso = cur.fetchone()[0] or 0.0
+        (pago, a_pagar), (em_atraso,) = await executar_paralelo(
+            fb.fetchone(query_periodo, tuple(params_periodo)),
+            fb.fetchone(query_em_atraso, tuple(params_em_atraso)),
+        )
+        pago = pago or 0.0
+        a_pagar = a_pagar or 0.0
+        em_atraso = em_atraso or 0.0
 
         # Retornar dados combinados
         dados = [
@@ -2082,13 +1641,14 @@ async def get_big_numbers_contas_pagar(
         
         return dados
 
-@router.post('/bi/contas_pagar_dia_mes_atual', tags=["BI"], response_model=ContasPagarDiaMesAtual, status_code=status.HTTP_200_OK)
-async def get_contas_pagar_dia_mes_atual(
+@router.post("/bi/big_numbers_contas_pagar", tags=["BI"], response_model=List[BigNumbersContasPagar], status_code=status.HTTP_200_OK)
+async def get_big_numbers_contas_pagar(
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
+
     """
-    Consulta Grafico dia e mes atual de contas pagar usando POST com schema de entrada.
+    Consulta big numbers contas pagar usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -2101,9 +1661,20 @@ async def get_contas_pagar_dia_mes_atual(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "big_numbers_contas_pagar", conn_data, consulta, _consultar_big_numbers_contas_pagar))
+
+async def _consultar_contas_pagar_dia_mes_atual(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
-        query = """
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
+        # Mês atual como intervalo de datas (calculado aqui, e não com EXTRACT no servidor)
+        hoje = date.today()
+        mes_atual = [inicio_mes(hoje), inicio_mes(hoje, 1)]
+        condicao_a_pagar, params_a_pagar = condicao_fatura("VWCPTIT_BI", "A Pagar", hoje)
+
+        # Filtros por código aplicados em cada ramo do UNION
+        filtros, params_filtros = filtros_codigo(consulta, ("codfornecedor", "codtransacao"))
+
+        query = f"""
                     SELECT
                         dia,
                         SUM(vlrpago),
@@ -2113,68 +1684,36 @@ async def get_contas_pagar_dia_mes_atual(
                         SELECT
                             dia_movto AS dia,
                             vlrpago,
-                            0 AS a_pagar,
-                            codfornecedor,
-                            codtransacao
+                            0 AS a_pagar
                         FROM
                             VWCPTIT_BI
                         WHERE
-                            ano_movto = EXTRACT(YEAR FROM CURRENT_TIMESTAMP)
-                            AND mes_numero_movto = EXTRACT(MONTH FROM CURRENT_TIMESTAMP)
+                            datamovto >= ? AND datamovto < ?{filtros}
                     UNION ALL
                         SELECT
                             dia_vencto AS dia,
                             0 AS vlrpago,
-                            vlrsaldo AS a_pagar,
-                            codfornecedor,
-                            codtransacao
+                            vlrsaldo AS a_pagar
                         FROM
                             VWCPTIT_BI
                         WHERE
-                            ano_vencto = EXTRACT(YEAR FROM CURRENT_TIMESTAMP)
-                            AND mes_numero_vencto = EXTRACT(MONTH FROM CURRENT_TIMESTAMP)
-                            AND condicao_fatura = 'A Pagar'
+                            datavencto >= ? AND datavencto < ?
+                            AND {condicao_a_pagar}{filtros}
                     ) dados
-                    WHERE 1=1
                     GROUP BY
                         dia
                     ORDER BY
                         dia
         """
 
-        params = []
+        params = mes_atual + params_filtros + mes_atual + params_a_pagar + params_filtros
 
-        # Aplicar filtros no WHERE externo (após o UNION) - igual kpi_mes_ano
-        filtros_externos = ""
-        
-        # Normalizar filtros
-        codfornecedor = normalize_filter(consulta.codfornecedor)
-        codtransacao = normalize_filter(consulta.codtransacao)
-
-        # Aplicar filtros por filial
-        if codfornecedor:
-            placeholders_fornecedor = ', '.join(['?'] * len(codfornecedor))
-            filtros_externos += f" AND codfornecedor IN ({placeholders_fornecedor})"
-            params.extend(codfornecedor)
-
-        # Aplicar filtros por cliente
-        if codtransacao:
-            placeholders_codtransacao = ', '.join(['?'] * len(codtransacao))
-            filtros_externos += f" AND codtransacao IN ({placeholders_codtransacao})"
-            params.extend(codtransacao)
-
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE 1=1",
-            f"WHERE 1=1{filtros_externos}"
-        )
-
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
 
         # Dicionário para armazenar os dados organizados por dia
         dados = {}
 
-        for row in cur.fetchall():
+        for row in rows:
             dia = str(int(row[0])) if row[0] is not None else "0"
             pago = float(row[1]) if row[1] is not None else 0.0
             a_pagar = float(row[2]) if row[2] is not None else 0.0
@@ -2190,14 +1729,15 @@ async def get_contas_pagar_dia_mes_atual(
         
         return dados
 
-@router.post("/bi/a_pagar_fornecedor", tags=["BI"], response_model=APagarFornecedor, status_code=status.HTTP_200_OK)
-async def get_a_pagar_fornecedor(
+@router.post('/bi/contas_pagar_dia_mes_atual', tags=["BI"], response_model=ContasPagarDiaMesAtual, status_code=status.HTTP_200_OK)
+async def get_contas_pagar_dia_mes_atual(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
-
     """
-    Consulta a pagar fornecedor usando POST com schema de entrada.
+    Consulta Grafico dia e mes atual de contas pagar usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -2210,82 +1750,30 @@ async def get_a_pagar_fornecedor(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "contas_pagar_dia_mes_atual", conn_data, consulta, _consultar_contas_pagar_dia_mes_atual),
+                       request, ("dia",), response)
+
+async def _consultar_a_pagar_fornecedor(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        # Construir filtros adicionais para aplicar nas queries
-        filtros_adicionais_a_pagar = ""
-        filtros_adicionais_em_atraso = ""
-        params_a_pagar = [data_inicio, data_fim]
-        params_em_atraso = []
-        
-        # Normalizar filtros
-        codfornecedor = normalize_filter(consulta.codfornecedor)
-        codtransacao = normalize_filter(consulta.codtransacao)
-
-        # Aplicar filtros por fornecedor
-        if codfornecedor:
-            placeholders_fornecedor = ', '.join(['?'] * len(codfornecedor))
-            filtros_adicionais_a_pagar += f" AND codfornecedor IN ({placeholders_fornecedor})"
-            filtros_adicionais_em_atraso += f" AND codfornecedor IN ({placeholders_fornecedor})"
-            params_a_pagar.extend(codfornecedor)
-            params_em_atraso.extend(codfornecedor)
-
-        # Aplicar filtros por transacao
-        if codtransacao:
-            placeholders_transacao = ', '.join(['?'] * len(codtransacao))
-            filtros_adicionais_a_pagar += f" AND codtransacao IN ({placeholders_transacao})"
-            filtros_adicionais_em_atraso += f" AND codtransacao IN ({placeholders_transacao})"
-            params_a_pagar.extend(codtransacao)
-            params_em_atraso.extend(codtransacao)
-
-        query= f"""
-               SELECT
-                    codfornecedor,
-                    fornecedor,
-                    SUM(vlrsaldo)
-                FROM
-                    (
-                    SELECT
-                        fornecedor,
-                        vlrsaldo,
-                        codfornecedor,
-                        codtransacao,
-                        datavencto
-                    FROM
-                        VWCPTIT_BI
-                    WHERE condicao_fatura = 'A Pagar' AND datavencto >= ? AND datavencto <= ?{filtros_adicionais_a_pagar}
-                UNION ALL
-                    SELECT
-                        fornecedor,
-                        vlrsaldo,
-                        codfornecedor,
-                        codtransacao,
-                        datavencto
-                    FROM
-                        VWCPTIT_BI
-                    WHERE condicao_fatura = 'Em Atraso'{filtros_adicionais_em_atraso}
-                            ) dados
-                GROUP BY
-                    codfornecedor,
-                    fornecedor
-                ORDER BY
-                    SUM(vlrsaldo) DESC
-        """
-
-        params = params_a_pagar + params_em_atraso
-
+        # 'A Pagar' no período de vencimento e tudo o que está 'Em Atraso'
+        _, params_a_pagar = condicao_fatura("VWCPTIT_BI", "A Pagar")
+        _, params_em_atraso = condicao_fatura("VWCPTIT_BI", "Em Atraso")
+        query, params = CONSULTAS_BI["a_pagar_fornecedor"].montar(
+            consulta, params_condicao=params_a_pagar + [data_inicio, data_fim] + params_em_atraso
+        )
 
-        cur.execute(query, tuple(params))
+        rows = await fb.fetchall(query, tuple(params))
 
                 # Dicionário para armazenar os dados organizados por cliente
         dados = {}
 
-        for row in cur.fetchall():
+        for row in rows:
             codfornecedor = str(row[0]) if row[0] is not None else None
             fornecedor = str(row[1]) if row[1] is not None else None
             a_pagar = float(row[2]) if row[2] is not None else 0.0
@@ -2301,14 +1789,16 @@ async def get_a_pagar_fornecedor(
         
         return dados
 
-@router.post("/bi/tabela_a_pagar", tags=["BI"], response_model=List[TabelaAPagar], status_code=status.HTTP_200_OK)
-async def get_tabela_a_pagar(
+@router.post("/bi/a_pagar_fornecedor", tags=["BI"], response_model=APagarFornecedor, status_code=status.HTTP_200_OK)
+async def get_a_pagar_fornecedor(
+    request: Request,
+    response: Response,
     consulta: FiltrosBI = FiltrosBI(),
     token: str = Depends(oauth2_scheme)
 ):
 
     """
-    Consulta tabela de a pagar usando POST com schema de entrada.
+    Consulta a pagar fornecedor usando POST com schema de entrada.
     Permite consultas mais complexas no futuro.
     """
     # Verifica o token
@@ -2321,78 +1811,90 @@ async def get_tabela_a_pagar(
     # Obtém os dados de conexão do Firebird
     conn_data = await get_firebird_connection_data(idempresa)
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "a_pagar_fornecedor", conn_data, consulta, _consultar_a_pagar_fornecedor),
+                       request, ("codfornecedor",), response)
+
+def _linha_tabela_a_pagar(row) -> dict:
+    return {
+        "datavencto": row[0],
+        "fornecedor": str(row[1]) if row[1] is not None else None,
+        "transacao": str(row[2]) if row[2] is not None else None,
+        "a_pagar": float(row[3]) if row[3] is not None else 0.0,
+        "conta": str(row[4]) if row[4] is not None else None
+    }
+
+async def _consultar_tabela_a_pagar(conn_data: dict, consulta: FiltrosBI):
     # Usa o context manager para gerenciar a conexão automaticamente
-    with firebird_connection_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as (con, cur):
+    async with firebird_async_manager(conn_data['ipbd'], conn_data['portabd'], conn_data['caminhobd']) as fb:
 
         # ← AQUI usa os campos do schema
         data_fim = consulta.data_fim or date.today()
         data_inicio = consulta.data_inicio or (data_fim - timedelta(days=30))
 
-        query= """
-            SELECT
-                datavencto,
-                fornecedor,
-                transacao,
-                SUM(vlrsaldo),
-                conta
-            FROM
-                vwcptit_bi
-                WHERE datavencto >= ? AND datavencto <= ?
-            GROUP BY
-                datavencto,
-                fornecedor,
-                transacao,
-                conta
-            ORDER BY
-                datavencto DESC
-        """
+        query, params = CONSULTAS_BI["tabela_a_pagar"].montar(consulta, data_inicio, data_fim)
 
-        params = []
+        rows = await fb.fetchall(query, tuple(params))
+                     # Combina os resultados
+        dados = [_linha_tabela_a_pagar(row) for row in rows]
+              
 
-        # Aplicar filtros no WHERE externo (mesma lógica dos outros endpoints)
-        filtros_externos = ""
-        
-        params.extend([data_inicio, data_fim])
+        if not dados:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Nenhum dado encontrado")
         
-        # Normalizar filtros
-        codfornecedor = normalize_filter(consulta.codfornecedor)
-        codtransacao = normalize_filter(consulta.codtransacao)
+        return dados
+
+@router.post("/bi/tabela_a_pagar", tags=["BI"], response_model=List[TabelaAPagar], status_code=status.HTTP_200_OK)
+async def get_tabela_a_pagar(
+    request: Request,
+    consulta: FiltrosBI = FiltrosBI(),
+    formato: Optional[str] = None,
+    token: str = Depends(oauth2_scheme)
+):
+
+    """
+    Consulta tabela de a pagar usando POST com schema de entrada.
+    Permite consultas mais complexas no futuro.
+    Com formato=ndjson|csv|arrow|parquet (ou o media type correspondente no Accept)
+    as linhas são enviadas em streaming, lidas do banco em lotes.
+    """
+    # Verifica o token
+    payload = decode_access_token(token)
+    idempresa = payload.get("empresa")
 
-        # Aplicar filtros por filial
-        if codfornecedor:
-            placeholders_fornecedor = ', '.join(['?'] * len(codfornecedor))
-            filtros_externos += f" AND codfornecedor IN ({placeholders_fornecedor})"
-            params.extend(codfornecedor)
+    if not idempresa:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID da empresa não encontrado no token")
+    
+    # Obtém os dados de conexão do Firebird
+    conn_data = await get_firebird_connection_data(idempresa)
 
-        # Aplicar filtros por cliente
-        if codtransacao:
-            placeholders_transacao = ', '.join(['?'] * len(codtransacao))
-            filtros_externos += f" AND codtransacao IN ({placeholders_transacao})"
-            params.extend(codtransacao)
+    formato = formato_stream(request, formato, "tabela_a_pagar")
+    if formato:
+        lotes = lotes_tabela_bi(conn_data, "tabela_a_pagar", consulta, tamanho_lote(formato))
+        return await resposta_stream(lotes, _linha_tabela_a_pagar, formato, "tabela_a_pagar")
 
+    return resposta_bi(await executar_consulta_bi(idempresa, "tabela_a_pagar", conn_data, consulta, _consultar_tabela_a_pagar))
 
+@router.post("/bi/tabela_a_pagar/pagina", tags=["BI"], response_model=PaginaTabelaAPagar, status_code=status.HTTP_200_OK)
+async def get_tabela_a_pagar_pagina(
+    consulta: FiltrosBI = FiltrosBI(),
+    limite: int = Query(BI_PAGINA_PADRAO, ge=1, le=BI_PAGINA_MAX),
+    cursor: Optional[str] = None,
+    total: bool = False,
+    token: str = Depends(oauth2_scheme)
+):
 
-        # Inserir filtros no WHERE externo
-        query = query.replace(
-            "WHERE datavencto >= ? AND datavencto <= ?",
-            f"WHERE datavencto >= ? AND datavencto <= ?{filtros_externos}"
-        )
+    """
+    Tabela de a pagar paginada: até `limite` linhas a partir do `cursor` (o campo
+    "proximo" da página anterior). Com total=true retorna também a quantidade de linhas.
+    """
+    # Verifica o token
+    payload = decode_access_token(token)
+    idempresa = payload.get("empresa")
 
-        cur.execute(query, tuple(params))
-                     # Combina os resultados
-        dados = [
-            {
-                "datavencto": str(row[0]) if row[0] is not None else None,
-                "fornecedor": str(row[1]) if row[1] is not None else None,
-                "transacao": str(row[2]) if row[2] is not None else None,
-                "a_pagar": float(row[3]) if row[3] is not None else 0.0,
-                "conta": str(row[4]) if row[4] is not None else None
-            }
-            for row in cur.fetchall()
-        ]
-              
+    if not idempresa:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID da empresa não encontrado no token")
 
-        if not dados:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Nenhum dado encontrado")
-        
-        return dados
\ No newline at end of file
+    # Obtém os dados de conexão do Firebird
+    conn_data = await get_firebird_connection_data(idempresa)
+
+    return resposta_bi(await pagina_tabela_bi(idempresa, conn_data, "tabela_a_pagar", consulta, _linha_tabela_a_pagar, limite, cursor, total))
\ No newline at end of file
@@ -7,6 +7,8 @@ from app.models.empresaModel import tbempresa
 from app.schemas.empresaSchemas import EmpresaRetorno, EmpresaCadastro
 from fastapi.security import OAuth2PasswordBearer
 from app.auth.auth import decode_access_token
+from app.db.cacheconexao import cache_conexao_tenant
+from app.utils.cachebi import cache_bi
 
 router = APIRouter()
 
@@ -75,6 +77,8 @@ async def post_empresa(empresa: EmpresaCadastro,
 
         db.add(new_empresa)
         await db.commit()
+        # Remove um eventual registro de empresa inexistente do cache
+        cache_conexao_tenant.invalidar(new_empresa.codempresa)
         return new_empresa
     except IntegrityError:
         raise HTTPException(status_code=400, detail="Empresa já cadastrada")
@@ -97,6 +101,9 @@ async def put_empresa(codempresa: int, empresa: EmpresaCadastro, token: str = De
     for var, value in empresa.dict().items():
         setattr(empresaatual, var, value)
     await db.commit()
+    # Os dados de conexão podem ter mudado (inclusive o banco de onde vêm os resultados)
+    cache_conexao_tenant.invalidar(codempresa)
+    cache_bi.invalidar_tenant(codempresa)
     return empresaatual
 
 @router.delete("/empresas/{codempresa}", tags=["Empresas"], status_code=status.HTTP_204_NO_CONTENT)
@@ -116,4 +123,6 @@ async def delete_empresa(codempresa: int, token: str = Depends(oauth2_scheme), d
     else:
         await db.delete(empresa)
         await db.commit()
+        cache_conexao_tenant.invalidar(codempresa)
+        cache_bi.invalidar_tenant(codempresa)
         return None
\ No newline at end of file
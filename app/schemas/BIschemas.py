@@ -114,6 +114,12 @@ class TabelaFaturamento(BaseModel):
     coduf: str
     produto: str
 
+# Página da tabela (paginação por cursor)
+class PaginaTabelaFaturamento(BaseModel):
+    dados: List[TabelaFaturamento]
+    proximo: Optional[str] = None
+    total: Optional[int] = None
+
 class FiltroFilial(BaseModel):
     codfilial: str
     filial: str
@@ -153,6 +159,12 @@ class TabelaAReceber(BaseModel):
     a_receber: float
     conta: str
 
+# Página da tabela (paginação por cursor)
+class PaginaTabelaAReceber(BaseModel):
+    dados: List[TabelaAReceber]
+    proximo: Optional[str] = None
+    total: Optional[int] = None
+
 class FiltroFornecedor(BaseModel):
     codfornecedor: str
     fornecedor: str
@@ -188,3 +200,9 @@ class TabelaAPagar(BaseModel):
     transacao: str
     a_pagar: float
     conta: str
+
+# Página da tabela (paginação por cursor)
+class PaginaTabelaAPagar(BaseModel):
+    dados: List[TabelaAPagar]
+    proximo: Optional[str] = None
+    total: Optional[int] = None
@@ -0,0 +1,132 @@
+from fastapi import HTTPException, status
+from dotenv import load_dotenv
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+load_dotenv()
+
+# Linhas lidas do Firebird por vez nas exportações Arrow/Parquet (cada lote vira um
+# record batch ou um row group, então lotes maiores comprimem melhor)
+BI_EXPORTACAO_LOTE = int(os.getenv("BI_EXPORTACAO_LOTE", "10000"))
+
+FORMATOS_ARROW = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Colunas exportadas de cada endpoint, na ordem do SELECT (CONSULTAS_BI):
+# inteiro, data (date32), dinheiro (float64), texto e categoria (texto com dicionário,
+# para os nomes que se repetem em muitas linhas)
+COLUNAS_ARROW = {
+    "tabela_faturamento": (
+        ("nrofatura", "inteiro"), ("anofatura", "inteiro"), ("datarecbto", "data"),
+        ("faturamento", "dinheiro"), ("filial", "categoria"), ("cliente", "categoria"),
+        ("cidade", "categoria"), ("coduf", "categoria"), ("produto", "categoria"),
+    ),
+    "tabela_a_receber": (
+        ("datavencto", "data"), ("cliente", "categoria"), ("cidade", "categoria"),
+        ("coduf", "categoria"), ("produto", "categoria"), ("a_receber", "dinheiro"),
+        ("conta", "categoria"),
+    ),
+    "tabela_a_pagar": (
+        ("datavencto", "data"), ("fornecedor", "categoria"), ("transacao", "categoria"),
+        ("a_pagar", "dinheiro"), ("conta", "categoria"),
+    ),
+}
+
+
+def verificar_arrow(formato: str, endpoint: str):
+    """Erro HTTP se o formato Arrow/Parquet não pode ser atendido"""
+    if pa is None:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                            detail="Exportação Arrow/Parquet indisponível: pyarrow não instalado")
+    if endpoint not in COLUNAS_ARROW:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Formato {formato} não disponível neste endpoint")
+
+
+def _tipo(tipo: str):
+    return {
+        "inteiro": pa.int64(),
+        "data": pa.date32(),
+        "dinheiro": pa.float64(),
+        "texto": pa.string(),
+        "categoria": pa.dictionary(pa.int32(), pa.string()),
+    }[tipo]
+
+
+def _coluna(valores, tipo: str):
+    """Coluna de um lote, com as mesmas conversões das linhas JSON/NDJSON/CSV"""
+    if tipo == "dinheiro":
+        # O driver entrega NUMERIC como Decimal; nulo vira 0.0, como no JSON
+        return pa.array([0.0 if valor is None else float(valor) for valor in valores], pa.float64())
+    if tipo == "inteiro":
+        return pa.array([None if valor is None else int(valor) for valor in valores], pa.int64())
+    if tipo in ("texto", "categoria"):
+        coluna = pa.array([None if valor is None else str(valor) for valor in valores], pa.string())
+        return coluna.dictionary_encode() if tipo == "categoria" else coluna
+    return pa.array(valores, _tipo(tipo))
+
+
+class _Saida:
+    """Destino dos writers do pyarrow: guarda o que foi escrito até ser retirado"""
+
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+        self.closed = False
+
+    def write(self, dados) -> int:
+        self.partes.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retirar(self) -> bytes:
+        dados = b"".join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+class CodificadorArrow:
+    """
+    Codifica os lotes de linhas do Firebird como record batches de um stream Arrow IPC
+    ou row groups de um arquivo Parquet, devolvendo os bytes prontos a cada lote.
+    """
+
+    def __init__(self, formato: str, endpoint: str):
+        self.colunas = COLUNAS_ARROW[endpoint]
+        self.esquema = pa.schema([(nome, _tipo(tipo)) for nome, tipo in self.colunas])
+        self.saida = _Saida()
+        if formato == "parquet":
+            self.writer = pq.ParquetWriter(self.saida, self.esquema, compression="zstd")
+        else:
+            self.writer = pa.ipc.new_stream(self.saida, self.esquema)
+
+    def lote(self, rows: list) -> bytes:
+        valores = list(zip(*rows))
+        lote = pa.RecordBatch.from_arrays(
+            [_coluna(valores[i], tipo) for i, (_, tipo) in enumerate(self.colunas)],
+            schema=self.esquema,
+        )
+        self.writer.write_batch(lote)
+        return self.saida.retirar()
+
+    def fim(self) -> bytes:
+        """Fecha o stream (marcador de fim / rodapé do Parquet)"""
+        self.writer.close()
+        return self.saida.retirar()
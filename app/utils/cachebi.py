@@ -0,0 +1,272 @@
+from collections import OrderedDict
+from fastapi import HTTPException
+from pydantic import BaseModel
+from dotenv import load_dotenv
+import contextvars
+import asyncio
+import time
+import sys
+import os
+
+load_dotenv()
+
+# Orçamento global de memória do cache de resultados BI (bytes estimados)
+BI_CACHE_MAX_BYTES = int(os.getenv("BI_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Tempo (segundos) em que um resultado é considerado atual, quando o endpoint não define o seu
+BI_CACHE_TTL = float(os.getenv("BI_CACHE_TTL", "60"))
+# Tempo máximo (segundos) de um resultado cuja marca d'água do tenant não mudou (só para
+# períodos dentro da janela da sonda de frescor; ver CacheBI.obter)
+BI_CACHE_TTL_VALIDADO = float(os.getenv("BI_CACHE_TTL_VALIDADO", "900"))
+# Janela (segundos, após o TTL) em que o resultado antigo é servido enquanto é recalculado
+BI_CACHE_STALE_WHILE_REVALIDATE = float(os.getenv("BI_CACHE_STALE_WHILE_REVALIDATE", "300"))
+# Janela (segundos, após o TTL) em que o resultado antigo é servido se o Firebird do tenant falhar
+# (a resposta vai marcada com os cabeçalhos Age e Warning)
+BI_CACHE_STALE_IF_ERROR = float(os.getenv("BI_CACHE_STALE_IF_ERROR", "3600"))
+
+# Orçamento e tempo de vida (segundos) dos agregados de períodos fechados (meses que não mudam mais)
+BI_CACHE_FECHADOS_MAX_BYTES = int(os.getenv("BI_CACHE_FECHADOS_MAX_BYTES", str(32 * 1024 * 1024)))
+BI_CACHE_FECHADOS_TTL = float(os.getenv("BI_CACHE_FECHADOS_TTL", str(30 * 24 * 3600)))
+
+# TTL por endpoint (segundos). TTL 0: o resultado não é guardado (as listas completas dos
+# tabela_* ocupariam o orçamento inteiro; para elas há o streaming e as páginas por keyset)
+BI_CACHE_TTL_ENDPOINT = {
+    "big_numbers": 60,
+    "kpi_mes_ano": 300,
+    "kpi_dia_mes_atual": 60,
+    "kpi_filial": 120,
+    "kpi_regiao": 120,
+    "kpi_cidade": 120,
+    "kpi_cliente": 120,
+    "kpi_produto": 120,
+    "tabela_faturamento": 0,
+    "filtro_filial": 3600,
+    "filtro_cliente": 3600,
+    "big_numbers_contas_receber": 60,
+    "recebimentos_dia_mes_atual": 60,
+    "a_receber_cliente": 120,
+    "tabela_a_receber": 0,
+    "filtro_fornecedor": 3600,
+    "filtro_transacao": 3600,
+    "big_numbers_contas_pagar": 60,
+    "contas_pagar_dia_mes_atual": 60,
+    "a_pagar_fornecedor": 120,
+    "tabela_a_pagar": 0,
+    "tabela_faturamento_total": 300,
+    "tabela_a_receber_total": 300,
+    "tabela_a_pagar_total": 300,
+    "kpi_mes_ano_fechados": BI_CACHE_FECHADOS_TTL,
+}
+# Endpoints calculados sobre vlrsaldo: uma baixa muda o saldo sem mover as datas nem as
+# contagens da sonda de frescor, então a marca d'água não estende o TTL deles
+# (continua invalidando antes, quando muda)
+BI_CACHE_ENDPOINTS_SALDO = {
+    "big_numbers_contas_receber", "recebimentos_dia_mes_atual", "a_receber_cliente",
+    "tabela_a_receber", "tabela_a_receber_total",
+    "big_numbers_contas_pagar", "contas_pagar_dia_mes_atual", "a_pagar_fornecedor",
+    "tabela_a_pagar", "tabela_a_pagar_total",
+}
+
+# Itens medidos de listas e dicts grandes; o restante é estimado pela média da amostra
+BI_CACHE_AMOSTRA = 32
+
+# Idade (segundos) do resultado antigo servido na requisição atual porque o Firebird falhou
+resultado_antigo = contextvars.ContextVar("resultado_antigo", default=None)
+
+
+def _tamanho_par(item) -> int:
+    return estimar_tamanho(item[0]) + estimar_tamanho(item[1])
+
+
+def estimar_tamanho(valor) -> int:
+    """Estimativa (bytes) da memória ocupada por um resultado"""
+    tamanho = sys.getsizeof(valor)
+    if isinstance(valor, dict):
+        itens, medir = valor.items(), _tamanho_par
+    elif isinstance(valor, (list, tuple)):
+        itens, medir = valor, estimar_tamanho
+    elif isinstance(valor, BaseModel):
+        return tamanho + estimar_tamanho(valor.__dict__)
+    else:
+        return tamanho
+    if len(itens) > BI_CACHE_AMOSTRA:
+        # Linhas do mesmo formato: mede só as primeiras e multiplica pela quantidade
+        amostra = [item for _, item in zip(range(BI_CACHE_AMOSTRA), itens)]
+        return tamanho + sum(map(medir, amostra)) * len(itens) // len(amostra)
+    return tamanho + sum(map(medir, itens))
+
+
+def erro_de_origem(erro: Exception) -> bool:
+    """Erros do Firebird do tenant (indisponível, timeout), que permitem servir o resultado antigo"""
+    if isinstance(erro, HTTPException):
+        return erro.status_code >= 500
+    return True
+
+
+class EntradaCacheBI:
+    __slots__ = ("valor", "tamanho", "marca", "criada_em", "atual_ate", "revalidar_ate", "erro_ate")
+
+    def __init__(self, valor, tamanho: int, ttl: float, marca=None):
+        agora = time.monotonic()
+        self.valor = valor
+        self.tamanho = tamanho
+        self.marca = marca
+        self.criada_em = agora
+        self.atual_ate = agora + ttl
+        self.revalidar_ate = self.atual_ate + BI_CACHE_STALE_WHILE_REVALIDATE
+        self.erro_ate = self.atual_ate + BI_CACHE_STALE_IF_ERROR
+
+
+class CacheBI:
+    """
+    Cache de resultados BI chaveado por (tenant, endpoint, ...filtros canônicos),
+    com orçamento global de memória, expulsão LRU, TTL por endpoint,
+    stale-while-revalidate e stale-if-error.
+
+    Quando a marca d'água do tenant é informada, a entrada é recalculada assim que a
+    marca mudar. Se o período lido está todo dentro da janela da sonda (`recente`),
+    a marca também substitui o TTL cego: a entrada vale enquanto a marca não mudar
+    (até BI_CACHE_TTL_VALIDADO, ou o TTL do endpoint nos calculados sobre o saldo).
+    """
+
+    def __init__(self, max_bytes: int = BI_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._revalidando = {}
+        self._stats = {
+            "acertos": 0,
+            "acertos_validados": 0,
+            "falhas": 0,
+            "invalidadas_marca": 0,
+            "antigos_revalidando": 0,
+            "antigos_por_erro": 0,
+            "revalidacoes": 0,
+            "falhas_revalidacao": 0,
+            "expulsoes": 0,
+            "invalidacoes": 0,
+        }
+
+    def _ttl(self, endpoint: str) -> float:
+        return BI_CACHE_TTL_ENDPOINT.get(endpoint, BI_CACHE_TTL)
+
+    def _ttl_validado(self, endpoint: str, recente: bool) -> float:
+        """Vida máxima de uma entrada enquanto a marca d'água do tenant não muda"""
+        if not recente or endpoint in BI_CACHE_ENDPOINTS_SALDO:
+            return self._ttl(endpoint)
+        return BI_CACHE_TTL_VALIDADO
+
+    def _remover(self, chave):
+        entrada = self._entradas.pop(chave, None)
+        if entrada is not None:
+            self._bytes -= entrada.tamanho
+
+    def guardar(self, chave, endpoint: str, valor, marca=None):
+        tamanho = estimar_tamanho(valor)
+        self._remover(chave)
+        if tamanho > self.max_bytes:
+            return
+        self._entradas[chave] = EntradaCacheBI(valor, tamanho, self._ttl(endpoint), marca)
+        self._bytes += tamanho
+        while self._bytes > self.max_bytes:
+            _, antiga = self._entradas.popitem(last=False)
+            self._bytes -= antiga.tamanho
+            self._stats["expulsoes"] += 1
+
+    def buscar(self, chave):
+        """Resultado ainda atual guardado para `chave`, ou None"""
+        entrada = self._entradas.get(chave)
+        if entrada is None or time.monotonic() >= entrada.atual_ate:
+            self._stats["falhas"] += 1
+            return None
+        self._entradas.move_to_end(chave)
+        self._stats["acertos"] += 1
+        return entrada.valor
+
+    async def obter(self, chave, endpoint: str, carregar, marca=None, recente: bool = False):
+        """
+        Retorna o resultado guardado para `chave` ou o calcula com `carregar()`.
+        A chave deve começar pelo idempresa (usado na invalidação por tenant).
+        `marca` é a marca d'água atual do tenant (None quando não há sonda) e
+        `recente` indica que o período lido começa dentro da janela da sonda: só
+        então uma marca igual estende o TTL (alterações mais antigas não a movem).
+        """
+        if self._ttl(endpoint) <= 0:
+            return await carregar()
+        entrada = self._entradas.get(chave)
+        agora = time.monotonic()
+        if entrada is not None:
+            self._entradas.move_to_end(chave)
+            if marca is not None and entrada.marca is not None:
+                if entrada.marca == marca and agora - entrada.criada_em < self._ttl_validado(endpoint, recente):
+                    self._stats["acertos_validados"] += 1
+                    return entrada.valor
+                if entrada.marca != marca:
+                    # Os dados de origem mudaram: recalcula agora (o antigo só serve em caso de erro)
+                    self._stats["invalidadas_marca"] += 1
+                    return await self._carregar(chave, endpoint, carregar, marca, entrada, agora)
+            if agora < entrada.atual_ate:
+                self._stats["acertos"] += 1
+                return entrada.valor
+            if agora < entrada.revalidar_ate:
+                self._stats["antigos_revalidando"] += 1
+                self._revalidar(chave, endpoint, carregar, marca)
+                return entrada.valor
+
+        return await self._carregar(chave, endpoint, carregar, marca, entrada, agora)
+
+    async def _carregar(self, chave, endpoint: str, carregar, marca, entrada, agora: float):
+        self._stats["falhas"] += 1
+        try:
+            valor = await carregar()
+        except Exception as e:
+            if entrada is not None and agora < entrada.erro_ate and erro_de_origem(e):
+                self._stats["antigos_por_erro"] += 1
+                resultado_antigo.set(int(agora - entrada.criada_em))
+                return entrada.valor
+            raise
+        self.guardar(chave, endpoint, valor, marca)
+        return valor
+
+    def _revalidar(self, chave, endpoint: str, carregar, marca=None):
+        """Recalcula o resultado em segundo plano (uma única vez por chave)"""
+        if chave in self._revalidando:
+            return
+
+        async def revalidar():
+            try:
+                self.guardar(chave, endpoint, await carregar(), marca)
+                self._stats["revalidacoes"] += 1
+            except Exception:
+                # Mantém o resultado antigo; a próxima requisição tenta de novo
+                self._stats["falhas_revalidacao"] += 1
+            finally:
+                self._revalidando.pop(chave, None)
+
+        self._revalidando[chave] = asyncio.create_task(revalidar())
+
+    def invalidar(self, chave):
+        self._stats["invalidacoes"] += 1
+        self._remover(chave)
+
+    def invalidar_tenant(self, idempresa: int):
+        """Remove todos os resultados de um tenant"""
+        for chave in [c for c in self._entradas if c[0] == idempresa]:
+            self.invalidar(chave)
+
+    def limpar(self):
+        self._entradas.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats.update({
+            "entradas": len(self._entradas),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        })
+        return stats
+
+
+cache_bi = CacheBI()
+# Agregados de períodos fechados, chaveados pelo banco do tenant (ipbd, portabd, caminhobd)
+cache_periodos_fechados = CacheBI(max_bytes=BI_CACHE_FECHADOS_MAX_BYTES)
@@ -0,0 +1,243 @@
+from fastapi import HTTPException, status
+from app.schemas.BIschemas import FiltrosBI
+from app.utils.filtrosbi import filtros_codigo, canonizar_filtros, CONDICOES_FATURA, BI_FILTRO_MAX_FORMATOS
+from collections import OrderedDict
+from datetime import date
+from dotenv import load_dotenv
+import hashlib
+import base64
+import json
+import os
+
+load_dotenv()
+
+# Tamanho padrão e máximo das páginas dos endpoints tabela_*
+BI_PAGINA_PADRAO = int(os.getenv("BI_PAGINA_PADRAO", "100"))
+BI_PAGINA_MAX = int(os.getenv("BI_PAGINA_MAX", "1000"))
+
+# Conversão dos valores da chave guardados no cursor (JSON) de volta ao tipo do banco
+TIPOS_CHAVE = {
+    "data": date.fromisoformat,
+    "texto": str,
+    "inteiro": int,
+}
+
+
+class ConsultaBI:
+    """
+    Consulta de um endpoint sobre uma view do BI descrita por partes: colunas
+    (dimensões e medidas), condição fixa, coluna de data do período, filtros
+    aceitos, agrupamento e ordem. O SQL completo é montado uma vez por formato
+    de filtro (ver filtros_codigo) e reaproveitado nas próximas requisições.
+
+    Ordem dos parâmetros: os da condição, o período (início, fim) e os filtros.
+
+    Com `chave` (expressões que identificam uma linha, com o tipo de cada uma) a consulta
+    também é paginada por keyset: ordem decrescente pela chave e "depois da última linha
+    vista" no WHERE. Com o índice descendente da chave (V007) o Firebird percorre o índice a
+    partir do cursor, então qualquer página custa o mesmo que a primeira; nas consultas
+    agrupadas o índice do vencimento limita a leitura aos vencimentos ainda não paginados.
+    """
+
+    def __init__(self, view: str, colunas: tuple, filtros: tuple = (), coluna_data: str = None,
+                 condicao: str = None, agrupar: tuple = (), ordem: str = None, chave: tuple = ()):
+        self.view = view
+        self.colunas = colunas
+        self.filtros = filtros
+        self.coluna_data = coluna_data
+        self.condicao = condicao
+        self.agrupar = agrupar
+        self.ordem = ordem
+        self.chave = chave
+        # (trecho de filtros, modo) -> SQL completo
+        self._sql = OrderedDict()
+
+    def _apos_chave(self, i: int = 0) -> str:
+        """Linhas depois de `chave[i:]` na ordem decrescente (o Firebird não compara tuplas)"""
+        expressao = self.chave[i][0]
+        if i == len(self.chave) - 1:
+            return f"{expressao} < ?"
+        return f"({expressao} < ? OR ({expressao} = ? AND {self._apos_chave(i + 1)}))"
+
+    def _compilar(self, filtro: str, modo: str) -> str:
+        separador = ",\n                "
+        colunas = self.colunas
+        if modo in ("pagina", "apos"):
+            # A chave vai no fim das colunas para montar o cursor da próxima página
+            colunas = colunas + tuple(expressao for expressao, _ in self.chave)
+        sql = f"""
+            SELECT
+                {separador.join(colunas)}
+            FROM
+                {self.view}
+            WHERE {self.condicao or '1=1'}"""
+        if self.coluna_data:
+            sql += f" AND {self.coluna_data} >= ? AND {self.coluna_data} <= ?"
+        sql += filtro
+        if modo == "apos":
+            # Limite simples na primeira coluna da chave, para o otimizador usar o índice
+            sql += f" AND {self.chave[0][0]} <= ? AND {self._apos_chave()}"
+        if self.agrupar:
+            sql += f"""
+            GROUP BY
+                {separador.join(self.agrupar)}"""
+        if modo == "total":
+            return f"SELECT COUNT(*) FROM ({sql}\n        ) total"
+        if modo in ("pagina", "apos"):
+            sql += f"""
+            ORDER BY
+                {separador.join(f"{expressao} DESC" for expressao, _ in self.chave)}
+            ROWS ?"""
+        elif self.ordem:
+            sql += f"""
+            ORDER BY
+                {self.ordem}"""
+        return sql + "\n        "
+
+    def _formato(self, filtro: str, modo: str = "") -> str:
+        sql = self._sql.get((filtro, modo))
+        if sql is None:
+            sql = self._compilar(filtro, modo)
+            self._sql[(filtro, modo)] = sql
+            if len(self._sql) > BI_FILTRO_MAX_FORMATOS:
+                self._sql.popitem(last=False)
+        else:
+            self._sql.move_to_end((filtro, modo))
+        return sql
+
+    def _params(self, params_filtros: list, data_inicio, data_fim, params_condicao) -> list:
+        params = list(params_condicao)
+        if self.coluna_data:
+            params.extend([data_inicio, data_fim])
+        params.extend(params_filtros)
+        return params
+
+    def montar(self, consulta: FiltrosBI, data_inicio=None, data_fim=None, params_condicao: list = ()):
+        """SQL e parâmetros da consulta para os filtros recebidos"""
+        filtro, params_filtros = filtros_codigo(consulta, self.filtros)
+        return self._formato(filtro), self._params(params_filtros, data_inicio, data_fim, params_condicao)
+
+    def montar_pagina(self, consulta: FiltrosBI, limite: int, apos: list = None,
+                      data_inicio=None, data_fim=None, params_condicao: list = ()):
+        """
+        SQL e parâmetros de uma página de até `limite` linhas depois da chave `apos`
+        (None para a primeira). Pede uma linha a mais para saber se há próxima página.
+        """
+        filtro, params_filtros = filtros_codigo(consulta, self.filtros)
+        params = self._params(params_filtros, data_inicio, data_fim, params_condicao)
+        if apos is None:
+            return self._formato(filtro, "pagina"), params + [limite + 1]
+        params.append(apos[0])
+        for i, valor in enumerate(apos):
+            params.extend([valor] if i == len(apos) - 1 else [valor, valor])
+        return self._formato(filtro, "apos"), params + [limite + 1]
+
+    def montar_total(self, consulta: FiltrosBI, data_inicio=None, data_fim=None, params_condicao: list = ()):
+        """SQL e parâmetros da contagem de linhas da consulta"""
+        filtro, params_filtros = filtros_codigo(consulta, self.filtros)
+        return self._formato(filtro, "total"), self._params(params_filtros, data_inicio, data_fim, params_condicao)
+
+    def assinatura(self, consulta: FiltrosBI) -> str:
+        """
+        Identifica a consulta (view e filtros como o cliente os enviou) a que um cursor
+        pertence. O período resolvido a partir de hoje fica de fora: um cursor emitido
+        antes da meia-noite continua valendo na página seguinte.
+        """
+        texto = json.dumps([self.view, canonizar_filtros(consulta)])
+        return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
+
+    def codificar_cursor(self, row, assinatura: str) -> str:
+        """Cursor opaco da página seguinte à linha `row` (a chave está nas últimas colunas)"""
+        valores = [None if valor is None else str(valor) if tipo == "data" else valor
+                   for (_, tipo), valor in zip(self.chave, row[-len(self.chave):])]
+        texto = json.dumps({"a": assinatura, "k": valores}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decodificar_cursor(self, cursor: str, assinatura: str) -> list:
+        """Chave da última linha vista; rejeita cursores de outra consulta ou adulterados"""
+        try:
+            texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+            dados = json.loads(texto)
+            valores = [TIPOS_CHAVE[tipo](valor) for (_, tipo), valor in zip(self.chave, dados["k"])]
+        except Exception:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+        if dados.get("a") != assinatura or len(valores) != len(self.chave):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Cursor não corresponde aos filtros da consulta")
+        return valores
+
+
+# Consultas dos endpoints de uma só view (os demais combinam ramos com filtros_ramo)
+CONSULTAS_BI = {
+    "kpi_cliente": ConsultaBI(
+        "VWFACTRC_BI",
+        colunas=("codcliente", "cliente", "SUM(vlrrecbto)"),
+        filtros=("codfilial", "codcliente", "regiao", "codpro"),
+        coluna_data="datarecbto",
+        agrupar=("codcliente", "cliente"),
+        ordem="SUM(vlrrecbto) DESC",
+    ),
+    "kpi_produto": ConsultaBI(
+        "VWFACTRC_BI",
+        colunas=("codpro", "produto", "SUM(vlrrecbto)"),
+        filtros=("codfilial", "codcliente", "regiao", "codpro"),
+        coluna_data="datarecbto",
+        agrupar=("codpro", "produto"),
+        ordem="SUM(vlrrecbto) DESC",
+    ),
+    "tabela_faturamento": ConsultaBI(
+        "VWFACTRC_BI",
+        colunas=("nrofatura", "anofatura", "datarecbto", "vlrrecbto", "filial", "cliente", "cidade", "coduf", "produto"),
+        filtros=("codfilial", "codcliente", "regiao", "codpro"),
+        coluna_data="datarecbto",
+        # Fatura identificada por filial, ano e número
+        chave=(("datarecbto", "data"), ("anofatura", "inteiro"), ("nrofatura", "inteiro"), ("codfilial", "inteiro")),
+    ),
+    # 'A Receber' no período de vencimento mais tudo 'Em Atraso' (conjuntos disjuntos)
+    "a_receber_cliente": ConsultaBI(
+        "VWFACTRC_BI",
+        colunas=("codcliente", "cliente", "SUM(vlrsaldo)"),
+        filtros=("codfilial", "codcliente"),
+        condicao=(f"(({CONDICOES_FATURA[('VWFACTRC_BI', 'A Receber')]} AND datavencto >= ? AND datavencto <= ?)"
+                  f" OR ({CONDICOES_FATURA[('VWFACTRC_BI', 'Em Atraso')]}))"),
+        agrupar=("codcliente", "cliente"),
+        ordem="SUM(vlrsaldo) DESC",
+    ),
+    # Agrupadas pelas mesmas expressões da chave (nulos como ''): um grupo nulo e um grupo ''
+    # teriam o mesmo cursor e a página seguinte pularia ou repetiria um deles. As colunas
+    # devolvem '' como nulo, como antes.
+    "tabela_a_receber": ConsultaBI(
+        "VWFACTRC_BI",
+        colunas=("datavencto", "NULLIF(COALESCE(cliente, ''), '')", "NULLIF(COALESCE(cidade, ''), '')",
+                 "NULLIF(COALESCE(coduf, ''), '')", "NULLIF(COALESCE(produto, ''), '')", "SUM(vlrsaldo)",
+                 "NULLIF(COALESCE(conta, ''), '')"),
+        filtros=("codfilial", "codcliente"),
+        coluna_data="datavencto",
+        agrupar=("datavencto", "COALESCE(cliente, '')", "COALESCE(cidade, '')", "COALESCE(coduf, '')",
+                 "COALESCE(produto, '')", "COALESCE(conta, '')"),
+        ordem="datavencto DESC",
+        chave=(("datavencto", "data"), ("COALESCE(cliente, '')", "texto"), ("COALESCE(cidade, '')", "texto"),
+               ("COALESCE(coduf, '')", "texto"), ("COALESCE(produto, '')", "texto"), ("COALESCE(conta, '')", "texto")),
+    ),
+    # 'A Pagar' no período de vencimento mais tudo 'Em Atraso' (conjuntos disjuntos)
+    "a_pagar_fornecedor": ConsultaBI(
+        "VWCPTIT_BI",
+        colunas=("codfornecedor", "fornecedor", "SUM(vlrsaldo)"),
+        filtros=("codfornecedor", "codtransacao"),
+        condicao=(f"(({CONDICOES_FATURA[('VWCPTIT_BI', 'A Pagar')]} AND datavencto >= ? AND datavencto <= ?)"
+                  f" OR ({CONDICOES_FATURA[('VWCPTIT_BI', 'Em Atraso')]}))"),
+        agrupar=("codfornecedor", "fornecedor"),
+        ordem="SUM(vlrsaldo) DESC",
+    ),
+    "tabela_a_pagar": ConsultaBI(
+        "VWCPTIT_BI",
+        colunas=("datavencto", "NULLIF(COALESCE(fornecedor, ''), '')", "NULLIF(COALESCE(transacao, ''), '')",
+                 "SUM(vlrsaldo)", "NULLIF(COALESCE(conta, ''), '')"),
+        filtros=("codfornecedor", "codtransacao"),
+        coluna_data="datavencto",
+        agrupar=("datavencto", "COALESCE(fornecedor, '')", "COALESCE(transacao, '')", "COALESCE(conta, '')"),
+        ordem="datavencto DESC",
+        chave=(("datavencto", "data"), ("COALESCE(fornecedor, '')", "texto"),
+               ("COALESCE(transacao, '')", "texto"), ("COALESCE(conta, '')", "texto")),
+    ),
+}
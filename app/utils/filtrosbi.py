@@ -0,0 +1,333 @@
+from app.schemas.BIschemas import FiltrosBI
+from collections import OrderedDict
+from datetime import date, timedelta
+from dotenv import load_dotenv
+import json
+import os
+
+load_dotenv()
+
+# Máximo de intervalos de datas gerados a partir de ano/mês/dia; acima disso o
+# filtro usa o intervalo dos anos e completa com as colunas derivadas (EXTRACT)
+BI_FILTRO_MAX_INTERVALOS = int(os.getenv("BI_FILTRO_MAX_INTERVALOS", "31"))
+# Formatos de filtro (campos presentes e tamanho de cada IN) com o SQL compilado guardado
+BI_FILTRO_MAX_FORMATOS = int(os.getenv("BI_FILTRO_MAX_FORMATOS", "1024"))
+# Listas de códigos a partir deste tamanho são carregadas na tabela temporária
+# BI_FILTRO_LISTA (migração V005) em vez de virar IN (?, ?, ...); 0 desliga.
+# BI_FILTRO_LISTA_<CAMPO> (ex.: BI_FILTRO_LISTA_CODCLIENTE) ajusta por filtro
+BI_FILTRO_LISTA_LIMITE = int(os.getenv("BI_FILTRO_LISTA_LIMITE", "256"))
+
+
+def canonizar_filtros(consulta: FiltrosBI) -> str:
+    """
+    Representação canônica dos filtros, usada como chave de coalescência/cache:
+    valores únicos viram listas, listas são ordenadas e sem repetição
+    (o resultado de um IN não depende da ordem) e filtros vazios são ignorados.
+    """
+    if consulta is None:
+        return ""
+    filtros = {}
+    for campo, valor in consulta.model_dump(exclude_none=True).items():
+        if isinstance(valor, list):
+            if not valor:
+                continue
+            valor = sorted(set(valor), key=str)
+        elif campo not in ("data_inicio", "data_fim"):
+            valor = [valor]
+        filtros[campo] = valor
+    return json.dumps(filtros, sort_keys=True, default=str, separators=(",", ":"))
+
+
+def inicio_mes(dia: date, deslocamento: int = 0) -> date:
+    """Primeiro dia do mês de `dia`, deslocado em `deslocamento` meses"""
+    meses = dia.year * 12 + dia.month - 1 + deslocamento
+    return date(meses // 12, meses % 12 + 1, 1)
+
+
+# condicao_fatura das views VWFACTRC_BI e VWCPTIT_BI reescrita sobre as colunas base.
+# Na view ela é calculada por linha com CURRENT_TIMESTAMP (nenhum índice serve); aqui a
+# data de referência vira parâmetro ("vencido" = vence antes do dia seguinte à referência).
+# O ramo ELSE do CASE de cada view ('A Receber' em VWFACTRC_BI, 'Em Atraso' em VWCPTIT_BI)
+# também recebe os títulos com saldo nulo ou negativo e os sem vencimento: os predicados
+# incluem esses casos, que os índices de VLRSALDO e de DATAVENCTO (V001, V006) atendem.
+CONDICOES_FATURA = {
+    ("VWFACTRC_BI", "Em Atraso"): "(vlrsaldo > 0 AND datavencto < ?)",
+    ("VWFACTRC_BI", "A Receber"): ("(vlrsaldo > 0 AND (datavencto >= ? OR datavencto IS NULL)"
+                                   " OR vlrsaldo < 0 OR vlrsaldo IS NULL)"),
+    ("VWCPTIT_BI", "Em Atraso"): ("(vlrsaldo > 0 AND (datavencto < ? OR datavencto IS NULL)"
+                                  " OR vlrsaldo < 0 OR vlrsaldo IS NULL)"),
+    ("VWCPTIT_BI", "A Pagar"): "(vlrsaldo > 0 AND datavencto >= ?)",
+}
+
+
+def condicao_fatura(view: str, condicao: str, referencia: date = None):
+    """
+    Predicado indexável equivalente a `condicao_fatura = condicao` na data de referência
+    (hoje por padrão): retorna (sql, params)
+    """
+    referencia = referencia or date.today()
+    return CONDICOES_FATURA[(view, condicao)], [referencia + timedelta(days=1)]
+
+
+# Expressão SQL usada no IN de cada filtro por código de FiltrosBI
+COLUNAS_FILTRO = {
+    "codfilial": "codfilial",
+    "codcliente": "codcliente",
+    "codcid": "codcid",
+    "codpro": "codpro",
+    "codfornecedor": "codfornecedor",
+    "codtransacao": "codtransacao",
+}
+
+# Coluna da BI_FILTRO_LISTA comparada com cada filtro (códigos numéricos ou texto)
+COLUNAS_LISTA = {
+    "codfilial": "NUMERO",
+    "codcliente": "TEXTO",
+    "codcid": "NUMERO",
+    "codpro": "NUMERO",
+    "codfornecedor": "TEXTO",
+    "codtransacao": "NUMERO",
+}
+
+LIMITES_LISTA = {
+    campo: int(os.getenv(f"BI_FILTRO_LISTA_{campo.upper()}", str(BI_FILTRO_LISTA_LIMITE)))
+    for campo in COLUNAS_FILTRO
+}
+
+
+class ListaFiltro:
+    """
+    Parâmetro de uma lista grande de códigos: antes da consulta o executor a carrega
+    na BI_FILTRO_LISTA (na mesma transação) e a troca pelo número do lote
+    """
+    __slots__ = ("coluna", "valores")
+
+    def __init__(self, coluna: str, valores: list):
+        self.coluna = coluna
+        self.valores = valores
+
+
+# Região de cada UF (espelha a tabela BI_UF_REGIAO da migração V002). UFs fora dela ficam
+# na região "Outros"; documentos sem cidade têm regiao nula e não entram em nenhum filtro de região
+REGIAO_UF = {
+    "SP": "Sudeste", "RJ": "Sudeste", "MG": "Sudeste", "ES": "Sudeste",
+    "PR": "Sul", "SC": "Sul", "RS": "Sul",
+    "MS": "Centro-Oeste", "MT": "Centro-Oeste", "GO": "Centro-Oeste", "DF": "Centro-Oeste",
+    "RO": "Norte", "AC": "Norte", "AM": "Norte", "RR": "Norte", "PA": "Norte", "TO": "Norte", "AP": "Norte",
+    "MA": "Nordeste", "PI": "Nordeste", "CE": "Nordeste", "RN": "Nordeste", "PB": "Nordeste",
+    "PE": "Nordeste", "AL": "Nordeste", "SE": "Nordeste", "BA": "Nordeste",
+}
+REGIAO_OUTROS = "Outros"
+
+# Coluna de data base e colunas derivadas (ano, mês, dia) de cada view de fatos
+RAMO_FACTRC = ("datarecbto", ("ano_recbto", "mes_numero", "dia_recbto"))
+RAMO_FRCTRC = ("dataemissao", ("ano_emissao", "mes_numero", "dia_emissao"))
+
+
+def intervalos_datas(anos, meses=None, dias=None, limite: int = BI_FILTRO_MAX_INTERVALOS):
+    """
+    Converte os conjuntos de ano/mês/dia em intervalos semiabertos [inicio, fim)
+    de datas, unindo os contíguos (ex.: meses 1, 2 e 3 viram um único intervalo).
+    Retorna None sem ano (não há como limitar as datas) ou acima de `limite` intervalos.
+    Combinações inexistentes (ex.: 31/02) são ignoradas.
+    """
+    if not anos:
+        return None
+    intervalos = []
+    for ano in sorted(set(anos)):
+        if not 1 <= ano < 9999:
+            continue
+        if not meses and not dias:
+            intervalos.append((date(ano, 1, 1), date(ano + 1, 1, 1)))
+            continue
+        for mes in sorted(set(meses or range(1, 13))):
+            if not 1 <= mes <= 12:
+                continue
+            inicio = date(ano, mes, 1)
+            if not dias:
+                intervalos.append((inicio, inicio_mes(inicio, 1)))
+                continue
+            for dia in sorted(set(dias)):
+                try:
+                    data = date(ano, mes, dia)
+                except ValueError:
+                    continue
+                intervalos.append((data, data + timedelta(days=1)))
+
+    unidos = []
+    for inicio, fim in intervalos:
+        if unidos and unidos[-1][1] == inicio:
+            unidos[-1] = (unidos[-1][0], fim)
+        else:
+            unidos.append((inicio, fim))
+    if len(unidos) > limite:
+        return None
+    return unidos
+
+
+def filtro_periodo(coluna_data: str, anos, meses=None, dias=None,
+                   colunas_derivadas: tuple = ("ano", "mes_numero", "dia")):
+    """
+    Trecho SQL (" AND ...") e parâmetros equivalentes a `ano IN / mes IN / dia IN`,
+    expressos como intervalos sobre a coluna de data base (usa o índice da data).
+    Sem ano, ou com intervalos demais, recorre às colunas derivadas
+    (ano, mês, dia) para a parte que não virou intervalo.
+    """
+    sql = ""
+    params = []
+    intervalos = intervalos_datas(anos, meses, dias)
+    derivados = []
+    if intervalos is None:
+        intervalos = intervalos_datas(anos, limite=len(anos)) if anos else None
+        derivados = [(colunas_derivadas[1], meses), (colunas_derivadas[2], dias)]
+
+    if intervalos is not None:
+        if not intervalos:
+            return " AND 1=0", []
+        sql += " AND (" + " OR ".join(
+            f"({coluna_data} >= ? AND {coluna_data} < ?)" for _ in intervalos
+        ) + ")"
+        for inicio, fim in intervalos:
+            params.extend([inicio, fim])
+
+    for coluna, valores in derivados:
+        if valores:
+            placeholders = ', '.join(['?'] * len(valores))
+            sql += f" AND {coluna} IN ({placeholders})"
+            params.extend(valores)
+    return sql, params
+
+
+def filtros_ramo(consulta: FiltrosBI, campos: tuple, ramo: tuple, data_inicio=None, data_fim=None, data_limite=None):
+    """
+    Trecho SQL (" AND ...") e parâmetros com os filtros de um ramo de UNION ALL,
+    aplicados direto na view com a coluna de data do próprio ramo: período
+    [data_inicio, data_fim] (ou [data_inicio, data_limite) ), filtros por código
+    listados em `campos` e ano/mês/dia.
+    """
+    coluna_data, colunas_derivadas = ramo
+    sql = ""
+    params = []
+    if data_inicio is not None:
+        sql += f" AND {coluna_data} >= ?"
+        params.append(data_inicio)
+    if data_fim is not None:
+        sql += f" AND {coluna_data} <= ?"
+        params.append(data_fim)
+    if data_limite is not None:
+        sql += f" AND {coluna_data} < ?"
+        params.append(data_limite)
+
+    filtro_codigos, params_codigos = filtros_codigo(consulta, campos)
+    sql += filtro_codigos
+    params.extend(params_codigos)
+
+    filtro_datas, params_datas = filtro_periodo(
+        coluna_data,
+        _lista(consulta.ano),
+        _lista(consulta.mes),
+        _lista(consulta.dia),
+        colunas_derivadas,
+    )
+    return sql + filtro_datas, params + params_datas
+
+
+# SQL compilado por formato: (campos, formato) -> trecho SQL
+_formatos = OrderedDict()
+_stats_formatos = {"acertos": 0, "compilacoes": 0}
+
+REGIOES = frozenset(REGIAO_UF.values()) | {REGIAO_OUTROS}
+
+
+def _tamanho_in(quantidade: int) -> int:
+    """Tamanho do IN arredondado para a próxima potência de 2 (menos formatos distintos)"""
+    return 1 << (quantidade - 1).bit_length()
+
+
+def filtros_codigo(consulta: FiltrosBI, campos: tuple):
+    """
+    Trecho SQL (" AND ...") e parâmetros dos filtros por código listados em `campos`
+    (e da região). O SQL depende só do formato dos filtros: quais vieram e quantos
+    itens há em cada IN (completado repetindo o último valor, o que não muda o
+    resultado; listas grandes vão para a BI_FILTRO_LISTA). Cada formato é compilado
+    uma vez e o texto é reaproveitado, então o mesmo formato gera sempre o mesmo SQL.
+    """
+    formato = []
+    params = []
+    for campo in campos:
+        valores = _lista(getattr(consulta, campo)) if consulta is not None else None
+        if campo == "regiao":
+            # Só as regiões conhecidas mudam o filtro; sem nenhuma, nada é retornado
+            regioes = tuple(sorted(REGIOES.intersection(valores))) if valores else None
+            formato.append(regioes)
+            if regioes:
+                params.extend(filtro_regiao(regioes)[1])
+        elif valores and 0 < LIMITES_LISTA[campo] <= len(valores):
+            formato.append("lista")
+            params.append(ListaFiltro(COLUNAS_LISTA[campo], valores))
+        elif valores:
+            tamanho = _tamanho_in(len(valores))
+            formato.append(tamanho)
+            params.extend(valores)
+            params.extend([valores[-1]] * (tamanho - len(valores)))
+        else:
+            formato.append(0)
+
+    chave = (tuple(campos), tuple(formato))
+    sql = _formatos.get(chave)
+    if sql is not None:
+        _formatos.move_to_end(chave)
+        _stats_formatos["acertos"] += 1
+        return sql, params
+
+    sql = ""
+    for campo, item in zip(campos, formato):
+        if campo == "regiao":
+            if item == ():
+                sql += " AND 1=0"
+            elif item:
+                sql += filtro_regiao(item)[0]
+        elif item == "lista":
+            sql += f" AND {COLUNAS_FILTRO[campo]} IN (SELECT {COLUNAS_LISTA[campo]} FROM BI_FILTRO_LISTA WHERE LOTE = ?)"
+        elif item:
+            sql += f" AND {COLUNAS_FILTRO[campo]} IN ({', '.join(['?'] * item)})"
+    _stats_formatos["compilacoes"] += 1
+    _formatos[chave] = sql
+    if len(_formatos) > BI_FILTRO_MAX_FORMATOS:
+        _formatos.popitem(last=False)
+    return sql, params
+
+
+def stats_filtros() -> dict:
+    stats = dict(_stats_formatos)
+    stats["formatos"] = len(_formatos)
+    return stats
+
+
+def filtro_regiao(regioes, coluna_cidade: str = "codcid_regiao"):
+    """
+    Trecho SQL (" AND ...") e parâmetros do filtro de região, aplicado à coluna de
+    cidade do próprio fato (codcid_regiao, com índice; migração V008) com as cidades
+    da região. As UFs são resolvidas para as cidades pelo coduf IN (índice da TBCID);
+    só "Outros", que não corresponde a um conjunto fixo de UFs, vai pela regiao.
+    """
+    if not regioes:
+        return "", []
+    condicoes = []
+    params = []
+    ufs = sorted(uf for uf, regiao in REGIAO_UF.items() if regiao in regioes)
+    if ufs:
+        condicoes.append(f"coduf IN ({', '.join(['?'] * len(ufs))})")
+        params.extend(ufs)
+    if REGIAO_OUTROS in regioes:
+        condicoes.append("regiao = ?")
+        params.append(REGIAO_OUTROS)
+    if not condicoes:
+        return " AND 1=0", []
+    return f" AND {coluna_cidade} IN (SELECT codcid FROM vwtbcid_bi WHERE {' OR '.join(condicoes)})", params
+
+
+def _lista(valor):
+    if valor is None or isinstance(valor, list):
+        return valor
+    return [valor]
@@ -0,0 +1,118 @@
+from fastapi.responses import Response
+from decimal import Decimal
+from dotenv import load_dotenv
+from app.utils.cachebi import resultado_antigo
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+load_dotenv()
+
+# Respostas do BI codificadas direto em bytes, sem a nova validação pelo response_model
+# (os dados já saem das consultas no formato dos schemas)
+BI_RESPOSTA_RAPIDA = os.getenv("BI_RESPOSTA_RAPIDA", "0") == "1"
+
+# Formato colunar dos endpoints que respondem {chave: dados} (pedido pelo cabeçalho Accept):
+# {"colunas": [chaves..., campos...], "valores": [[coluna 1], [coluna 2], ...]}
+MEDIA_TYPE_COLUNAR = "application/vnd.softcenter.bi.colunar+json"
+
+
+def _padrao(valor):
+    """Tipos que o codificador JSON não conhece"""
+    # Atributos de classe do pydantic: bem mais baratos que isinstance a cada modelo
+    if getattr(valor, "__pydantic_root_model__", False):
+        return valor.root
+    if hasattr(valor, "__pydantic_fields__"):
+        # Schemas do BI só têm campos simples: os valores já validados na criação do modelo
+        return valor.__dict__
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def codificar_json(valor) -> bytes:
+    """JSON em bytes com orjson; sem ele, com o json da biblioteca padrão"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(valor, default=_padrao)
+        except TypeError:
+            # Chaves não texto (ex.: dia do mês como int): opção mais lenta, só quando necessária
+            return orjson.dumps(valor, default=_padrao, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(valor, default=_padrao, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _linhas(valor: dict, chaves: tuple = ()) -> list:
+    """{chave: modelo} (ou aninhado por mais chaves) como linhas (chaves..., campos...)"""
+    linhas = []
+    for chave, item in valor.items():
+        if hasattr(item, "__pydantic_fields__"):
+            linhas.append(chaves + (chave,) + tuple(item.__dict__.values()))
+        else:
+            linhas.extend(_linhas(item, chaves + (chave,)))
+    return linhas
+
+
+def _campos(valor: dict) -> list:
+    for item in valor.values():
+        if hasattr(item, "__pydantic_fields__"):
+            return list(item.__dict__)
+        campos = _campos(item)
+        if campos:
+            return campos
+    return []
+
+
+def colunar(valor: dict, chaves: tuple) -> dict:
+    """
+    Resultado {chave: modelo} em colunas paralelas: os nomes dos campos aparecem uma vez
+    só, e não a cada linha. `chaves` nomeia os níveis de chave (ex.: ("ano", "mes_numero")).
+    """
+    colunas = list(chaves) + _campos(valor)
+    valores = [list(coluna) for coluna in zip(*_linhas(valor))] or [[] for _ in colunas]
+    return {"colunas": colunas, "valores": valores}
+
+
+def pede_colunar(request) -> bool:
+    return request is not None and MEDIA_TYPE_COLUNAR in request.headers.get("accept", "")
+
+
+def cabecalhos_resultado_antigo() -> dict:
+    """Cabeçalhos que marcam um resultado antigo servido porque o Firebird do tenant falhou"""
+    idade = resultado_antigo.get()
+    if idade is None:
+        return {}
+    return {"Age": str(idade), "Warning": '111 - "Revalidation Failed"'}
+
+
+class RespostaBI(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return codificar_json(content)
+
+
+def resposta_bi(valor, request=None, chaves: tuple = None, response: Response = None):
+    """
+    Resultado de um endpoint do BI: já codificado quando BI_RESPOSTA_RAPIDA está ligado.
+    Endpoints {chave: dados} informam `chaves` e atendem também ao formato colunar; as duas
+    representações levam Vary: Accept (no JSON validado pelo response_model, pelo `response`
+    injetado no endpoint).
+    Resultados antigos (servidos por falha do Firebird) são sempre codificados aqui, para
+    levar os cabeçalhos Age e Warning.
+    """
+    cabecalhos = cabecalhos_resultado_antigo()
+    if chaves:
+        cabecalhos["Vary"] = "Accept"
+        if pede_colunar(request):
+            return RespostaBI(colunar(valor, chaves), media_type=MEDIA_TYPE_COLUNAR, headers=cabecalhos)
+    if BI_RESPOSTA_RAPIDA or "Age" in cabecalhos:
+        return RespostaBI(valor, headers=cabecalhos or None)
+    if chaves and response is not None:
+        response.headers["Vary"] = "Accept"
+    return valor
@@ -0,0 +1,40 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalescência de requisições: chamadas simultâneas com a mesma chave aguardam
+    uma única execução em andamento e compartilham o seu resultado (ou erro).
+    """
+
+    def __init__(self):
+        self._em_andamento = {}
+        self._execucoes = 0
+        self._compartilhadas = 0
+
+    async def executar(self, chave, funcao):
+        """Executa `funcao()` ou aguarda a execução já em andamento para `chave`"""
+        futuro = self._em_andamento.get(chave)
+        if futuro is None:
+            self._execucoes += 1
+            futuro = asyncio.ensure_future(funcao())
+            self._em_andamento[chave] = futuro
+            futuro.add_done_callback(lambda f: self._finalizar(chave, f))
+        else:
+            self._compartilhadas += 1
+        # O shield mantém a execução viva se a requisição que a iniciou for cancelada
+        return await asyncio.shield(futuro)
+
+    def _finalizar(self, chave, futuro):
+        if self._em_andamento.get(chave) is futuro:
+            del self._em_andamento[chave]
+        # Marca a exceção como tratada mesmo que todos os interessados tenham desistido
+        if not futuro.cancelled():
+            futuro.exception()
+
+    def stats(self) -> dict:
+        return {
+            "em_andamento": len(self._em_andamento),
+            "execucoes": self._execucoes,
+            "compartilhadas": self._compartilhadas,
+        }
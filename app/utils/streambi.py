@@ -0,0 +1,123 @@
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from dotenv import load_dotenv
+from app.utils.respostabi import codificar_json
+from app.utils.arrowbi import FORMATOS_ARROW, BI_EXPORTACAO_LOTE, CodificadorArrow, verificar_arrow
+import asyncio
+import csv
+import io
+import os
+
+load_dotenv()
+
+# Linhas lidas do Firebird por vez (fetchmany) nas respostas em streaming
+BI_STREAM_LOTE = int(os.getenv("BI_STREAM_LOTE", "1000"))
+
+# Formatos de streaming aceitos (parâmetro "formato" ou cabeçalho Accept) e seus media types
+FORMATOS_STREAM = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    **FORMATOS_ARROW,
+}
+EXTENSOES_STREAM = {"ndjson": "ndjson", "csv": "csv", "arrow": "arrows", "parquet": "parquet"}
+MEDIA_TYPES_STREAM = {media_type.split(";")[0]: formato for formato, media_type in FORMATOS_STREAM.items()}
+
+
+def formato_stream(request: Request, formato: str = None, endpoint: str = None):
+    """
+    Formato de streaming pedido: o parâmetro tem precedência sobre o Accept.
+    None (ou formato=json) mantém a resposta JSON completa de sempre.
+    """
+    if formato:
+        formato = formato.lower()
+        if formato == "json":
+            return None
+        if formato not in FORMATOS_STREAM:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Formato inválido: use json, {', '.join(FORMATOS_STREAM)}")
+    else:
+        for aceito in request.headers.get("accept", "").split(","):
+            formato = MEDIA_TYPES_STREAM.get(aceito.split(";")[0].strip().lower())
+            if formato:
+                break
+    if formato in FORMATOS_ARROW:
+        verificar_arrow(formato, endpoint)
+    return formato
+
+
+def tamanho_lote(formato: str) -> int:
+    """Linhas por fetchmany: Arrow/Parquet usam lotes maiores (um record batch / row group cada)"""
+    return BI_EXPORTACAO_LOTE if formato in FORMATOS_ARROW else BI_STREAM_LOTE
+
+
+def _ndjson(dados: list, cabecalho: bool) -> bytes:
+    return b"".join(codificar_json(linha) + b"\n" for linha in dados)
+
+
+def _csv(dados: list, cabecalho: bool) -> bytes:
+    saida = io.StringIO()
+    escritor = csv.writer(saida, lineterminator="\n")
+    if cabecalho:
+        escritor.writerow(dados[0].keys())
+    for linha in dados:
+        escritor.writerow("" if valor is None else valor for valor in linha.values())
+    return saida.getvalue().encode("utf-8")
+
+
+CODIFICADORES = {"ndjson": _ndjson, "csv": _csv}
+
+
+class CodificadorTexto:
+    """Codifica os lotes como NDJSON ou CSV a partir das linhas convertidas em dict"""
+
+    def __init__(self, formato: str, converter):
+        self.codificar = CODIFICADORES[formato]
+        self.converter = converter
+        self.cabecalho = True
+
+    def lote(self, rows: list) -> bytes:
+        dados = self.codificar([self.converter(row) for row in rows], self.cabecalho)
+        self.cabecalho = False
+        return dados
+
+    def fim(self) -> bytes:
+        return b""
+
+
+async def resposta_stream(lotes, converter, formato: str, nome: str) -> StreamingResponse:
+    """
+    StreamingResponse com as linhas de `lotes` (gerador assíncrono de lotes do Firebird)
+    codificadas lote a lote: a memória fica limitada a um lote. NDJSON e CSV usam as
+    linhas convertidas por `converter`; Arrow e Parquet, as colunas de COLUNAS_ARROW[nome].
+    O primeiro lote é lido antes de responder, para que "sem dados" e falhas de conexão
+    ainda voltem como erro HTTP.
+    """
+    try:
+        primeiro = await lotes.__anext__()
+    except StopAsyncIteration:
+        await lotes.aclose()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Nenhum dado encontrado")
+    except BaseException:
+        await lotes.aclose()
+        raise
+
+    if formato in FORMATOS_ARROW:
+        codificador = CodificadorArrow(formato, nome)
+    else:
+        codificador = CodificadorTexto(formato, converter)
+
+    async def corpo():
+        try:
+            yield codificador.lote(primeiro)
+            async for lote in lotes:
+                yield codificador.lote(lote)
+            yield codificador.fim()
+        finally:
+            # Cliente desconectado no meio: devolve a conexão ao pool mesmo com a tarefa cancelada
+            await asyncio.shield(lotes.aclose())
+
+    return StreamingResponse(
+        corpo(),
+        media_type=FORMATOS_STREAM[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome}.{EXTENSOES_STREAM[formato]}"'},
+    )
@@ -11,24 +11,12 @@ SELECT
 	cid.cidade,
 	cid.coduf,
 	cid.regiao,
+	f.codcidpagto AS codcid_regiao,
 	f.codpro,
 	p.nome AS produto,
 	f.datavencto,
 	f.datarecbto,
-		CASE
-		WHEN EXTRACT(MONTH FROM f.datarecbto) = 1 THEN 'Janeiro'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 2 THEN 'Fevereiro'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 3 THEN 'Março'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 4 THEN 'Abril'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 5 THEN 'Maio'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 6 THEN 'Junho'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 7 THEN 'Julho'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 8 THEN 'Agosto'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 9 THEN 'Setembro'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 10 THEN 'Outubro'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 11 THEN 'Novembro'
-		WHEN EXTRACT(MONTH FROM f.datarecbto)= 12 THEN 'Dezembro'
-	END AS mes_recbto,
+	m.nome AS mes_recbto,
 	EXTRACT(MONTH FROM f.datarecbto) mes_numero,
 	EXTRACT(YEAR FROM f.datarecbto) ano_recbto,
 	EXTRACT(DAY FROM f.datarecbto) dia_recbto,
@@ -52,4 +40,5 @@ LEFT JOIN tbfil t ON t.codfil = f.codfilfatur
 LEFT JOIN tbcli c ON c.cgccpfcli = f.cgccpffatura
 LEFT JOIN vwtbcid_bi cid ON cid.codcid = f.codcidpagto
 LEFT JOIN tbpro p ON p.codpro = f.codpro
-LEFT JOIN tbcta cta ON cta.contareduz = f.contareduz
\ No newline at end of file
+LEFT JOIN tbcta cta ON cta.contareduz = f.contareduz
+LEFT JOIN bi_mes m ON m.mes_numero = EXTRACT(MONTH FROM f.datarecbto)
\ No newline at end of file
@@ -4,20 +4,7 @@ SELECT
 	f.nroctrc,
 	f.ufctrc,
 	f.dataemissao,
-	CASE
-		WHEN EXTRACT(MONTH FROM f.dataemissao) = 1 THEN 'Janeiro'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 2 THEN 'Fevereiro'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 3 THEN 'Março'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 4 THEN 'Abril'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 5 THEN 'Maio'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 6 THEN 'Junho'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 7 THEN 'Julho'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 8 THEN 'Agosto'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 9 THEN 'Setembro'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 10 THEN 'Outubro'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 11 THEN 'Novembro'
-		WHEN EXTRACT(MONTH FROM f.dataemissao)= 12 THEN 'Dezembro'
-	END AS mes_emissao,
+	m.nome AS mes_emissao,
 	EXTRACT(YEAR FROM f.dataemissao) ano_emissao,
 	EXTRACT(MONTH FROM f.dataemissao) mes_numero,
 	EXTRACT(DAY FROM f.dataemissao) dia_emissao,
@@ -29,6 +16,7 @@ SELECT
 	f.cgccpfdestina codcliente,
 	f.codciddes AS codcid,
 	cid.regiao,
+	f.codciddes AS codcid_regiao,
 	cid.cidade,
 	cid.coduf,
 	f.codpro,
@@ -48,5 +36,6 @@ FROM
 LEFT JOIN tbfil t ON t.codfil = f.codfilemite
 LEFT JOIN tbcli c ON f.cgccpfdestina = c.cgccpfcli
 LEFT JOIN vwtbcid_bi cid ON cid.codcid = f.codciddes
+LEFT JOIN bi_mes m ON m.mes_numero = EXTRACT(MONTH FROM f.dataemissao)
 WHERE
 	f.situacao IN ('N', 'F')
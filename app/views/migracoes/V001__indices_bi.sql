@@ -0,0 +1,37 @@
+-- Índices para os padrões de acesso do BI (views VWFACTRC_BI, VWFRCTRC_BI e VWCPTIT_BI).
+-- Aplicar com: python -m app.cli.migracaobi aplicar <ipbd> <portabd> <caminhobd>
+-- Índices já existentes (mesmo nome) são ignorados.
+
+-- FACTRC: períodos de recebimento e vencimento
+CREATE INDEX IDX_BI_FACTRC_DATARECBTO ON FACTRC (DATARECBTO);
+CREATE INDEX IDX_BI_FACTRC_VENCTO_SALDO ON FACTRC (DATAVENCTO, VLRSALDO);
+
+-- FACTRC: filtros por código combinados com o período de recebimento
+CREATE INDEX IDX_BI_FACTRC_FILIAL_RECBTO ON FACTRC (CODFILFATUR, DATARECBTO);
+CREATE INDEX IDX_BI_FACTRC_CLIENTE_RECBTO ON FACTRC (CGCCPFFATURA, DATARECBTO);
+CREATE INDEX IDX_BI_FACTRC_CIDADE ON FACTRC (CODCIDDES);
+CREATE INDEX IDX_BI_FACTRC_PRODUTO ON FACTRC (CODPRO);
+
+-- FACTRC: mês derivado (usado quando o filtro de mês vem sem ano)
+CREATE INDEX IDX_BI_FACTRC_MES_RECBTO ON FACTRC COMPUTED BY (EXTRACT(MONTH FROM DATARECBTO));
+
+-- FRCTRC: situação ('N', 'F') e período de emissão
+CREATE INDEX IDX_BI_FRCTRC_SITUACAO_EMISSAO ON FRCTRC (SITUACAO, DATAEMISSAO);
+CREATE INDEX IDX_BI_FRCTRC_EMISSAO ON FRCTRC (DATAEMISSAO);
+
+-- FRCTRC: filtros por código combinados com o período de emissão
+CREATE INDEX IDX_BI_FRCTRC_FILIAL_EMISSAO ON FRCTRC (CODFILEMITE, DATAEMISSAO);
+CREATE INDEX IDX_BI_FRCTRC_CLIENTE_EMISSAO ON FRCTRC (CGCCPFDESTINA, DATAEMISSAO);
+CREATE INDEX IDX_BI_FRCTRC_CIDADE ON FRCTRC (CODCIDDES);
+CREATE INDEX IDX_BI_FRCTRC_PRODUTO ON FRCTRC (CODPRO);
+
+-- FRCTRC: mês derivado (usado quando o filtro de mês vem sem ano)
+CREATE INDEX IDX_BI_FRCTRC_MES_EMISSAO ON FRCTRC COMPUTED BY (EXTRACT(MONTH FROM DATAEMISSAO));
+
+-- CPTIT: períodos de vencimento e movimento
+CREATE INDEX IDX_BI_CPTIT_DATAVENCTO ON CPTIT (DATAVENCTO);
+CREATE INDEX IDX_BI_CPTIT_DATAMOVTO ON CPTIT (DATAMOVTO);
+
+-- CPTIT: filtros por fornecedor e transação
+CREATE INDEX IDX_BI_CPTIT_FORNECEDOR ON CPTIT (CGCCPFFORNE);
+CREATE INDEX IDX_BI_CPTIT_TRANSACAO ON CPTIT (CODTRANSACAO);
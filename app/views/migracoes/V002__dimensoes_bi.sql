@@ -0,0 +1,155 @@
+-- Dimensões do BI: região por UF e nome do mês, no lugar das cadeias de CASE das views.
+-- A região "Outros" (UF fora da tabela) vem do COALESCE na VWTBCID_BI; documentos sem
+-- cidade não casam no LEFT JOIN das views de fatos e ficam com regiao nula.
+-- Manter BI_UF_REGIAO em sincronia com REGIAO_UF (app/utils/filtrosbi.py).
+
+CREATE TABLE BI_UF_REGIAO (
+    CODUF CHAR(2) NOT NULL PRIMARY KEY,
+    REGIAO VARCHAR(20) NOT NULL
+);
+
+CREATE TABLE BI_MES (
+    MES_NUMERO SMALLINT NOT NULL PRIMARY KEY,
+    NOME VARCHAR(20) NOT NULL
+);
+
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('SP', 'Sudeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('RJ', 'Sudeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('MG', 'Sudeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('ES', 'Sudeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('PR', 'Sul') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('SC', 'Sul') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('RS', 'Sul') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('MS', 'Centro-Oeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('MT', 'Centro-Oeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('GO', 'Centro-Oeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('DF', 'Centro-Oeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('RO', 'Norte') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('AC', 'Norte') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('AM', 'Norte') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('RR', 'Norte') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('PA', 'Norte') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('TO', 'Norte') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('AP', 'Norte') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('MA', 'Nordeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('PI', 'Nordeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('CE', 'Nordeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('RN', 'Nordeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('PB', 'Nordeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('PE', 'Nordeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('AL', 'Nordeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('SE', 'Nordeste') MATCHING (CODUF);
+UPDATE OR INSERT INTO BI_UF_REGIAO (CODUF, REGIAO) VALUES ('BA', 'Nordeste') MATCHING (CODUF);
+
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (1, 'Janeiro') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (2, 'Fevereiro') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (3, 'Março') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (4, 'Abril') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (5, 'Maio') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (6, 'Junho') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (7, 'Julho') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (8, 'Agosto') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (9, 'Setembro') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (10, 'Outubro') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (11, 'Novembro') MATCHING (MES_NUMERO);
+UPDATE OR INSERT INTO BI_MES (MES_NUMERO, NOME) VALUES (12, 'Dezembro') MATCHING (MES_NUMERO);
+
+-- O filtro de região chega ao SQL como coduf IN (...)
+CREATE INDEX IDX_BI_TBCID_CODUF ON TBCID (CODUF);
+
+-- Views reescritas com as dimensões (mesmo conteúdo de app/views/*.sql). CREATE OR ALTER
+-- troca a definição sem apagar a view: se um comando falhar, a anterior continua valendo.
+
+CREATE OR ALTER VIEW VWTBCID_BI AS
+SELECT
+	c.codcid,
+	c.nome AS cidade,
+	c.coduf,
+	c.nome || '-' || c.coduf AS cidade_uf,
+	COALESCE(r.regiao, 'Outros') AS regiao
+FROM
+	tbcid c
+LEFT JOIN bi_uf_regiao r ON r.coduf = c.coduf;
+
+CREATE OR ALTER VIEW VWFACTRC_BI AS
+SELECT
+	f.nrofatura,
+	f.anofatura,
+	c.nomefantasia cliente,
+	f.cgccpffatura codcliente,
+	t.nome filial,
+	f.codfilfatur codfilial,
+	f.codciddes AS codcid,
+	cid.cidade,
+	cid.coduf,
+	cid.regiao,
+	f.codpro,
+	p.nome AS produto,
+	f.datavencto,
+	f.datarecbto,
+	m.nome AS mes_recbto,
+	EXTRACT(MONTH FROM f.datarecbto) mes_numero,
+	EXTRACT(YEAR FROM f.datarecbto) ano_recbto,
+	EXTRACT(DAY FROM f.datarecbto) dia_recbto,
+	EXTRACT(DAY FROM f.datavencto) dia_vencto,
+	EXTRACT(MONTH FROM f.datavencto) mes_numero_vencto,
+	EXTRACT(YEAR FROM f.datavencto) ano_vencto,
+	f.datarecbto - f.dataemissao AS dias_recebimento,
+	f.vlrrecbto,
+	f.vlrsaldo,
+	CASE
+		WHEN CAST(f.datavencto AS TIMESTAMP) < CURRENT_TIMESTAMP
+		AND f.vlrsaldo > 0 THEN 'Em Atraso'
+		WHEN f.vlrsaldo = 0 THEN 'Recebida'
+		ELSE 'A Receber'
+	END AS condicao_fatura,
+	f.contareduz,
+	cta.nomeconta AS conta
+FROM
+	factrc f
+LEFT JOIN tbfil t ON t.codfil = f.codfilfatur
+LEFT JOIN tbcli c ON c.cgccpfcli = f.cgccpffatura
+LEFT JOIN vwtbcid_bi cid ON cid.codcid = f.codcidpagto
+LEFT JOIN tbpro p ON p.codpro = f.codpro
+LEFT JOIN tbcta cta ON cta.contareduz = f.contareduz
+LEFT JOIN bi_mes m ON m.mes_numero = EXTRACT(MONTH FROM f.datarecbto);
+
+CREATE OR ALTER VIEW VWFRCTRC_BI AS
+SELECT
+	f.nroctrc,
+	f.ufctrc,
+	f.dataemissao,
+	m.nome AS mes_emissao,
+	EXTRACT(YEAR FROM f.dataemissao) ano_emissao,
+	EXTRACT(MONTH FROM f.dataemissao) mes_numero,
+	EXTRACT(DAY FROM f.dataemissao) dia_emissao,
+	f.situacao,
+	f.indctetpcte,
+	t.nome filial,
+	f.codfilemite codfilial,
+	c.nomefantasia cliente,
+	f.cgccpfdestina codcliente,
+	f.codciddes AS codcid,
+	cid.regiao,
+	cid.cidade,
+	cid.coduf,
+	f.codpro,
+	f.totalpeso / 1000.0 AS pesofrete_ton,
+	f.vlrpedagio,
+	f.vlrcarreto + f.vlrseguromerca + f.vlrpis + f.vlriapas + f.vlricmsst + f.vlricms AS vlrcusto,
+	CASE
+		WHEN f.indctetpcte = 0 THEN 1
+		ELSE 0
+	END AS embarque,
+	CASE
+		WHEN f.situacao = 'F' THEN 1
+		ELSE 0
+	END AS faturado
+FROM
+	frctrc f
+LEFT JOIN tbfil t ON t.codfil = f.codfilemite
+LEFT JOIN tbcli c ON f.cgccpfdestina = c.cgccpfcli
+LEFT JOIN vwtbcid_bi cid ON cid.codcid = f.codciddes
+LEFT JOIN bi_mes m ON m.mes_numero = EXTRACT(MONTH FROM f.dataemissao)
+WHERE
+	f.situacao IN ('N', 'F');
@@ -0,0 +1,52 @@
+-- Resumos diários dos fatos do BI, mantidos pela API (app/db/resumobi.py, BI_RESUMO_ATIVO=1).
+-- A cada atualização são refeitos os dias recentes e os dias com linhas gravadas na origem
+-- desde a marca d'água; BI_RESUMO_CONTROLE guarda, por resumo, a marca (OAT no início da
+-- última atualização), o menor dia recalculado e quando houve a última reconciliação completa.
+
+-- VWFACTRC_BI por data de recebimento
+CREATE TABLE BI_RESUMO_FACTRC_DIA (
+    DATA DATE NOT NULL,
+    CODFILIAL INTEGER,
+    CODCLIENTE VARCHAR(20),
+    CODCID INTEGER,
+    CIDADE VARCHAR(60),
+    CODUF CHAR(2),
+    REGIAO VARCHAR(20),
+    CODPRO INTEGER,
+    SITUACAO CHAR(1),
+    VLRRECBTO NUMERIC(18, 2),
+    VLRSALDO NUMERIC(18, 2),
+    QTDE INTEGER
+);
+
+-- VWFRCTRC_BI por data de emissão
+CREATE TABLE BI_RESUMO_FRCTRC_DIA (
+    DATA DATE NOT NULL,
+    CODFILIAL INTEGER,
+    CODCLIENTE VARCHAR(20),
+    CODCID INTEGER,
+    CIDADE VARCHAR(60),
+    CODUF CHAR(2),
+    REGIAO VARCHAR(20),
+    CODPRO INTEGER,
+    SITUACAO CHAR(1),
+    VLRCUSTO NUMERIC(18, 2),
+    VLRPEDAGIO NUMERIC(18, 2),
+    PESOFRETE_TON NUMERIC(18, 4),
+    EMBARQUE INTEGER,
+    FATURADO INTEGER,
+    QTDE INTEGER
+);
+
+CREATE TABLE BI_RESUMO_CONTROLE (
+    TABELA VARCHAR(31) NOT NULL PRIMARY KEY,
+    RECALCULADO_DESDE DATE,
+    ATUALIZADO_EM TIMESTAMP,
+    MARCA_TRANSACAO BIGINT,
+    RECONCILIADO_EM TIMESTAMP
+);
+
+CREATE INDEX IDX_BI_RESUMO_FACTRC_DATA ON BI_RESUMO_FACTRC_DIA (DATA);
+CREATE INDEX IDX_BI_RESUMO_FACTRC_FILIAL ON BI_RESUMO_FACTRC_DIA (CODFILIAL, DATA);
+CREATE INDEX IDX_BI_RESUMO_FRCTRC_DATA ON BI_RESUMO_FRCTRC_DIA (DATA);
+CREATE INDEX IDX_BI_RESUMO_FRCTRC_FILIAL ON BI_RESUMO_FRCTRC_DIA (CODFILIAL, DATA);
@@ -0,0 +1,9 @@
+-- requer: Firebird 5.0
+-- Índices parciais dos títulos em aberto (a CLI mantém a migração pendente em servidores anteriores).
+-- Atendem aos predicados de condicao_fatura reescritos em app/utils/filtrosbi.py
+-- no ramo vlrsaldo > 0 AND datavencto < / >= data de referência: contêm apenas os títulos
+-- com saldo, então "em atraso" e "a receber/a pagar" deixam de varrer o histórico
+-- (os ramos de saldo nulo ou negativo usam os índices de VLRSALDO da V006).
+
+CREATE INDEX IDX_BI_FACTRC_ABERTOS ON FACTRC (DATAVENCTO) WHERE VLRSALDO > 0;
+CREATE INDEX IDX_BI_CPTIT_ABERTOS ON CPTIT (DATAVENCTO) WHERE VLRSALDO > 0;
@@ -0,0 +1,13 @@
+-- Tabela temporária das listas grandes de filtro do BI (app/utils/filtrosbi.py, BI_FILTRO_LISTA_LIMITE).
+-- A API carrega os códigos selecionados em um lote e a consulta usa
+-- "codigo IN (SELECT ... FROM BI_FILTRO_LISTA WHERE LOTE = ?)" no lugar de um IN com milhares de parâmetros.
+-- As linhas pertencem à transação que as inseriu e são apagadas ao final dela.
+
+CREATE GLOBAL TEMPORARY TABLE BI_FILTRO_LISTA (
+    LOTE INTEGER NOT NULL,
+    TEXTO VARCHAR(40),
+    NUMERO BIGINT
+) ON COMMIT DELETE ROWS;
+
+CREATE INDEX IDX_BI_FILTRO_LISTA_TEXTO ON BI_FILTRO_LISTA (LOTE, TEXTO);
+CREATE INDEX IDX_BI_FILTRO_LISTA_NUMERO ON BI_FILTRO_LISTA (LOTE, NUMERO);
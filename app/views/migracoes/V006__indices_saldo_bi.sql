@@ -0,0 +1,7 @@
+-- Índices de VLRSALDO para os ramos "saldo nulo ou negativo" de condicao_fatura
+-- (app/utils/filtrosbi.py): 'A Receber' em VWFACTRC_BI e 'Em Atraso' em VWCPTIT_BI
+-- incluem esses títulos, como o ELSE do CASE das views. São poucas linhas, lidas pelo
+-- índice em vez de uma varredura da tabela.
+
+CREATE INDEX IDX_BI_FACTRC_SALDO ON FACTRC (VLRSALDO);
+CREATE INDEX IDX_BI_CPTIT_SALDO ON CPTIT (VLRSALDO);
@@ -0,0 +1,13 @@
+-- Índices descendentes para as páginas por keyset dos tabela_* (app/utils/consultabi.py),
+-- que ordenam pela chave em ordem decrescente ("ORDER BY ... DESC ROWS ?"). Os índices
+-- ascendentes da V001 não servem para essa ordem: sem estes, o Firebird ordena a janela
+-- restante a cada página.
+
+-- tabela_faturamento: a chave inteira (datarecbto, anofatura, nrofatura, codfilial); o índice
+-- é percorrido a partir do cursor e a leitura para nas linhas da página
+CREATE DESCENDING INDEX IDX_BI_FACTRC_PAGINA ON FACTRC (DATARECBTO, ANOFATURA, NROFATURA, CODFILFATUR);
+
+-- tabela_a_receber e tabela_a_pagar: agrupadas, começam pelo vencimento; o índice leva a
+-- leitura do cursor para trás sem passar pelos vencimentos já paginados
+CREATE DESCENDING INDEX IDX_BI_FACTRC_VENCTO_DESC ON FACTRC (DATAVENCTO);
+CREATE DESCENDING INDEX IDX_BI_CPTIT_VENCTO_DESC ON CPTIT (DATAVENCTO);
@@ -0,0 +1,115 @@
+-- Filtro de região pela cidade da própria tabela de fatos (app/utils/filtrosbi.py): a região
+-- vem da cidade do LEFT JOIN com a VWTBCID_BI, e um filtro nas colunas da cidade (coduf,
+-- regiao) não é usado para ler o fato. As views passam a expor codcid_regiao, a coluna do
+-- fato que leva à cidade da região (CODCIDPAGTO na FACTRC, CODCIDDES na FRCTRC), e o filtro
+-- vira codcid_regiao IN (SELECT codcid FROM vwtbcid_bi WHERE ...): as UFs são resolvidas
+-- para os códigos de cidade pelo IDX_BI_TBCID_CODUF e os códigos, pelo índice do fato.
+
+-- A FRCTRC já tem IDX_BI_FRCTRC_CIDADE (CODCIDDES) da V001
+CREATE INDEX IDX_BI_FACTRC_CIDADE_PAGTO ON FACTRC (CODCIDPAGTO);
+
+-- Views com codcid_regiao (mesmo conteúdo de app/views/*.sql)
+
+CREATE OR ALTER VIEW VWFACTRC_BI AS
+SELECT
+	f.nrofatura,
+	f.anofatura,
+	c.nomefantasia cliente,
+	f.cgccpffatura codcliente,
+	t.nome filial,
+	f.codfilfatur codfilial,
+	f.codciddes AS codcid,
+	cid.cidade,
+	cid.coduf,
+	cid.regiao,
+	f.codcidpagto AS codcid_regiao,
+	f.codpro,
+	p.nome AS produto,
+	f.datavencto,
+	f.datarecbto,
+	m.nome AS mes_recbto,
+	EXTRACT(MONTH FROM f.datarecbto) mes_numero,
+	EXTRACT(YEAR FROM f.datarecbto) ano_recbto,
+	EXTRACT(DAY FROM f.datarecbto) dia_recbto,
+	EXTRACT(DAY FROM f.datavencto) dia_vencto,
+	EXTRACT(MONTH FROM f.datavencto) mes_numero_vencto,
+	EXTRACT(YEAR FROM f.datavencto) ano_vencto,
+	f.datarecbto - f.dataemissao AS dias_recebimento,
+	f.vlrrecbto,
+	f.vlrsaldo,
+	CASE
+		WHEN CAST(f.datavencto AS TIMESTAMP) < CURRENT_TIMESTAMP
+		AND f.vlrsaldo > 0 THEN 'Em Atraso'
+		WHEN f.vlrsaldo = 0 THEN 'Recebida'
+		ELSE 'A Receber'
+	END AS condicao_fatura,
+	f.contareduz,
+	cta.nomeconta AS conta
+FROM
+	factrc f
+LEFT JOIN tbfil t ON t.codfil = f.codfilfatur
+LEFT JOIN tbcli c ON c.cgccpfcli = f.cgccpffatura
+LEFT JOIN vwtbcid_bi cid ON cid.codcid = f.codcidpagto
+LEFT JOIN tbpro p ON p.codpro = f.codpro
+LEFT JOIN tbcta cta ON cta.contareduz = f.contareduz
+LEFT JOIN bi_mes m ON m.mes_numero = EXTRACT(MONTH FROM f.datarecbto);
+
+CREATE OR ALTER VIEW VWFRCTRC_BI AS
+SELECT
+	f.nroctrc,
+	f.ufctrc,
+	f.dataemissao,
+	m.nome AS mes_emissao,
+	EXTRACT(YEAR FROM f.dataemissao) ano_emissao,
+	EXTRACT(MONTH FROM f.dataemissao) mes_numero,
+	EXTRACT(DAY FROM f.dataemissao) dia_emissao,
+	f.situacao,
+	f.indctetpcte,
+	t.nome filial,
+	f.codfilemite codfilial,
+	c.nomefantasia cliente,
+	f.cgccpfdestina codcliente,
+	f.codciddes AS codcid,
+	cid.regiao,
+	f.codciddes AS codcid_regiao,
+	cid.cidade,
+	cid.coduf,
+	f.codpro,
+	f.totalpeso / 1000.0 AS pesofrete_ton,
+	f.vlrpedagio,
+	f.vlrcarreto + f.vlrseguromerca + f.vlrpis + f.vlriapas + f.vlricmsst + f.vlricms AS vlrcusto,
+	CASE
+		WHEN f.indctetpcte = 0 THEN 1
+		ELSE 0
+	END AS embarque,
+	CASE
+		WHEN f.situacao = 'F' THEN 1
+		ELSE 0
+	END AS faturado
+FROM
+	frctrc f
+LEFT JOIN tbfil t ON t.codfil = f.codfilemite
+LEFT JOIN tbcli c ON f.cgccpfdestina = c.cgccpfcli
+LEFT JOIN vwtbcid_bi cid ON cid.codcid = f.codciddes
+LEFT JOIN bi_mes m ON m.mes_numero = EXTRACT(MONTH FROM f.dataemissao)
+WHERE
+	f.situacao IN ('N', 'F');
+
+-- Os resumos guardam a mesma coluna. O ALTER só roda se a coluna ainda não existe, para a
+-- migração poder ser reaplicada depois de uma falha no meio.
+SET TERM ^ ;
+
+EXECUTE BLOCK AS
+BEGIN
+	IF (NOT EXISTS (SELECT 1 FROM RDB$RELATION_FIELDS
+			WHERE RDB$RELATION_NAME = 'BI_RESUMO_FACTRC_DIA' AND RDB$FIELD_NAME = 'CODCID_REGIAO')) THEN
+		EXECUTE STATEMENT 'ALTER TABLE BI_RESUMO_FACTRC_DIA ADD CODCID_REGIAO INTEGER';
+	IF (NOT EXISTS (SELECT 1 FROM RDB$RELATION_FIELDS
+			WHERE RDB$RELATION_NAME = 'BI_RESUMO_FRCTRC_DIA' AND RDB$FIELD_NAME = 'CODCID_REGIAO')) THEN
+		EXECUTE STATEMENT 'ALTER TABLE BI_RESUMO_FRCTRC_DIA ADD CODCID_REGIAO INTEGER';
+END^
+
+SET TERM ; ^
+
+-- As linhas já gravadas ficam com a coluna nula: a próxima atualização refaz os resumos inteiros
+UPDATE BI_RESUMO_CONTROLE SET RECONCILIADO_EM = NULL;
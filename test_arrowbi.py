@@ -0,0 +1,58 @@
+"""
+Testes da exportação Arrow IPC / Parquet (app/utils/arrowbi.py)
+"""
+
+from datetime import date
+from decimal import Decimal
+import io
+
+import pytest
+from fastapi import HTTPException
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from app.utils.arrowbi import CodificadorArrow, COLUNAS_ARROW, verificar_arrow
+
+# Linhas como o driver entrega as do SELECT de tabela_a_pagar
+LOTES = [
+    [(date(2024, 5, 10), "FORNECEDOR A", "COMPRA", Decimal("10.50"), "1.1"),
+     (date(2024, 5, 9), "FORNECEDOR B", "COMPRA", None, None)],
+    [(date(2024, 5, 8), "FORNECEDOR A", "FRETE", Decimal("3"), "1.2")],
+]
+
+
+def _codificar(formato: str) -> bytes:
+    codificador = CodificadorArrow(formato, "tabela_a_pagar")
+    partes = [codificador.lote(lote) for lote in LOTES]
+    # Cada lote sai codificado na hora, sem esperar o fim do stream
+    assert all(partes)
+    return b"".join(partes) + codificador.fim()
+
+
+def test_stream_arrow_um_record_batch_por_lote():
+    leitor = pa.ipc.open_stream(_codificar("arrow"))
+    lotes = list(leitor)
+    assert [lote.num_rows for lote in lotes] == [2, 1]
+    tabela = pa.Table.from_batches(lotes)
+    assert tabela.column_names == [nome for nome, _ in COLUNAS_ARROW["tabela_a_pagar"]]
+    assert tabela.schema.field("datavencto").type == pa.date32()
+    assert pa.types.is_dictionary(tabela.schema.field("fornecedor").type)
+    assert tabela.column("a_pagar").to_pylist() == [10.5, 0.0, 3.0]
+    assert tabela.column("conta").to_pylist() == ["1.1", None, "1.2"]
+    assert tabela.column("datavencto").to_pylist() == [date(2024, 5, 10), date(2024, 5, 9), date(2024, 5, 8)]
+
+
+def test_parquet_um_row_group_por_lote():
+    arquivo = pq.ParquetFile(io.BytesIO(_codificar("parquet")))
+    assert arquivo.num_row_groups == 2
+    tabela = arquivo.read()
+    assert tabela.num_rows == 3
+    assert tabela.column("fornecedor").to_pylist() == ["FORNECEDOR A", "FORNECEDOR B", "FORNECEDOR A"]
+
+
+def test_verificar_arrow_endpoint_sem_colunas():
+    with pytest.raises(HTTPException) as erro:
+        verificar_arrow("arrow", "kpi_cliente")
+    assert erro.value.status_code == 400
+    verificar_arrow("parquet", "tabela_faturamento")
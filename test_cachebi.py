@@ -0,0 +1,217 @@
+"""
+Testes do cache de resultados BI (app/utils/cachebi.py): TTL, stale-while-revalidate,
+stale-if-error, marca d'água e expulsão LRU
+"""
+
+import asyncio
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils import cachebi
+from app.utils.cachebi import (CacheBI, estimar_tamanho, resultado_antigo, BI_CACHE_STALE_WHILE_REVALIDATE,
+                               BI_CACHE_STALE_IF_ERROR, BI_CACHE_TTL_VALIDADO)
+
+
+class Relogio:
+    """Substitui o módulo time do cache: o tempo só anda quando o teste manda"""
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self) -> float:
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(cachebi, "time", relogio)
+    return relogio
+
+
+class Origem:
+    """Consulta ao Firebird de mentira: conta as chamadas e pode falhar"""
+
+    def __init__(self, valor="v1"):
+        self.valor = valor
+        self.chamadas = 0
+        self.erro = None
+
+    async def __call__(self):
+        self.chamadas += 1
+        if self.erro is not None:
+            raise self.erro
+        return self.valor
+
+
+def _obter(cache, origem, endpoint="big_numbers", chave=(1, "big_numbers"), marca=None, recente=False):
+    return asyncio.run(cache.obter(chave, endpoint, origem, marca, recente))
+
+
+def test_resultado_atual_dentro_do_ttl(relogio):
+    cache, origem = CacheBI(), Origem()
+    assert _obter(cache, origem) == "v1"
+    relogio.agora += 59
+    origem.valor = "v2"
+    assert _obter(cache, origem) == "v1"
+    assert origem.chamadas == 1
+    assert cache.stats()["acertos"] == 1
+
+
+def test_ttl_por_endpoint(relogio):
+    cache, origem = CacheBI(), Origem()
+    _obter(cache, origem, "filtro_filial", (1, "filtro_filial"))
+    relogio.agora += 3599
+    assert cache.buscar((1, "filtro_filial")) == "v1"
+    relogio.agora += 1
+    assert cache.buscar((1, "filtro_filial")) is None
+
+
+def test_endpoint_com_ttl_zero_nao_e_guardado(relogio):
+    cache, origem = CacheBI(), Origem()
+    _obter(cache, origem, "tabela_faturamento", (1, "tabela_faturamento"))
+    _obter(cache, origem, "tabela_faturamento", (1, "tabela_faturamento"))
+    assert origem.chamadas == 2
+    assert cache.stats()["entradas"] == 0
+
+
+def test_antigo_servido_enquanto_revalida(relogio):
+    """Depois do TTL, dentro da janela SWR: devolve o antigo e recalcula em segundo plano"""
+    cache, origem = CacheBI(), Origem()
+
+    async def cenario():
+        await cache.obter((1, "big_numbers"), "big_numbers", origem)
+        relogio.agora += 60 + BI_CACHE_STALE_WHILE_REVALIDATE / 2
+        origem.valor = "v2"
+        antigo = await cache.obter((1, "big_numbers"), "big_numbers", origem)
+        # Uma segunda requisição durante a revalidação não dispara outra
+        await cache.obter((1, "big_numbers"), "big_numbers", origem)
+        await asyncio.gather(*cache._revalidando.values())
+        return antigo, await cache.obter((1, "big_numbers"), "big_numbers", origem)
+
+    antigo, novo = asyncio.run(cenario())
+    assert (antigo, novo) == ("v1", "v2")
+    assert origem.chamadas == 2
+    assert cache.stats()["antigos_revalidando"] == 2
+    assert cache.stats()["revalidacoes"] == 1
+
+
+def test_depois_da_janela_swr_recalcula_na_hora(relogio):
+    cache, origem = CacheBI(), Origem()
+    _obter(cache, origem)
+    relogio.agora += 60 + BI_CACHE_STALE_WHILE_REVALIDATE
+    origem.valor = "v2"
+    assert _obter(cache, origem) == "v2"
+
+
+def test_antigo_servido_quando_o_firebird_falha(relogio):
+    cache, origem = CacheBI(), Origem()
+    _obter(cache, origem)
+    relogio.agora += 60 + BI_CACHE_STALE_WHILE_REVALIDATE
+    origem.erro = HTTPException(status_code=503, detail="Firebird indisponível")
+
+    async def cenario():
+        valor = await cache.obter((1, "big_numbers"), "big_numbers", origem)
+        return valor, resultado_antigo.get()
+
+    valor, idade = asyncio.run(cenario())
+    assert valor == "v1"
+    assert idade == int(60 + BI_CACHE_STALE_WHILE_REVALIDATE)
+    assert cache.stats()["antigos_por_erro"] == 1
+
+
+def test_erro_do_cliente_nao_serve_antigo(relogio):
+    cache, origem = CacheBI(), Origem()
+    _obter(cache, origem)
+    relogio.agora += 60 + BI_CACHE_STALE_WHILE_REVALIDATE
+    origem.erro = HTTPException(status_code=400, detail="Filtro inválido")
+    with pytest.raises(HTTPException):
+        _obter(cache, origem)
+
+
+def test_erro_depois_da_janela_stale_if_error_propaga(relogio):
+    cache, origem = CacheBI(), Origem()
+    _obter(cache, origem)
+    relogio.agora += 60 + BI_CACHE_STALE_IF_ERROR
+    origem.erro = RuntimeError("Firebird indisponível")
+    with pytest.raises(RuntimeError):
+        _obter(cache, origem)
+
+
+def test_marca_igual_estende_o_ttl(relogio):
+    cache, origem = CacheBI(), Origem()
+    _obter(cache, origem, marca="m1", recente=True)
+    relogio.agora += BI_CACHE_TTL_VALIDADO - 1
+    assert _obter(cache, origem, marca="m1", recente=True) == "v1"
+    assert origem.chamadas == 1
+    assert cache.stats()["acertos_validados"] == 1
+
+
+def test_periodo_fora_da_janela_da_sonda_fica_com_o_ttl(relogio):
+    """A marca só vigia os meses recentes: períodos mais antigos não ganham o TTL validado"""
+    cache, origem = CacheBI(), Origem()
+    _obter(cache, origem, marca="m1")
+    relogio.agora += 60 + BI_CACHE_STALE_WHILE_REVALIDATE
+    origem.valor = "v2"
+    assert _obter(cache, origem, marca="m1") == "v2"
+    assert cache.stats()["acertos_validados"] == 0
+
+
+def test_marca_nova_recalcula_dentro_do_ttl(relogio):
+    cache, origem = CacheBI(), Origem()
+    _obter(cache, origem, marca="m1")
+    origem.valor = "v2"
+    assert _obter(cache, origem, marca="m2") == "v2"
+    assert cache.stats()["invalidadas_marca"] == 1
+
+
+def test_endpoint_de_saldo_nao_estende_o_ttl_pela_marca(relogio):
+    cache, origem = CacheBI(), Origem()
+    chave = (1, "big_numbers_contas_receber")
+    _obter(cache, origem, "big_numbers_contas_receber", chave, marca="m1", recente=True)
+    relogio.agora += 60 + BI_CACHE_STALE_WHILE_REVALIDATE
+    origem.valor = "v2"
+    assert _obter(cache, origem, "big_numbers_contas_receber", chave, marca="m1", recente=True) == "v2"
+
+
+def test_expulsao_lru_pelo_orcamento(relogio):
+    valor = "x" * 100
+    cache = CacheBI(max_bytes=estimar_tamanho(valor) * 2)
+    cache.guardar((1, "a"), "big_numbers", valor)
+    cache.guardar((1, "b"), "big_numbers", valor)
+    # O acesso a "a" faz de "b" a menos usada recentemente
+    assert cache.buscar((1, "a")) == valor
+    cache.guardar((1, "c"), "big_numbers", valor)
+    assert cache.buscar((1, "b")) is None
+    assert cache.buscar((1, "a")) == valor
+    assert cache.buscar((1, "c")) == valor
+    assert cache.stats()["expulsoes"] == 1
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_valor_maior_que_o_orcamento_nao_e_guardado(relogio):
+    cache = CacheBI(max_bytes=10)
+    cache.guardar((1, "a"), "big_numbers", "x" * 100)
+    assert cache.stats()["entradas"] == 0
+
+
+def test_invalidar_tenant(relogio):
+    cache = CacheBI()
+    cache.guardar((1, "a"), "big_numbers", "v")
+    cache.guardar((1, "b"), "big_numbers", "v")
+    cache.guardar((2, "a"), "big_numbers", "v")
+    cache.invalidar_tenant(1)
+    assert cache.stats()["entradas"] == 1
+    assert cache.buscar((2, "a")) == "v"
+
+
+def test_estimar_tamanho_de_listas_grandes_pela_amostra():
+    """Listas longas são medidas pela amostra, com o mesmo resultado para itens iguais"""
+    linha = {"cliente": "CLIENTE", "total": 10.0}
+    pequena = [linha] * cachebi.BI_CACHE_AMOSTRA
+    grande = [linha] * cachebi.BI_CACHE_AMOSTRA * 10
+    itens_pequena = estimar_tamanho(pequena) - sys.getsizeof(pequena)
+    itens_grande = estimar_tamanho(grande) - sys.getsizeof(grande)
+    assert itens_grande == itens_pequena * 10
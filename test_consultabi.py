@@ -0,0 +1,170 @@
+"""
+Testes do montador de consultas do BI (app/utils/consultabi.py)
+"""
+
+from datetime import date
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.BIschemas import FiltrosBI
+from app.utils.consultabi import ConsultaBI, CONSULTAS_BI
+
+
+def _consulta(**kwargs):
+    return ConsultaBI(
+        "VWFACTRC_BI",
+        colunas=("codcliente", "cliente", "SUM(vlrrecbto)"),
+        filtros=("codfilial", "codcliente"),
+        coluna_data="datarecbto",
+        agrupar=("codcliente", "cliente"),
+        ordem="SUM(vlrrecbto) DESC",
+        **kwargs,
+    )
+
+
+def test_montar_ordem_dos_parametros():
+    """Condição, período e filtros, nessa ordem"""
+    consulta = _consulta(condicao="vlrsaldo > ?")
+    sql, params = consulta.montar(FiltrosBI(codfilial=[1, 2, 3]), date(2024, 1, 1), date(2024, 1, 31), [0])
+    assert params == [0, date(2024, 1, 1), date(2024, 1, 31), 1, 2, 3, 3]
+    assert "WHERE vlrsaldo > ? AND datarecbto >= ? AND datarecbto <= ? AND codfilial IN (?, ?, ?, ?)" in sql
+    assert sql.count("?") == len(params)
+    assert "GROUP BY" in sql and sql.rstrip().endswith("SUM(vlrrecbto) DESC")
+
+
+def test_montar_reaproveita_o_sql_do_formato():
+    consulta = _consulta()
+    sql_a, _ = consulta.montar(FiltrosBI(codcliente=["1", "2", "3"]), date(2024, 1, 1), date(2024, 1, 31))
+    sql_b, params_b = consulta.montar(FiltrosBI(codcliente=["7", "8", "9", "10"]), date(2024, 2, 1), date(2024, 2, 29))
+    assert sql_a is sql_b
+    assert params_b == [date(2024, 2, 1), date(2024, 2, 29), "7", "8", "9", "10"]
+
+
+def test_montar_total_conta_as_linhas_agrupadas():
+    sql, params = _consulta().montar_total(FiltrosBI(), date(2024, 1, 1), date(2024, 1, 31))
+    assert sql.startswith("SELECT COUNT(*) FROM (")
+    assert "ORDER BY" not in sql
+    assert params == [date(2024, 1, 1), date(2024, 1, 31)]
+
+
+def test_consultas_bi_com_parametros_em_ordem():
+    """Todas as consultas registradas montam com tantos parâmetros quantos marcadores"""
+    for endpoint, consulta in CONSULTAS_BI.items():
+        condicao = [date(2024, 2, 1)] * (consulta.condicao or "").count("?")
+        sql, params = consulta.montar(FiltrosBI(), date(2024, 1, 1), date(2024, 1, 31), condicao)
+        assert sql.count("?") == len(params), endpoint
+
+
+def _paginada():
+    return ConsultaBI(
+        "VWFACTRC_BI",
+        colunas=("nrofatura", "datarecbto", "vlrrecbto"),
+        filtros=("codfilial",),
+        coluna_data="datarecbto",
+        chave=(("datarecbto", "data"), ("COALESCE(cliente, '')", "texto"), ("nrofatura", "inteiro")),
+    )
+
+
+def test_apos_chave_compara_a_tupla_em_ordem_decrescente():
+    assert _paginada()._apos_chave() == (
+        "(datarecbto < ? OR (datarecbto = ? AND "
+        "(COALESCE(cliente, '') < ? OR (COALESCE(cliente, '') = ? AND nrofatura < ?))))"
+    )
+
+
+def test_apos_chave_equivale_a_comparar_tuplas():
+    """Avaliado no SQLite: seleciona exatamente as chaves menores que a última vista"""
+    consulta = _paginada()
+    chaves = [(d, c, n) for d in ("2024-01-01", "2024-01-02") for c in ("", "A", "B") for n in (1, 2)]
+    apos = ["2024-01-02", "A", 1]
+    params = []
+    for i, valor in enumerate(apos):
+        params.extend([valor] if i == len(apos) - 1 else [valor, valor])
+    banco = sqlite3.connect(":memory:")
+    banco.execute("CREATE TABLE fatura (datarecbto TEXT, cliente TEXT, nrofatura INTEGER)")
+    banco.executemany("INSERT INTO fatura VALUES (?, ?, ?)", [(d, c or None, n) for d, c, n in chaves])
+    encontradas = banco.execute(f"SELECT datarecbto, COALESCE(cliente, ''), nrofatura FROM fatura "
+                                f"WHERE {consulta._apos_chave()}", params).fetchall()
+    assert sorted(encontradas) == sorted(chave for chave in chaves if chave < tuple(apos))
+
+
+def test_montar_pagina_seguinte():
+    consulta = _paginada()
+    apos = [date(2024, 1, 2), "A", 1]
+    sql, params = consulta.montar_pagina(FiltrosBI(codfilial=1), 100, apos, date(2024, 1, 1), date(2024, 1, 31))
+    assert params == [date(2024, 1, 1), date(2024, 1, 31), 1, date(2024, 1, 2),
+                      date(2024, 1, 2), date(2024, 1, 2), "A", "A", 1, 101]
+    assert sql.count("?") == len(params)
+    assert "datarecbto DESC" in sql and sql.rstrip().endswith("ROWS ?")
+    primeira, params_primeira = consulta.montar_pagina(FiltrosBI(codfilial=1), 100, None, date(2024, 1, 1), date(2024, 1, 31))
+    assert params_primeira[-1] == 101 and primeira.count("?") == len(params_primeira)
+
+
+def test_cursor_ida_e_volta():
+    consulta = _paginada()
+    assinatura = consulta.assinatura(FiltrosBI(codfilial=[2, 1]))
+    cursor = consulta.codificar_cursor((10, date(2024, 1, 5), 99.9, date(2024, 1, 5), "CLIENTE", 10), assinatura)
+    assert "=" not in cursor
+    assert consulta.decodificar_cursor(cursor, assinatura) == [date(2024, 1, 5), "CLIENTE", 10]
+
+
+def test_cursor_de_outra_consulta_e_recusado():
+    consulta = _paginada()
+    assinatura = consulta.assinatura(FiltrosBI(codfilial=1))
+    outra = consulta.assinatura(FiltrosBI(codfilial=2))
+    cursor = consulta.codificar_cursor((date(2024, 1, 5), "CLIENTE", 10), assinatura)
+    with pytest.raises(HTTPException) as erro:
+        consulta.decodificar_cursor(cursor, outra)
+    assert erro.value.status_code == 400
+
+
+def test_assinatura_pelos_filtros_enviados():
+    """Datas enviadas pelo cliente entram na assinatura; as resolvidas a partir de hoje, não"""
+    consulta = _paginada()
+    assert consulta.assinatura(FiltrosBI()) != consulta.assinatura(FiltrosBI(data_fim=date(2024, 1, 31)))
+    assert consulta.assinatura(FiltrosBI(data_fim=date(2024, 1, 31))) == consulta.assinatura(FiltrosBI(data_fim="2024-01-31"))
+
+
+def test_assinatura_ignora_ordem_dos_filtros():
+    consulta = _paginada()
+    assert (consulta.assinatura(FiltrosBI(codfilial=[1, 2]))
+            == consulta.assinatura(FiltrosBI(codfilial=[2, 1, 2])))
+
+
+@pytest.mark.parametrize("cursor", ["", "nao-e-base64!", "eyJhIjoxfQ", "W10"])
+def test_cursor_adulterado_e_recusado(cursor):
+    with pytest.raises(HTTPException) as erro:
+        _paginada().decodificar_cursor(cursor, "assinatura")
+    assert erro.value.status_code == 400
+
+
+def test_paginas_agrupadas_com_nulos_e_vazios():
+    """
+    Grupos nulos e '' caem no mesmo grupo da chave: percorrer as páginas de uma em uma
+    devolve cada grupo exatamente uma vez (SQLite, com LIMIT no lugar de ROWS)
+    """
+    consulta = CONSULTAS_BI["tabela_a_pagar"]
+    banco = sqlite3.connect(":memory:")
+    banco.execute("CREATE TABLE VWCPTIT_BI (datavencto TEXT, fornecedor TEXT, transacao TEXT, conta TEXT, "
+                  "vlrsaldo NUMERIC, codfornecedor TEXT, codtransacao INTEGER)")
+    linhas = [("2024-01-10", fornecedor, "COMPRA", conta, 1, "1", 1)
+              for fornecedor in (None, "", "A") for conta in (None, "", "X")]
+    banco.executemany("INSERT INTO VWCPTIT_BI VALUES (?, ?, ?, ?, ?, ?, ?)", linhas)
+
+    vistas, apos = [], None
+    assinatura = consulta.assinatura(FiltrosBI())
+    for _ in range(10):
+        sql, params = consulta.montar_pagina(FiltrosBI(), 1, apos, date(2024, 1, 1), date(2024, 1, 31))
+        sql = sql.replace("ROWS ?", "LIMIT ?")
+        rows = banco.execute(sql, [str(p) if isinstance(p, date) else p for p in params]).fetchall()
+        vistas.append(rows[0][:5])
+        if len(rows) == 1:
+            break
+        apos = consulta.decodificar_cursor(consulta.codificar_cursor(rows[0], assinatura), assinatura)
+        apos[0] = str(apos[0])
+    assert sorted(vistas, key=str) == sorted([
+        ("2024-01-10", None, "COMPRA", 4, None), ("2024-01-10", None, "COMPRA", 2, "X"),
+        ("2024-01-10", "A", "COMPRA", 2, None), ("2024-01-10", "A", "COMPRA", 1, "X"),
+    ], key=str)
@@ -0,0 +1,54 @@
+"""
+Testes do executor Firebird (app/db/executorfb.py), com cursor de mentira
+"""
+
+from app.db import executorfb
+from app.db.conexaofb import FirebirdPool
+from app.db.executorfb import FirebirdAsyncConnection
+from app.utils.filtrosbi import ListaFiltro
+
+
+class CursorFalso:
+    def __init__(self):
+        self.comandos = []
+
+    def execute(self, query, params):
+        self.comandos.append((query, params))
+
+
+class ConexaoFalsa:
+    def __init__(self):
+        self.cursor_falso = CursorFalso()
+
+    def cursor(self):
+        return self.cursor_falso
+
+
+def test_lista_grande_carregada_em_blocos_fixos(monkeypatch):
+    monkeypatch.setattr(executorfb, "FB_LISTA_BLOCO", 4)
+    monkeypatch.setattr(executorfb, "_comandos_lista", {})
+    conexao = FirebirdAsyncConnection(ConexaoFalsa())
+    params = conexao._carregar_listas((10, ListaFiltro("TEXTO", ["A", "B", "", "B", "C", "D", "E"]), 20))
+    assert params == (10, 1, 20)
+
+    comandos = conexao.cursor.comandos
+    assert [params for _, params in comandos] == [(1, "A", "B", "C", "D"), (1, "E", "E", "E", "E")]
+    # O mesmo texto nos dois blocos: o comando é preparado uma vez
+    assert comandos[0][0] is comandos[1][0]
+    assert comandos[0][0].count("?") == 5
+    assert comandos[0][0].count("INSERT INTO BI_FILTRO_LISTA (LOTE, TEXTO) VALUES (:LOTE, :V") == 4
+
+
+def test_sem_lista_mantem_os_parametros():
+    conexao = FirebirdAsyncConnection(ConexaoFalsa())
+    params = (1, "x")
+    assert conexao._carregar_listas(params) is params
+    assert conexao.cursor.comandos == []
+
+
+def test_semaforo_pertence_ao_pool():
+    primeiro = FirebirdPool("localhost", 3050, "/dados/ERP.FDB")
+    segundo = FirebirdPool("localhost", 3050, "/dados/ERP.FDB")
+    assert executorfb._semaforo(primeiro) is executorfb._semaforo(primeiro)
+    # Pool recriado (depois de fechado) começa com um semáforo novo
+    assert executorfb._semaforo(segundo) is not primeiro.semaforo
@@ -0,0 +1,181 @@
+"""
+Testes dos filtros do BI (app/utils/filtrosbi.py)
+"""
+
+from datetime import date
+import itertools
+import sqlite3
+
+from app.schemas.BIschemas import FiltrosBI
+from app.utils.filtrosbi import (intervalos_datas, filtro_periodo, filtros_codigo, condicao_fatura, ListaFiltro,
+                                 LIMITES_LISTA, CONDICOES_FATURA)
+
+
+def test_intervalos_sem_ano():
+    assert intervalos_datas(None, [1, 2]) is None
+    assert intervalos_datas([], dias=[5]) is None
+
+
+def test_intervalos_anos_inteiros_contiguos_viram_um():
+    assert intervalos_datas([2024, 2023]) == [(date(2023, 1, 1), date(2025, 1, 1))]
+    assert intervalos_datas([2021, 2023]) == [(date(2021, 1, 1), date(2022, 1, 1)),
+                                              (date(2023, 1, 1), date(2024, 1, 1))]
+
+
+def test_intervalos_meses_contiguos_e_virada_do_ano():
+    assert intervalos_datas([2024], [3, 1, 2]) == [(date(2024, 1, 1), date(2024, 4, 1))]
+    assert intervalos_datas([2023, 2024], [12, 1]) == [(date(2023, 1, 1), date(2023, 2, 1)),
+                                                      (date(2023, 12, 1), date(2024, 2, 1)),
+                                                      (date(2024, 12, 1), date(2025, 1, 1))]
+
+
+def test_intervalos_dias_ignoram_datas_inexistentes():
+    assert intervalos_datas([2023], [2], [28, 29, 30]) == [(date(2023, 2, 28), date(2023, 3, 1))]
+    assert intervalos_datas([2024], [2], [28, 29, 30]) == [(date(2024, 2, 28), date(2024, 3, 1))]
+
+
+def test_intervalos_dias_sem_mes_usam_todos_os_meses():
+    intervalos = intervalos_datas([2024], dias=[31])
+    assert len(intervalos) == 7
+    assert intervalos[0] == (date(2024, 1, 31), date(2024, 2, 1))
+
+
+def test_intervalos_fora_do_calendario():
+    assert intervalos_datas([0, 2024], [13]) == []
+
+
+def test_intervalos_acima_do_limite():
+    assert intervalos_datas([2024], dias=[1, 15], limite=23) is None
+    assert len(intervalos_datas([2024], dias=[1, 15], limite=24)) == 24
+
+
+def test_periodo_como_intervalos_da_data_base():
+    sql, params = filtro_periodo("datarecbto", [2024], [1, 2])
+    assert sql == " AND ((datarecbto >= ? AND datarecbto < ?))"
+    assert params == [date(2024, 1, 1), date(2024, 3, 1)]
+
+
+def test_periodo_sem_ano_usa_colunas_derivadas():
+    sql, params = filtro_periodo("datarecbto", None, [1, 2], None, ("ano_recbto", "mes_numero", "dia_recbto"))
+    assert sql == " AND mes_numero IN (?, ?)"
+    assert params == [1, 2]
+
+
+def test_periodo_com_intervalos_demais_combina_ano_e_derivadas():
+    """Acima do limite: intervalo dos anos na data base e mês/dia pelas colunas derivadas"""
+    meses, dias = list(range(1, 13)), [1, 10, 20]
+    sql, params = filtro_periodo("datarecbto", [2024], meses, dias)
+    assert sql == (" AND ((datarecbto >= ? AND datarecbto < ?))"
+                   f" AND mes_numero IN ({', '.join(['?'] * 12)})"
+                   " AND dia IN (?, ?, ?)")
+    assert params == [date(2024, 1, 1), date(2025, 1, 1)] + meses + dias
+
+
+def test_periodo_todos_os_dias_do_ano_vira_um_intervalo():
+    sql, params = filtro_periodo("datarecbto", [2024], list(range(1, 13)), list(range(1, 32)))
+    assert sql == " AND ((datarecbto >= ? AND datarecbto < ?))"
+    assert params == [date(2024, 1, 1), date(2025, 1, 1)]
+
+
+def test_periodo_sem_nenhuma_data_valida():
+    assert filtro_periodo("datarecbto", [2024], [13]) == (" AND 1=0", [])
+
+
+def test_filtros_codigo_completa_o_in_ate_potencia_de_2():
+    sql, params = filtros_codigo(FiltrosBI(codfilial=[1, 2, 3]), ("codfilial",))
+    assert sql == " AND codfilial IN (?, ?, ?, ?)"
+    assert params == [1, 2, 3, 3]
+
+
+def test_filtros_codigo_mesmo_formato_mesmo_sql():
+    """Listas que arredondam para o mesmo tamanho compartilham o SQL compilado"""
+    sql_5, params_5 = filtros_codigo(FiltrosBI(codpro=[1, 2, 3, 4, 5]), ("codfilial", "codpro"))
+    sql_8, params_8 = filtros_codigo(FiltrosBI(codpro=list(range(8))), ("codfilial", "codpro"))
+    assert sql_5 is sql_8
+    assert sql_5 == " AND codpro IN (?, ?, ?, ?, ?, ?, ?, ?)"
+    assert params_5 == [1, 2, 3, 4, 5, 5, 5, 5]
+    assert params_8 == list(range(8))
+
+
+def test_filtros_codigo_valor_unico_e_ausentes():
+    sql, params = filtros_codigo(FiltrosBI(codcliente="123"), ("codfilial", "codcliente", "codpro"))
+    assert sql == " AND codcliente IN (?)"
+    assert params == ["123"]
+    assert filtros_codigo(None, ("codfilial",)) == ("", [])
+
+
+def test_filtros_codigo_lista_grande_vai_para_a_tabela_temporaria():
+    valores = [str(i) for i in range(LIMITES_LISTA["codcliente"])]
+    sql, params = filtros_codigo(FiltrosBI(codcliente=valores), ("codcliente",))
+    assert sql == " AND codcliente IN (SELECT TEXTO FROM BI_FILTRO_LISTA WHERE LOTE = ?)"
+    assert len(params) == 1 and isinstance(params[0], ListaFiltro)
+    assert params[0].coluna == "TEXTO" and params[0].valores == valores
+
+
+def test_filtros_codigo_regiao_pelas_ufs():
+    sql, params = filtros_codigo(FiltrosBI(regiao=["Sul", "Outros", "Atlântida"]), ("regiao",))
+    assert sql == " AND codcid_regiao IN (SELECT codcid FROM vwtbcid_bi WHERE coduf IN (?, ?, ?) OR regiao = ?)"
+    assert params == ["PR", "RS", "SC", "Outros"]
+
+
+def test_filtro_regiao_equivale_a_regiao_da_view():
+    """
+    O filtro pela cidade do fato seleciona as mesmas linhas que regiao IN (...) na
+    coluna vinda do LEFT JOIN da view, inclusive sem cidade ou com cidade inexistente
+    """
+    banco = sqlite3.connect(":memory:")
+    banco.execute("CREATE TABLE vwtbcid_bi (codcid INTEGER, coduf TEXT, regiao TEXT)")
+    banco.executemany("INSERT INTO vwtbcid_bi VALUES (?, ?, ?)",
+                      [(1, "PR", "Sul"), (2, "SP", "Sudeste"), (3, "EX", "Outros"), (4, "BA", "Nordeste")])
+    banco.execute("CREATE TABLE fato (id INTEGER, codcid_regiao INTEGER)")
+    banco.executemany("INSERT INTO fato VALUES (?, ?)", [(i, cidade) for i, cidade in enumerate((1, 2, 3, 4, 9, None))])
+    view = "SELECT f.id, f.codcid_regiao, cid.regiao FROM fato f LEFT JOIN vwtbcid_bi cid ON cid.codcid = f.codcid_regiao"
+
+    for regioes in (("Sul",), ("Outros",), ("Nordeste", "Outros", "Sudeste")):
+        sql, params = filtros_codigo(FiltrosBI(regiao=list(regioes)), ("regiao",))
+        pelo_filtro = banco.execute(f"SELECT id FROM ({view}) WHERE 1=1{sql} ORDER BY id", params).fetchall()
+        pela_view = banco.execute(f"SELECT id FROM ({view}) WHERE regiao IN ({', '.join(['?'] * len(regioes))}) ORDER BY id",
+                                  regioes).fetchall()
+        assert pelo_filtro == pela_view, regioes
+        assert pelo_filtro
+
+
+def test_filtros_codigo_so_regiao_desconhecida_nao_retorna_nada():
+    assert filtros_codigo(FiltrosBI(regiao="Atlântida"), ("regiao",)) == (" AND 1=0", [])
+
+
+# CASE das views (VWFACTRC_BI e VWCPTIT_BI), com CURRENT_TIMESTAMP no meio do dia de referência
+CASE_VIEWS = {
+    "VWFACTRC_BI": """CASE WHEN datavencto < :agora AND vlrsaldo > 0 THEN 'Em Atraso'
+                          WHEN vlrsaldo = 0 THEN 'Recebida' ELSE 'A Receber' END""",
+    "VWCPTIT_BI": """CASE WHEN vlrsaldo = 0 THEN 'Pago'
+                         WHEN vlrsaldo > 0 AND :agora <= datavencto THEN 'A Pagar' ELSE 'Em Atraso' END""",
+}
+
+
+def test_condicao_fatura_parametro_e_o_dia_seguinte():
+    sql, params = condicao_fatura("VWFACTRC_BI", "Em Atraso", date(2024, 5, 10))
+    assert sql == CONDICOES_FATURA[("VWFACTRC_BI", "Em Atraso")]
+    assert params == [date(2024, 5, 11)]
+
+
+def test_condicao_fatura_equivale_ao_case_das_views():
+    """
+    Cada predicado seleciona exatamente as linhas que o CASE da view classifica na
+    condição, inclusive saldo nulo ou negativo e vencimento nulo (avaliado no SQLite,
+    com as datas em texto ISO)
+    """
+    referencia = date(2024, 5, 10)
+    banco = sqlite3.connect(":memory:")
+    banco.execute("CREATE TABLE titulo (id INTEGER, vlrsaldo NUMERIC, datavencto TEXT)")
+    linhas = itertools.product((None, -5, 0, 5), (None, "2024-05-09", "2024-05-10", "2024-05-11"))
+    banco.executemany("INSERT INTO titulo VALUES (?, ?, ?)", [(i, *linha) for i, linha in enumerate(linhas)])
+
+    for (view, condicao) in CONDICOES_FATURA:
+        predicado, params = condicao_fatura(view, condicao, referencia)
+        pelo_predicado = banco.execute(f"SELECT id FROM titulo WHERE {predicado} ORDER BY id",
+                                       [str(p) for p in params]).fetchall()
+        pela_view = banco.execute(f"SELECT id FROM titulo WHERE {CASE_VIEWS[view]} = :condicao ORDER BY id",
+                                  {"agora": "2024-05-10 12:00:00", "condicao": condicao}).fetchall()
+        assert pelo_predicado == pela_view, (view, condicao)
+        assert pelo_predicado
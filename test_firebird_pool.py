@@ -0,0 +1,156 @@
+"""
+Testes do pool de conexões Firebird (app/db/conexaofb.py), com conexões de mentira
+"""
+
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.db import conexaofb
+from app.db.conexaofb import FirebirdPool
+
+
+class ConexaoFalsa:
+    def __init__(self):
+        self.fechada = False
+        self.ativa = False
+        self.rollbacks = 0
+        self.pings = 0
+        self.falhar_ping = False
+
+    def is_closed(self):
+        return self.fechada
+
+    def is_active(self):
+        return self.ativa
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.ativa = False
+
+    def ping(self):
+        self.pings += 1
+        if self.falhar_ping:
+            raise RuntimeError("conexão perdida")
+
+    def close(self):
+        self.fechada = True
+
+
+@pytest.fixture
+def conexoes(monkeypatch):
+    """Conexões abertas pelo pool durante o teste"""
+    abertas = []
+
+    def conectar(HOST, PORT, DATABASE):
+        conn = ConexaoFalsa()
+        abertas.append(conn)
+        return conn
+
+    monkeypatch.setattr(conexaofb, "get_firebird_connection", conectar)
+    return abertas
+
+
+def _pool(**kwargs):
+    opcoes = {"max_size": 2, "acquire_timeout": 0.2, "ping_interval": -1, "isolamento": "PADRAO"}
+    opcoes.update(kwargs)
+    return FirebirdPool("localhost", 3050, "/dados/ERP.FDB", **opcoes)
+
+
+def test_release_devolve_e_acquire_reutiliza(conexoes):
+    pool = _pool()
+    item = pool.acquire()
+    item.conn.ativa = True
+    pool.release(item)
+    assert item.conn.rollbacks == 1
+    assert pool.acquire() is item
+    stats = pool.stats()
+    assert (stats["criadas"], stats["reutilizadas"], stats["em_uso"]) == (1, 1, 1)
+    assert len(conexoes) == 1
+
+
+def test_timeout_com_o_pool_esgotado(conexoes):
+    pool = _pool(max_size=1, acquire_timeout=0.05)
+    pool.acquire()
+    inicio = time.monotonic()
+    with pytest.raises(HTTPException) as erro:
+        pool.acquire()
+    assert erro.value.status_code == 503
+    assert time.monotonic() - inicio >= 0.05
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_acquire_espera_o_release_de_outra_thread(conexoes):
+    pool = _pool(max_size=1, acquire_timeout=2)
+    item = pool.acquire()
+    threading.Timer(0.05, pool.release, args=(item,)).start()
+    assert pool.acquire() is item
+    assert pool.stats()["esperas"] >= 1
+
+
+def test_conexao_morta_e_trocada(conexoes):
+    pool = _pool(ping_interval=0)
+    item = pool.acquire()
+    pool.release(item)
+    item.conn.falhar_ping = True
+    novo = pool.acquire()
+    assert novo is not item
+    assert item.conn.fechada
+    stats = pool.stats()
+    assert (stats["falhas_ping"], stats["fechadas"], stats["em_uso"]) == (1, 1, 1)
+
+
+def test_release_com_descarte_fecha_a_conexao(conexoes):
+    pool = _pool()
+    item = pool.acquire()
+    pool.release(item, descartar=True)
+    assert item.conn.fechada
+    assert pool.stats()["total"] == 0
+
+
+def test_falha_ao_conectar_devolve_a_vaga(monkeypatch):
+    def conectar(HOST, PORT, DATABASE):
+        raise HTTPException(status_code=503, detail="Firebird indisponível")
+
+    monkeypatch.setattr(conexaofb, "get_firebird_connection", conectar)
+    pool = _pool(max_size=1)
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            pool.acquire()
+    assert pool.stats()["em_uso"] == 0
+
+
+def test_preencher_abre_o_minimo(conexoes):
+    pool = _pool(min_size=2, max_size=3)
+    pool.limpar_ociosas()
+    stats = pool.stats()
+    assert (stats["livres"], stats["em_uso"], stats["criadas"]) == (2, 0, 2)
+
+
+def test_ociosas_acima_do_minimo_sao_fechadas(conexoes):
+    pool = _pool(min_size=1, idle_timeout=0.01)
+    itens = [pool.acquire(), pool.acquire()]
+    for item in itens:
+        pool.release(item)
+    time.sleep(0.02)
+    pool.limpar_ociosas()
+    assert pool.stats()["livres"] == 1
+    assert sum(conn.fechada for conn in conexoes) == 1
+
+
+def test_close_fecha_livres_e_recusa_acquire(conexoes):
+    pool = _pool()
+    pool.release(pool.acquire())
+    pool.close()
+    assert all(conn.fechada for conn in conexoes)
+    with pytest.raises(HTTPException) as erro:
+        pool.acquire()
+    assert erro.value.status_code == 503
+
+
+def test_stats_nao_expoem_o_banco(conexoes):
+    stats = _pool().stats()
+    assert "/dados/ERP.FDB" not in str(stats) and "localhost" not in str(stats)
+    assert len(stats["pool"]) == 12
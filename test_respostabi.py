@@ -0,0 +1,83 @@
+"""
+Testes da codificação das respostas do BI (app/utils/respostabi.py)
+"""
+
+from datetime import date
+from decimal import Decimal
+import json
+
+from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.utils import respostabi
+from app.utils.cachebi import resultado_antigo
+from app.utils.respostabi import colunar, codificar_json, resposta_bi, MEDIA_TYPE_COLUNAR
+
+
+class Kpi(BaseModel):
+    faturamento: float
+    volumes: int
+
+
+def _request(accept: str = "") -> Request:
+    return Request({"type": "http", "headers": [(b"accept", accept.encode("latin-1"))]})
+
+
+def test_colunar_um_nivel_de_chave():
+    valor = {"SP": Kpi(faturamento=10.5, volumes=3), "RJ": Kpi(faturamento=7, volumes=1)}
+    assert colunar(valor, ("coduf",)) == {
+        "colunas": ["coduf", "faturamento", "volumes"],
+        "valores": [["SP", "RJ"], [10.5, 7.0], [3, 1]],
+    }
+
+
+def test_colunar_chaves_aninhadas():
+    valor = {2024: {1: Kpi(faturamento=1, volumes=1), 2: Kpi(faturamento=2, volumes=2)},
+             2023: {12: Kpi(faturamento=3, volumes=3)}}
+    assert colunar(valor, ("ano", "mes_numero")) == {
+        "colunas": ["ano", "mes_numero", "faturamento", "volumes"],
+        "valores": [[2024, 2024, 2023], [1, 2, 12], [1.0, 2.0, 3.0], [1, 2, 3]],
+    }
+
+
+def test_colunar_vazio():
+    assert colunar({}, ("ano", "mes_numero")) == {"colunas": ["ano", "mes_numero"], "valores": [[], []]}
+
+
+def test_codificar_json_tipos_do_banco():
+    corpo = codificar_json({1: {"valor": Decimal("1.50"), "dia": date(2024, 5, 10), "kpi": Kpi(faturamento=1, volumes=2)}})
+    assert json.loads(corpo) == {"1": {"valor": 1.5, "dia": "2024-05-10", "kpi": {"faturamento": 1.0, "volumes": 2}}}
+
+
+def test_vary_accept_nas_duas_representacoes():
+    """Endpoints com `chaves` mandam Vary: Accept no JSON e no colunar"""
+    valor = {"SP": Kpi(faturamento=10.5, volumes=3)}
+    response = Response()
+    assert resposta_bi(valor, _request("application/json"), ("coduf",), response) is valor
+    colunas = resposta_bi(valor, _request(MEDIA_TYPE_COLUNAR), ("coduf",), Response())
+    assert response.headers["vary"] == colunas.headers["vary"] == "Accept"
+    assert colunas.media_type == MEDIA_TYPE_COLUNAR
+    assert json.loads(colunas.body)["colunas"] == ["coduf", "faturamento", "volumes"]
+
+
+def test_resposta_rapida_codificada_com_vary(monkeypatch):
+    monkeypatch.setattr(respostabi, "BI_RESPOSTA_RAPIDA", True)
+    resposta = resposta_bi({"SP": Kpi(faturamento=10.5, volumes=3)}, _request(), ("coduf",), Response())
+    assert resposta.headers["vary"] == "Accept"
+    assert json.loads(resposta.body) == {"SP": {"faturamento": 10.5, "volumes": 3}}
+
+
+def test_sem_chaves_mantem_o_valor():
+    valor = {"total": 1}
+    assert resposta_bi(valor, _request(MEDIA_TYPE_COLUNAR)) is valor
+
+
+def test_resultado_antigo_leva_age_e_warning():
+    token = resultado_antigo.set(42)
+    try:
+        resposta = resposta_bi({"total": 1})
+    finally:
+        resultado_antigo.reset(token)
+    assert resposta.headers["age"] == "42"
+    assert resposta.headers["warning"].startswith("111")
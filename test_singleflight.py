@@ -0,0 +1,88 @@
+"""
+Testes da coalescência de requisições (app/utils/singleflight.py)
+"""
+
+import asyncio
+
+import pytest
+
+from app.utils.singleflight import SingleFlight
+
+
+def test_chamadas_simultaneas_compartilham_uma_execucao():
+    """Chamadas com a mesma chave enquanto a primeira roda recebem o mesmo resultado"""
+    execucoes = []
+
+    async def consulta():
+        execucoes.append(1)
+        await asyncio.sleep(0.01)
+        return {"total": 10}
+
+    async def cenario():
+        sf = SingleFlight()
+        resultados = await asyncio.gather(*(sf.executar("big_numbers", consulta) for _ in range(5)))
+        return sf, resultados
+
+    sf, resultados = asyncio.run(cenario())
+    assert len(execucoes) == 1
+    assert all(resultado is resultados[0] for resultado in resultados)
+    assert sf.stats() == {"em_andamento": 0, "execucoes": 1, "compartilhadas": 4}
+
+
+def test_chaves_diferentes_executam_separadas():
+    async def cenario():
+        sf = SingleFlight()
+        resultados = await asyncio.gather(sf.executar(1, lambda: _valor(1)), sf.executar(2, lambda: _valor(2)))
+        return sf, resultados
+
+    sf, resultados = asyncio.run(cenario())
+    assert resultados == [1, 2]
+    assert sf.stats()["execucoes"] == 2
+
+
+def test_execucao_seguinte_roda_de_novo():
+    """Terminada a execução, a próxima chamada com a mesma chave não reaproveita o resultado"""
+    async def cenario():
+        sf = SingleFlight()
+        await sf.executar("chave", lambda: _valor(1))
+        await sf.executar("chave", lambda: _valor(2))
+        return sf
+
+    assert asyncio.run(cenario()).stats()["execucoes"] == 2
+
+
+def test_erro_e_compartilhado_e_nao_fica_guardado():
+    async def falha():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Firebird indisponível")
+
+    async def cenario():
+        sf = SingleFlight()
+        resultados = await asyncio.gather(sf.executar("chave", falha), sf.executar("chave", falha),
+                                          return_exceptions=True)
+        return sf, resultados
+
+    sf, resultados = asyncio.run(cenario())
+    assert all(isinstance(resultado, RuntimeError) for resultado in resultados)
+    assert sf.stats() == {"em_andamento": 0, "execucoes": 1, "compartilhadas": 1}
+
+
+def test_cancelar_quem_iniciou_nao_cancela_a_execucao():
+    """O shield mantém a execução para as demais requisições que aguardam a mesma chave"""
+    async def cenario():
+        sf = SingleFlight()
+        primeira = asyncio.ensure_future(sf.executar("chave", lambda: _valor(7, 0.02)))
+        await asyncio.sleep(0)
+        segunda = asyncio.ensure_future(sf.executar("chave", lambda: _valor(8)))
+        await asyncio.sleep(0)
+        primeira.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await primeira
+        return await segunda
+
+    assert asyncio.run(cenario()) == 7
+
+
+async def _valor(valor, espera: float = 0):
+    await asyncio.sleep(espera)
+    return valor
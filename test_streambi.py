@@ -0,0 +1,85 @@
+"""
+Testes das respostas em streaming do BI (app/utils/streambi.py)
+"""
+
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils.streambi import _csv, _ndjson, CodificadorTexto, formato_stream, resposta_stream
+
+
+def _request(accept: str = "") -> Request:
+    return Request({"type": "http", "headers": [(b"accept", accept.encode("latin-1"))]})
+
+
+def test_csv_cabecalho_e_nulos():
+    dados = [{"cliente": "A", "total": 1.5, "cidade": None}, {"cliente": "B", "total": 2, "cidade": "X"}]
+    assert _csv(dados, True) == b"cliente,total,cidade\nA,1.5,\nB,2,X\n"
+    assert _csv(dados, False) == b"A,1.5,\nB,2,X\n"
+
+
+def test_csv_aspas_e_acentos():
+    texto = _csv([{"cliente": 'SÃO "JOSÉ", LTDA', "obs": "linha 1\nlinha 2"}], False).decode("utf-8")
+    assert list(csv.reader(io.StringIO(texto))) == [['SÃO "JOSÉ", LTDA', "linha 1\nlinha 2"]]
+
+
+def test_ndjson_uma_linha_por_registro():
+    corpo = _ndjson([{"a": 1}, {"a": None}], True)
+    assert [json.loads(linha) for linha in corpo.splitlines()] == [{"a": 1}, {"a": None}]
+
+
+def test_codificador_texto_cabecalho_so_no_primeiro_lote():
+    codificador = CodificadorTexto("csv", lambda row: {"nro": row[0], "valor": row[1]})
+    assert codificador.lote([(1, 10)]) == b"nro,valor\n1,10\n"
+    assert codificador.lote([(2, 20), (3, 30)]) == b"2,20\n3,30\n"
+    assert codificador.fim() == b""
+
+
+def test_formato_parametro_tem_precedencia_sobre_accept():
+    assert formato_stream(_request("text/csv"), "NDJSON") == "ndjson"
+    assert formato_stream(_request("text/csv"), "json") is None
+
+
+def test_formato_pelo_accept():
+    assert formato_stream(_request("application/json, application/x-ndjson;q=0.9")) == "ndjson"
+    assert formato_stream(_request("text/csv; charset=utf-8")) == "csv"
+    assert formato_stream(_request("application/json")) is None
+
+
+def test_formato_invalido():
+    with pytest.raises(HTTPException) as erro:
+        formato_stream(_request(), "xml")
+    assert erro.value.status_code == 400
+
+
+async def _lotes(*lotes):
+    for lote in lotes:
+        yield lote
+
+
+async def _corpo(resposta) -> bytes:
+    return b"".join([parte async for parte in resposta.body_iterator])
+
+
+def test_resposta_stream_em_lotes():
+    async def cenario():
+        resposta = await resposta_stream(_lotes([(1,)], [(2,), (3,)]), lambda row: {"nro": row[0]},
+                                         "csv", "tabela_faturamento")
+        return resposta, await _corpo(resposta)
+
+    resposta, corpo = asyncio.run(cenario())
+    assert corpo == b"nro\n1\n2\n3\n"
+    assert resposta.media_type == "text/csv; charset=utf-8"
+    assert resposta.headers["content-disposition"] == 'attachment; filename="tabela_faturamento.csv"'
+
+
+def test_resposta_stream_sem_dados():
+    with pytest.raises(HTTPException) as erro:
+        asyncio.run(resposta_stream(_lotes(), dict, "ndjson", "tabela_faturamento"))
+    assert erro.value.status_code == 404